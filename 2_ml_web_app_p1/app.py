@@ -18,14 +18,26 @@ with gr.Blocks(theme='gstaff/xkcd') as demo:
                     value="a fast bachata with violin sounds and few notes from a saxophone",
                     placeholder="Type your song description in here.",
                 )
-                make_music   = gr.Button("Create Music")
+                with gr.Row():
+                    make_music   = gr.Button("Create Music")
+                    stop_music   = gr.Button("Stop")
             with gr.Column():
                 tokens      = gr.Slider(label="Max Number of New Tokens", value=200, minimum=5, maximum=1000, step=1)
                 guidance    = gr.Slider(label="Guidance Scale", value=3, minimum=1, maximum=50, step=1)
                 sample_rate = gr.Radio([16000, 32000, 44100], label="Sample Rate", value=32000)
+                seed        = gr.Number(label="Seed", value=None, precision=0, info="Leave empty for new music every time.")
         
-        audio_output = gr.Audio()
-        make_music.click(fn=make_sound, inputs=[text, guidance, tokens, sample_rate], outputs=audio_output, api_name="create_music")
+        audio_output = gr.Audio(streaming=True, autoplay=True)
+        # gradio runs one call per event at a time unless told otherwise, and the server needs several to batch them
+        creating = make_music.click(
+            fn=make_sound, inputs=[text, guidance, tokens, sample_rate, seed], outputs=audio_output, api_name="create_music",
+            concurrency_limit=MAX_GENERATIONS,
+        )
+        stop_music.click(fn=None, cancels=[creating])
+        with gr.Row():
+            download_music = gr.Button("Download as MP3")
+            music_file = gr.File(label="MP3")
+            download_music.click(fn=download_sound, outputs=music_file)
 
         gr.Markdown()
         gr.Markdown("# Step 2 - Visualize your creation 📈 👀 👌")
@@ -50,4 +62,6 @@ with gr.Blocks(theme='gstaff/xkcd') as demo:
         gr.Markdown("# Step 4 - Create a MIDI Representation! 🎛️ 🎶 🎼")
         gr.HTML(value="""<iframe src="https://basicpitch.spotify.com/" height="1000" width="100%"></iframe>""")
 
+    demo.unload(clear_session)
+
 demo.launch()
@@ -0,0 +1,77 @@
+"""
+Throughput of `MusicGenServer` with concurrent clients, one prompt per `generate` against
+prompts batched across requests.
+
+    python -m benchmarks.musicgen_batching --clients 1 4 8 --tokens 100
+
+Uses the tiny, randomly initialised MusicGen of `benchmarks.musicgen_streaming`, so only the
+relative numbers matter. Every client sends `--requests` prompts one after the other; with
+`max_batch_size = 1` they queue up for the model as before, otherwise the server groups
+what is waiting. The last line times a seeded request the first time and when repeated.
+"""
+import argparse
+import asyncio
+import time
+
+import numpy as np
+from mlserver import ModelSettings
+from mlserver.codecs import NumpyCodec, StringCodec
+from mlserver.types import InferenceRequest
+
+from benchmarks.musicgen_streaming import fake_processor, tiny_musicgen
+from servers.ml_model.ml_services import MusicGenServer
+
+
+def request(text, tokens, seed=None):
+    inputs = [
+        StringCodec.encode_input("text", [text], use_bytes=False),
+        NumpyCodec.encode_input("guidance_scale", np.array([[3.0]])),
+        NumpyCodec.encode_input("max_new_tokens", np.array([[tokens]])),
+    ]
+    if seed is not None:
+        inputs.append(NumpyCodec.encode_input("seed", np.array([[seed]])))
+    return InferenceRequest(inputs=inputs)
+
+
+async def run(server, clients, requests, tokens):
+    latencies = []
+
+    async def client(idx):
+        for number in range(requests):
+            start = time.perf_counter()
+            await server.predict(request(f"song {idx}-{number}", tokens))
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(client(idx) for idx in range(clients)))
+    wall = time.perf_counter() - start
+    return clients * requests / wall, np.percentile(latencies, 50), np.percentile(latencies, 99)
+
+
+async def main(args):
+    server = MusicGenServer(ModelSettings(name="musicgen_model", implementation=MusicGenServer))
+    server.model, server.processor = tiny_musicgen(), fake_processor
+    await server.predict(request("warm up", 20))
+
+    print(f"{'clients':>8} {'mode':>10} {'req/s':>7} {'p50 s':>7} {'p99 s':>7}")
+    for clients in args.clients:
+        for mode, batch_size in (("one each", 1), ("batched", args.max_batch_size)):
+            server.max_batch_size = batch_size
+            per_second, p50, p99 = await run(server, clients, args.requests, args.tokens)
+            print(f"{clients:>8} {mode:>10} {per_second:>7.2f} {p50:>7.2f} {p99:>7.2f}")
+
+    times = []
+    for _ in range(2):
+        start = time.perf_counter()
+        await server.predict(request("seeded song", args.tokens, seed=42))
+        times.append(time.perf_counter() - start)
+    print(f"seeded request: {times[0]:.3f} s generated, {times[1] * 1000:.1f} ms from the cache")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--clients", type=int, nargs="+", default=[1, 4, 8])
+    parser.add_argument("--requests", type=int, default=4, help="sent one after the other by every client")
+    parser.add_argument("--tokens", type=int, default=100)
+    parser.add_argument("--max-batch-size", type=int, default=8)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,88 @@
+"""
+Time to first audio of `MusicGenServer.predict_stream` against the total latency of `predict`.
+
+    python -m benchmarks.musicgen_streaming --tokens 100 250 500
+
+Uses a tiny, randomly initialised MusicGen built from local configs (no download), so
+only the relative numbers matter: how early the first chunk arrives as generation grows.
+"""
+import argparse
+import asyncio
+import time
+
+import numpy as np
+import torch
+from mlserver import ModelSettings
+from mlserver.codecs import NumpyCodec, StringCodec
+from mlserver.types import InferenceRequest
+from transformers import (
+    EncodecConfig, MusicgenConfig, MusicgenDecoderConfig, MusicgenForConditionalGeneration, T5Config,
+)
+
+from servers.ml_model.ml_services import MusicGenServer
+
+
+def tiny_musicgen(hidden_size=64, layers=2):
+    config = MusicgenConfig(
+        text_encoder=T5Config(vocab_size=99, d_model=32, d_ff=37, num_layers=2, num_heads=2, d_kv=16).to_dict(),
+        audio_encoder=EncodecConfig(
+            hidden_size=16, num_filters=4, upsampling_ratios=[8, 5, 4, 4], codebook_size=64,
+            sampling_rate=32000, target_bandwidths=[2.2],
+        ).to_dict(),
+        decoder=MusicgenDecoderConfig(
+            vocab_size=64, hidden_size=hidden_size, num_hidden_layers=layers, num_attention_heads=2,
+            ffn_dim=4 * hidden_size, num_codebooks=4, pad_token_id=64, bos_token_id=64, decoder_start_token_id=64,
+        ).to_dict(),
+    )
+    model = MusicgenForConditionalGeneration(config).eval()
+    model.generation_config.decoder_start_token_id = 64
+    model.generation_config.pad_token_id = 64
+    return model
+
+
+def fake_processor(text, **kwargs):
+    input_ids = torch.arange(1, 9).repeat(len(text), 1)
+    return {"input_ids": input_ids, "attention_mask": torch.ones_like(input_ids)}
+
+
+def request(tokens, guidance=3.0):
+    return InferenceRequest(inputs=[
+        StringCodec.encode_input("text", ["a fast bachata with violin sounds"], use_bytes=False),
+        NumpyCodec.encode_input("guidance_scale", np.array([[guidance]])),
+        NumpyCodec.encode_input("max_new_tokens", np.array([[tokens]])),
+    ])
+
+
+async def measure(server, tokens):
+    start = time.perf_counter()
+    await server.predict(request(tokens))
+    total = time.perf_counter() - start
+
+    async def payloads():
+        yield request(tokens)
+
+    start, first, chunks, samples = time.perf_counter(), None, 0, 0
+    async for response in server.predict_stream(payloads()):
+        first = first or time.perf_counter() - start
+        chunks += 1
+        samples += int(np.prod(response.outputs[0].shape))
+    streamed = time.perf_counter() - start
+    return total, first, streamed, chunks, samples
+
+
+async def main(tokens_list, play_steps):
+    server = MusicGenServer(ModelSettings(name="musicgen_model", implementation=MusicGenServer))
+    server.model, server.processor, server.play_steps = tiny_musicgen(), fake_processor, play_steps
+    await measure(server, 20)
+    print(f"{'tokens':>7} {'predict s':>10} {'first audio s':>14} {'stream s':>9} {'chunks':>7} {'samples':>8}")
+    for tokens in tokens_list:
+        total, first, streamed, chunks, samples = await measure(server, tokens)
+        print(f"{tokens:>7} {total:>10.2f} {first:>14.2f} {streamed:>9.2f} {chunks:>7} {samples:>8}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--tokens", type=int, nargs="+", default=[100, 250, 500])
+    parser.add_argument("--play-steps", type=int, default=50)
+    args = parser.parse_args()
+    asyncio.run(main(args.tokens, args.play_steps))
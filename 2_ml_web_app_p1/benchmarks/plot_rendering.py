@@ -0,0 +1,71 @@
+"""
+Render time of the waveform and spectrogram plots against track length.
+
+    python -m benchmarks.plot_rendering --seconds 30 180 600
+
+Stores a synthetic stereo track per length in the artifact store, then times the old
+full-resolution plots (every sample through `plot`, `specgram` on every call) against
+`src.plotting` cold (peak pyramid and STFT) and warm (cached summary). Each time
+includes drawing the figure, which is what Gradio pays to serialize it.
+"""
+from types import SimpleNamespace
+import argparse
+import time
+
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+import matplotlib.pyplot as plt
+import numpy as np
+
+from src import plotting
+from src.helpers import audio_store
+
+
+def old_waveform(waveform, sample_rate):
+    with plt.xkcd():
+        figure = Figure()
+        axes = figure.subplots(waveform.shape[0], 1)
+        time_axis = np.arange(0, waveform.shape[1]) / sample_rate
+        for c in range(waveform.shape[0]):
+            axes[c].plot(time_axis, waveform[c], linewidth=1)
+    return figure
+
+
+def old_spectogram(waveform, sample_rate):
+    with plt.xkcd():
+        figure = Figure()
+        axes = figure.subplots(waveform.shape[0], 1)
+        for c in range(waveform.shape[0]):
+            axes[c].specgram(waveform[c], Fs=sample_rate)
+    return figure
+
+
+def timed(make_figure):
+    start = time.perf_counter()
+    FigureCanvasAgg(make_figure()).draw()
+    return time.perf_counter() - start
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--seconds", type=int, nargs="+", default=[30, 180, 600])
+    parser.add_argument("--sample-rate", type=int, default=32000)
+    args = parser.parse_args()
+
+    print(f"{'seconds':>8} {'plot':>12} {'old s':>7} {'cold s':>7} {'warm s':>7} {'zoom 2s':>8}")
+    request = SimpleNamespace(session_hash="benchmark")
+    for seconds in args.seconds:
+        rng = np.random.default_rng(seconds)
+        waveform = (rng.normal(0, 0.2, (2, seconds * args.sample_rate))).astype(np.float32)
+        audio_store.put(request.session_hash, waveform, args.sample_rate)
+
+        for name, old, new in (
+            ("waveform", old_waveform, plotting.make_waveform),
+            ("spectrogram", old_spectogram, plotting.make_spectogram),
+        ):
+            old_time = timed(lambda: old(waveform, args.sample_rate))
+            plotting.summarize.cache_clear()
+            cold, warm = timed(lambda: new(request)), timed(lambda: new(request))
+            zoom = timed(lambda: new(request, seconds / 2, seconds / 2 + 2))
+            print(f"{seconds:>8} {name:>12} {old_time:>7.2f} {cold:>7.2f} {warm:>7.2f} {zoom:>8.2f}")
+    audio_store.drop_session(request.session_hash)
@@ -0,0 +1,56 @@
+"""
+Stand-ins for every model in `servers/`, used by `benchmarks.load`. Each one takes and
+returns what the real model does, and costs a fixed time per generated token or per second
+of audio rather than the real model's. Only relative numbers matter.
+"""
+from pathlib import Path
+from typing import List, Optional
+import sys
+import numpy as np
+
+from mlserver.codecs import decode_args
+
+sys.path.append(str(Path(__file__).resolve().parents[2]))
+from shared.load import StubModel, Target
+
+SAMPLES_PER_TOKEN = 640  # MusicGen's codec runs at 50 frames per second of 32 kHz audio
+
+
+class MusicGenStub(StubModel):
+    @decode_args
+    async def stub(
+        self, text: List[str], guidance_scale: np.ndarray, max_new_tokens: np.ndarray, seed: Optional[np.ndarray] = None
+    ) -> np.ndarray:
+        tokens = int(max_new_tokens[0][0])
+        await self.busy(0.01 * tokens)
+        return np.zeros((len(text), tokens * SAMPLES_PER_TOKEN), dtype=np.float32)
+
+
+class AudioMixerStub(StubModel):
+    @decode_args
+    async def stub(
+        self, song: np.ndarray, sample_rate: np.ndarray, preset: Optional[List[str]] = None, overrides: Optional[List[str]] = None
+    ) -> np.ndarray:
+        await self.busy(0.005 * song.shape[-1] / sample_rate[0][0])
+        return song.astype(np.float32)
+
+
+TARGETS = {
+    # MusicGen is started from `ml_services.main()` rather than settings files
+    "musicgen_model": Target(
+        MusicGenStub,
+        lambda tokens: {
+            "text": ["a fast bachata with violin sounds"], "guidance_scale": np.array([[3.0]]),
+            "max_new_tokens": np.array([[tokens]]),
+        },
+        "tokens", settings={"parallel_workers": 0, "gzip_enabled": False},
+    ),
+    "novice_dj": Target(
+        AudioMixerStub,
+        lambda seconds: {
+            "song": np.random.default_rng(seconds).normal(0, 0.1, (1, seconds * 32000)).astype(np.float32),
+            "sample_rate": np.array([[32000.0]]),
+        },
+        "seconds", folder="pedal_board",
+    ),
+}
@@ -1,31 +1,258 @@
-
 from mlserver import MLServer, Settings, ModelSettings, MLModel
-from mlserver.codecs import decode_args
+from mlserver.codecs import NumpyCodec, StringCodec
+from mlserver.types import InferenceRequest, InferenceResponse
 
-from transformers import AutoProcessor, MusicgenForConditionalGeneration
+from transformers import AutoProcessor, MusicgenForConditionalGeneration, LogitsProcessor, LogitsProcessorList
+from transformers.modeling_outputs import BaseModelOutput
 import numpy as np
+import torch
+
+from typing import AsyncIterator, Callable, List, Optional
+from collections import OrderedDict
+from dataclasses import dataclass
+from pathlib import Path
+import asyncio
+import time
+import sys
 
-from typing import List
-import asyncio 
+sys.path.append(str(Path(__file__).resolve().parents[3]))
+from shared.stage_timer import stage_timer, timed_args
 
 MUSICGEN = "facebook/musicgen-small"
 
+class AudioStreamer(LogitsProcessor):
+    """Hands `send` the settled samples decoded every `play_steps` tokens, while `generate` runs."""
+
+    def __init__(self, model, send: Callable[[np.ndarray], None], play_steps=50, stride=None):
+        self.decoder, self.audio_encoder = model.decoder, model.audio_encoder
+        self.generation_config = model.generation_config
+        self.send = send
+        self.play_steps = play_steps
+        hop_length = int(np.prod(self.audio_encoder.config.upsampling_ratios))
+        self.stride = stride if stride is not None else hop_length * max(play_steps - self.decoder.num_codebooks, 1) // 6
+        self.to_yield = 0
+
+    def __call__(self, input_ids: torch.LongTensor, scores: torch.FloatTensor) -> torch.FloatTensor:
+        steps = input_ids.shape[-1]
+        if steps > self.decoder.num_codebooks and steps % self.play_steps == 0:
+            audio = self.decode(input_ids)
+            self.send(audio[:, self.to_yield: audio.shape[-1] - self.stride])
+            self.to_yield = max(self.to_yield, audio.shape[-1] - self.stride)
+        return scores
+
+    def decode(self, input_ids: torch.LongTensor) -> np.ndarray:
+        _, delay_pattern_mask = self.decoder.build_delay_pattern_mask(
+            input_ids[:, :1], pad_token_id=self.generation_config.decoder_start_token_id, max_length=input_ids.shape[-1],
+        )
+        codes = self.decoder.apply_delay_pattern_mask(input_ids, delay_pattern_mask)
+        # every row has the same delay pattern, so each keeps the same number of codes
+        rows = input_ids.shape[0] // self.decoder.num_codebooks
+        codes = codes[codes != self.generation_config.pad_token_id].reshape(1, rows, self.decoder.num_codebooks, -1)
+        with torch.no_grad():
+            audio_values = self.audio_encoder.decode(codes.to(self.audio_encoder.device), audio_scales=[None] * rows).audio_values
+        return audio_values[:, 0].cpu().float().numpy()
+
+    def end(self, audio: np.ndarray):
+        # the fully generated waveform is exact, so the remainder comes from it rather than a partial decode
+        self.send(audio[:, self.to_yield:])
+
+
+@dataclass(eq=False)
+class Generation:
+    """One prompt waiting for, or going through, a batched `generate`."""
+    text: str
+    guidance_scale: float
+    max_new_tokens: int
+    seed: Optional[int]
+    future: asyncio.Future
+    chunks: Optional[asyncio.Queue] = None  # only for streaming requests
+
+    @property
+    def batch_key(self):
+        # prompts sharing these run as one batch
+        return self.guidance_scale, self.max_new_tokens, self.seed
+
+    @property
+    def cache_key(self):
+        return self.text, self.guidance_scale, self.max_new_tokens, self.seed
+
+
 class MusicGenServer(MLModel):
+    """Batches queued prompts through `generate` and caches prompt encodings and seeded results."""
+    play_steps = 50
+    max_batch_size = 8
+    max_wait = 0.05
+    prompt_cache_size = 256
+    result_cache_size = 32
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.queue = []
+        self.prompts = OrderedDict()
+        self.results = OrderedDict()
+        self._queued = asyncio.Event()
+        self._batches = None
+
     async def load(self):
         self.processor = AutoProcessor.from_pretrained(MUSICGEN)
         self.model     = MusicgenForConditionalGeneration.from_pretrained(MUSICGEN)
 
-    @decode_args
-    async def predict(self, text: List[str], guidance_scale: np.ndarray, max_new_tokens: np.ndarray) -> np.ndarray:
-        inputs       = self.processor(text=text, padding=True, return_tensors="pt")
-        audio_values = self.model.generate(
-            **inputs, do_sample=True, guidance_scale=guidance_scale[0][0], max_new_tokens=max_new_tokens[0][0]
-        ).numpy()
-        sampling_rate = self.model.config.audio_encoder.sampling_rate
-        return audio_values[0]
+    @timed_args
+    async def predict(
+        self, text: List[str], guidance_scale: np.ndarray, max_new_tokens: np.ndarray, seed: Optional[np.ndarray] = None
+    ) -> np.ndarray:
+        generations = [self.submit(prompt, guidance_scale, max_new_tokens, seed) for prompt in text]
+        try:
+            return np.stack(await asyncio.gather(*(generation.future for generation in generations)))
+        finally:
+            for generation in generations:
+                generation.future.cancel()  # a caller gone before its batch starts is left out of it
+
+    async def predict_stream(self, payloads: AsyncIterator[InferenceRequest]) -> AsyncIterator[InferenceResponse]:
+        timer = stage_timer(self)
+        async for payload in payloads:
+            inputs = {request_input.name: request_input for request_input in payload.inputs}
+            with timer.stage("decode"):
+                text           = StringCodec.decode_input(inputs["text"])
+                guidance_scale = NumpyCodec.decode_input(inputs["guidance_scale"])
+                max_new_tokens = NumpyCodec.decode_input(inputs["max_new_tokens"])
+                seed           = NumpyCodec.decode_input(inputs["seed"]) if "seed" in inputs else None
+            timer.sizes(max_new_tokens=int(max_new_tokens[0][0]), text=text)
+            start = time.perf_counter()
+            generation = self.submit(text[0], guidance_scale, max_new_tokens, seed, stream=True)
+            try:
+                first = True
+                while (chunk := await generation.chunks.get()) is not None:
+                    if first:
+                        timer.observe("first_chunk", time.perf_counter() - start)
+                        first = False
+                    yield InferenceResponse(
+                        model_name=self.name, id=payload.id,
+                        outputs=[NumpyCodec.encode_output(name="output-0", payload=chunk[None])],
+                    )
+                await generation.future
+            finally:
+                generation.future.cancel()
+
+    def submit(self, text, guidance_scale, max_new_tokens, seed=None, stream=False) -> Generation:
+        loop = asyncio.get_running_loop()
+        generation = Generation(
+            text, float(guidance_scale[0][0]), int(max_new_tokens[0][0]), None if seed is None else int(seed[0][0]),
+            loop.create_future(), asyncio.Queue() if stream else None,
+        )
+        cached = self.results.get(generation.cache_key) if generation.seed is not None else None
+        if cached is not None:
+            self.results.move_to_end(generation.cache_key)
+            self.finish(generation, cached)
+            return generation
+        self.queue.append(generation)
+        if self._batches is None or self._batches.done():
+            self._batches = loop.create_task(self.run_batches())
+        self._queued.set()
+        return generation
+
+    async def run_batches(self):
+        timer = stage_timer(self)
+        loop = asyncio.get_running_loop()
+        while True:
+            await self._queued.wait()
+            await asyncio.sleep(self.max_wait)  # prompts sent at the same moment join this batch
+            self.queue = [generation for generation in self.queue if not generation.future.done()]  # callers gone
+            if not self.queue:
+                self._queued.clear()
+                continue
+            key = self.queue[0].batch_key
+            # the seed fixes the sampling of the whole batch, so a seeded prompt would sound different
+            # with other prompts beside it; alone, it is the same every time it is asked for
+            limit = 1 if key[2] is not None else self.max_batch_size
+            batch = [generation for generation in self.queue if generation.batch_key == key][:limit]
+            self.queue = [generation for generation in self.queue if generation not in batch]
+            if not self.queue:
+                self._queued.clear()
+            timer.sizes(batch=batch)
+
+            def send(chunk, batch=batch):
+                for generation, audio in zip(batch, chunk):
+                    if generation.chunks is not None and len(audio):
+                        loop.call_soon_threadsafe(generation.chunks.put_nowait, audio)
+
+            start = time.perf_counter()
+            try:
+                audio = await asyncio.to_thread(self.generate, batch, send)
+            except Exception as error:
+                for generation in batch:
+                    self.finish(generation, error=error)
+                continue
+            timer.observe("generate", time.perf_counter() - start)
+            for generation, row in zip(batch, audio):
+                if generation.seed is not None:
+                    self.results[generation.cache_key] = row
+                    while len(self.results) > self.result_cache_size:
+                        self.results.popitem(last=False)
+                self.finish(generation, row, streamed=True)
+
+    def finish(self, generation: Generation, audio=None, error=None, streamed=False):
+        if generation.chunks is not None:
+            if audio is not None and not streamed:
+                generation.chunks.put_nowait(audio)
+            generation.chunks.put_nowait(None)
+        if generation.future.done():
+            return
+        if error is not None:
+            generation.future.set_exception(error)
+        else:
+            generation.future.set_result(audio)
+
+    def generate(self, batch: List[Generation], send: Callable[[np.ndarray], None]) -> np.ndarray:
+        guidance_scale, max_new_tokens, seed = batch[0].batch_key
+        with stage_timer(self).stage("pre_process"):
+            inputs = self.encode([generation.text for generation in batch], guidance_scale)
+        if seed is not None:
+            torch.manual_seed(seed)
+        streaming = any(generation.chunks is not None for generation in batch)
+        streamer = AudioStreamer(self.model, send, play_steps=self.play_steps) if streaming else None
+        with torch.no_grad():
+            audio_values = self.model.generate(
+                **inputs, do_sample=True, guidance_scale=guidance_scale, max_new_tokens=max_new_tokens,
+                logits_processor=LogitsProcessorList([streamer] if streamer else []),
+            )
+        audio = audio_values[:, 0].float().numpy()
+        if streamer:
+            streamer.end(audio)
+        return audio
+
+    def encode(self, texts: List[str], guidance_scale: float) -> dict:
+        """`generate` inputs with the text encoder already run, from the prompt cache where possible."""
+        encoded = [self.encode_prompt(text) for text in texts]
+        length = max(len(input_ids) for input_ids, _ in encoded)
+        input_ids = torch.zeros((len(texts), length), dtype=torch.long)  # padding is masked, so its id does not matter
+        attention_mask = torch.zeros((len(texts), length), dtype=torch.long)
+        hidden = torch.zeros((len(texts), length, encoded[0][1].shape[-1]), dtype=encoded[0][1].dtype)
+        for row, (ids, states) in enumerate(encoded):
+            input_ids[row, : len(ids)], attention_mask[row, : len(ids)], hidden[row, : len(ids)] = ids, 1, states
+        if guidance_scale > 1:
+            # the unconditional half of classifier-free guidance, as `generate` builds it when it runs the encoder
+            hidden = torch.concatenate([hidden, torch.zeros_like(hidden)])
+            attention_mask = torch.concatenate([attention_mask, torch.zeros_like(attention_mask)])
+        return {
+            "input_ids": input_ids, "attention_mask": attention_mask,
+            "encoder_outputs": BaseModelOutput(last_hidden_state=hidden),
+        }
+
+    def encode_prompt(self, text: str):
+        if text in self.prompts:
+            self.prompts.move_to_end(text)
+            return self.prompts[text]
+        inputs = self.processor(text=[text], return_tensors="pt")
+        with torch.no_grad():
+            states = self.model.get_encoder()(**inputs).last_hidden_state[0]
+        self.prompts[text] = inputs["input_ids"][0], states
+        while len(self.prompts) > self.prompt_cache_size:
+            self.prompts.popitem(last=False)
+        return self.prompts[text]
 
 async def main():
-    settings = Settings(debug=True)
+    settings = Settings(debug=True, parallel_workers=0, gzip_enabled=False)
     my_server = MLServer(settings=settings)
     musicgen_generator = ModelSettings(name='musicgen_model', implementation=MusicGenServer)
     await my_server.start(models_settings=[musicgen_generator])
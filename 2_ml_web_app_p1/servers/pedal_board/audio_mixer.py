@@ -1,27 +1,114 @@
-
 from pedalboard import Pedalboard, Distortion, Delay, Reverb, Chorus, Gain, PitchShift, Compressor, Mix
+from pedalboard import GSMFullRateCompressor, MP3Compressor, PluginContainer, Resample
 from pedalboard.io import AudioFile
 
-from mlserver.codecs import decode_args
 from mlserver import MLModel
 
+from concurrent.futures import ThreadPoolExecutor
 from typing import List, Optional
+from pathlib import Path
 import numpy as np
+import asyncio
+import queue
+import sys
+import os
+
+sys.path.append(str(Path(__file__).resolve().parents[3]))
+from shared.stage_timer import stage_timer, timed_args
+
+
+def novice_dj():
+    effects = {
+        "compressor": Compressor(), "delay": Delay(delay_seconds=0.25, mix=1.0),
+        "pitch": PitchShift(semitones=7), "wet_gain": Gain(gain_db=-3), "reverb": Reverb(),
+    }
+    delay_and_pitch_shift = Pedalboard([effects["delay"], effects["pitch"], effects["wet_gain"]])
+    board = Pedalboard([effects["compressor"], Mix([Gain(gain_db=0), delay_and_pitch_shift]), effects["reverb"]])
+    return board, effects
+
+def lofi():
+    effects = {
+        "compressor": Compressor(threshold_db=-20, ratio=4), "chorus": Chorus(rate_hz=0.5, depth=0.3),
+        "reverb": Reverb(room_size=0.3, wet_level=0.2), "gain": Gain(gain_db=-2),
+    }
+    return Pedalboard(list(effects.values())), effects
+
+def stadium():
+    effects = {
+        "compressor": Compressor(), "delay": Delay(delay_seconds=0.4, feedback=0.3, mix=0.25),
+        "reverb": Reverb(room_size=0.95, damping=0.3, wet_level=0.45),
+    }
+    return Pedalboard(list(effects.values())), effects
+
+def distorted():
+    effects = {
+        "distortion": Distortion(drive_db=20), "gain": Gain(gain_db=-8), "reverb": Reverb(room_size=0.4),
+    }
+    return Pedalboard(list(effects.values())), effects
+
+PRESETS = {"novice_dj": novice_dj, "lofi": lofi, "stadium": stadium, "distorted": distorted}
+LATENT = (PitchShift, MP3Compressor, GSMFullRateCompressor, Resample)  # plugins whose output lags their input
+
+
+def has_latency(plugin) -> bool:
+    if isinstance(plugin, PluginContainer):
+        return any(has_latency(child) for child in plugin)
+    return isinstance(plugin, LATENT)
+
 
 class AudioMixer(MLModel):
+    """Renders songs through preset boards, one copy per worker thread so requests never share effect state."""
+    # renders exactly in blocks; novice_dj's pitch shift drifts when streamed, so it renders in one call
+    default_preset = "stadium"
+    block_size = 2 ** 16
+
     async def load(self):
-        self.delay_and_pitch_shift = Pedalboard([
-            Delay(delay_seconds=0.25, mix=1.0), PitchShift(semitones=7), Gain(gain_db=-3),
-        ])
-
-    @decode_args
-    async def predict(self, song: np.ndarray, sample_rate: np.ndarray) -> np.ndarray:
-
-        self.passthrough = Gain(gain_db=0)
-        self.board = Pedalboard([
-            Compressor(),
-            Mix([self.passthrough, self.delay_and_pitch_shift]),
-            Reverb()
-        ])
-        self.new_audio = self.board(song, sample_rate=sample_rate[0][0])
-        return self.new_audio
+        workers = os.cpu_count()
+        self.pool = ThreadPoolExecutor(max_workers=workers)
+        self.presets = {name: queue.SimpleQueue() for name in PRESETS}
+        for name, build in PRESETS.items():
+            for _ in range(workers):
+                self.presets[name].put(build())
+        return True
+
+    @timed_args
+    async def predict(
+        self, song: np.ndarray, sample_rate: np.ndarray, preset: Optional[List[str]] = None, overrides: Optional[List[str]] = None
+    ) -> np.ndarray:
+        preset = preset[0] if preset else self.default_preset
+        if preset not in PRESETS:
+            raise ValueError(f"Unknown preset '{preset}', expected one of {sorted(PRESETS)}")
+        loop = asyncio.get_running_loop()
+        with stage_timer(self).stage("render"):
+            return await loop.run_in_executor(
+                self.pool, self.render, song.astype(np.float32, copy=False), float(sample_rate[0][0]), preset, overrides or []
+            )
+
+    def render(self, song: np.ndarray, sample_rate: float, preset: str, overrides: List[str]) -> np.ndarray:
+        # there are as many copies as worker threads, so one is always free
+        board, effects = self.presets[preset].get()
+        previous = {}
+        try:
+            apply_overrides(effects, overrides, previous)
+            if has_latency(board):
+                return board(song, sample_rate)
+            board.reset()
+            new_audio = np.empty_like(song)
+            for start in range(0, song.shape[-1], self.block_size):
+                block = song[..., start: start + self.block_size]
+                new_audio[..., start: start + block.shape[-1]] = board.process(block, sample_rate, reset=False)
+            return new_audio
+        finally:
+            apply_overrides(effects, [f"{key}={value}" for key, value in previous.items()], {})
+            self.presets[preset].put((board, effects))
+
+
+def apply_overrides(effects: dict, overrides: List[str], previous: dict):
+    for override in overrides:
+        key, value = override.split("=", 1)
+        effect_name, attribute = key.split(".", 1)
+        if effect_name not in effects or not hasattr(effects[effect_name], attribute):
+            raise ValueError(f"Unknown effect parameter '{key}'")
+        effect = effects[effect_name]
+        previous.setdefault(key, getattr(effect, attribute))
+        setattr(effect, attribute, type(previous[key])(float(value)))
@@ -1,44 +1,87 @@
-from mlserver.codecs import StringCodec, NumpyCodec
-from pedalboard.io import AudioFile
-from faker import Faker
+from contextlib import closing
+from pathlib import Path
+import sys
+import time
+
+import gradio as gr
 import numpy as np
-import requests
-
-from glob import glob
-import os
-
-def make_sound(text, guidance_scale, max_new_tokens, sample_rate):
-    faker = Faker()
-    endpoint = "http://localhost:8080/v2/models/musicgen_model/infer"
-    input_request = {
-        'inputs': [
-            StringCodec.encode_input(name='text', payload=[text], use_bytes=False).dict(),
-            NumpyCodec.encode_input(name='guidance_scale', payload=np.array([guidance_scale])).dict(),
-            NumpyCodec.encode_input(name='max_new_tokens', payload=np.array([max_new_tokens])).dict()
-        ]
-    }
-    result = requests.post(endpoint, json=input_request).json()
-    audio_array = np.array(result['outputs'][0]['data'])
-
-    file_name = os.path.join('./music', f"{faker.user_name()}.mp3")
-    with AudioFile(file_name, "w", samplerate=sample_rate, num_channels=1) as f:
-        f.write(audio_array)
-    return sample_rate, audio_array
-
-
-def audio_effect():
-    endpoint = "http://localhost:7050/v2/models/novice_dj/infer"
-    files =  glob("./music/*.mp3")
-    latest_file = max(files, key=os.path.getctime)
-    with AudioFile(latest_file, "r") as f:
-        waveform = f.read(f.frames)
-        sample_rate = f.samplerate
-    input_request = {
-        'inputs': [
-            NumpyCodec.encode_input(name='song', payload=waveform).dict(),
-            NumpyCodec.encode_input(name='sample_rate', payload=np.array([sample_rate])).dict()
-        ]
-    }
-    result = requests.post(endpoint, json=input_request).json()
-    audio_array = np.array(result['outputs'][0]['data'])
+
+sys.path.append(str(Path(__file__).resolve().parents[2]))
+from shared.artifacts import ArtifactStore
+from shared.client import TensorClient
+from shared.jobs import JobQueue, RUNNING
+
+musicgen   = TensorClient(grpc_port=8081)
+novice_dj  = TensorClient(grpc_port=7060)
+audio_store = ArtifactStore()
+# as many in flight as the server batches together; the same prompt asked for again while it runs joins it
+MAX_GENERATIONS = 8
+generations = JobQueue(workers=MAX_GENERATIONS, ttl=600)
+PLAY_STEPS = 50  # `MusicGenServer.play_steps`, the tokens behind every streamed chunk
+
+def generate(progress, text, guidance_scale, max_new_tokens, seed=None):
+    chunks, total = [], max_new_tokens // PLAY_STEPS + 1
+    progress(0, total, "Generating")
+    # with a seed the server keeps the result, so asking again plays it back at once
+    seed = {} if seed is None else {"seed": np.array([[seed]], dtype=np.int64)}
+    with closing(musicgen.infer_stream(
+        "musicgen_model",
+        text=[text],
+        guidance_scale=np.array([[guidance_scale]], dtype=np.float64),
+        max_new_tokens=np.array([[max_new_tokens]], dtype=np.int64),
+        **seed,
+    )) as stream:
+        for audio_chunk, in stream:
+            chunks.append(audio_chunk)
+            progress.output(audio_chunk[0])
+            progress(min(len(chunks), total))
+    return np.concatenate(chunks, axis=-1)
+
+
+def make_sound(text, guidance_scale, max_new_tokens, sample_rate, seed, request: gr.Request, progress=gr.Progress()):
+    seed = None if seed is None else int(seed)
+    session = request.session_hash
+    job_id = generations.submit(
+        (text, guidance_scale, max_new_tokens, seed), generate, text, guidance_scale, max_new_tokens, seed,
+        session=session,
+    )
+    seen = 0
+    try:
+        # chunks arrive while the model is still generating, so playback starts on the first one
+        while True:
+            job = generations.poll(job_id, session, since=seen)
+            for audio_chunk in job["outputs"]:
+                yield sample_rate, audio_chunk
+            seen += len(job["outputs"])
+            if job["state"] not in RUNNING:
+                break
+            progress(job["progress"] or 0, desc=job["message"] or "Waiting for the model")
+            time.sleep(0.2)
+    except GeneratorExit:  # stopped, or the page was closed
+        generations.cancel(job_id, session)
+        raise
+    if job["state"] != "done":
+        raise gr.Error(f"The music could not be generated: {job['error'] or job['state']}")
+    audio_store.put(session, generations.result(job_id, session), sample_rate)
+
+
+def latest_sound(request: gr.Request):
+    artifact_id = audio_store.latest(request.session_hash)
+    if artifact_id is None:
+        raise gr.Error("Create some music first.")
+    return artifact_id
+
+
+def download_sound(request: gr.Request):
+    # MP3 encoding only happens here, the rest of the app works on the raw array
+    return audio_store.export(request.session_hash, latest_sound(request))
+
+
+def clear_session(request: gr.Request):
+    audio_store.drop_session(request.session_hash)
+
+
+def audio_effect(request: gr.Request):
+    waveform, sample_rate = audio_store.get(request.session_hash, latest_sound(request))
+    audio_array, = novice_dj.infer("novice_dj", song=waveform, sample_rate=np.array([[sample_rate]], dtype=np.float64))
     return gr.make_waveform((sample_rate, audio_array), bg_image="bg.png")
\ No newline at end of file
@@ -1,31 +1,88 @@
 from matplotlib.figure import Figure
 import matplotlib.pyplot as plt
-from pedalboard.io import AudioFile
+import gradio as gr
 import numpy as np
 
-from glob import glob
-import os
+from functools import lru_cache
+from typing import NamedTuple
 
-def get_latest_file():
-    files =  glob("./music/*.mp3")
-    latest_file = max(files, key=os.path.getctime)
-    with AudioFile(latest_file, "r") as f:
-        waveform = f.read(f.frames)
-        sample_rate = f.samplerate
-    return waveform, sample_rate
+from src.helpers import audio_store, latest_sound
 
-def make_waveform():
-    waveform, sample_rate = get_latest_file()
+PEAK_BLOCK = 16    # samples per bin at the finest level of the pyramid
+PEAK_FACTOR = 4    # bins merged into one at every coarser level
+N_FFT, HOP = 1024, 512
+MAX_POINTS = 2000  # bins drawn per channel, whatever the zoom
 
-    num_channels, num_frames = waveform.shape
-    time_axis = np.arange(0, num_frames) / sample_rate
+
+class AudioSummary(NamedTuple):
+    sample_rate: int
+    num_frames: int
+    peaks: list             # [(samples per bin, mins, maxs)], finest level first, each (channels, bins)
+    spectrogram: np.ndarray  # (channels, N_FFT // 2 + 1, frames) magnitude in dB
+
+
+@lru_cache(maxsize=8)
+def summarize(session_id, artifact_id) -> AudioSummary:
+    # artifacts never change once stored, so their ids are enough of a key
+    waveform, sample_rate = audio_store.get(session_id, artifact_id)
+    return AudioSummary(sample_rate, waveform.shape[1], peak_pyramid(waveform), stft_db(waveform))
+
+
+def peak_pyramid(waveform, block=PEAK_BLOCK, factor=PEAK_FACTOR) -> list:
+    """Min/max envelope per `block` samples, then repeatedly merged `factor` bins at a time."""
+    mins, maxs = _reduce(waveform, waveform, block)
+    levels = [(block, mins, maxs)]
+    while mins.shape[1] > factor:
+        mins, maxs = _reduce(mins, maxs, factor)
+        block *= factor
+        levels.append((block, mins, maxs))
+    return levels
+
+def _reduce(mins, maxs, size):
+    # pad with the last value so the tail bin is not lost and the min/max stay true
+    pad = (0, -mins.shape[1] % size)
+    mins = np.pad(mins, ((0, 0), pad), mode="edge").reshape(mins.shape[0], -1, size)
+    maxs = np.pad(maxs, ((0, 0), pad), mode="edge").reshape(maxs.shape[0], -1, size)
+    return mins.min(axis=2), maxs.max(axis=2)
+
+
+def stft_db(waveform, n_fft=N_FFT, hop=HOP) -> np.ndarray:
+    if waveform.shape[1] < n_fft:
+        waveform = np.pad(waveform, ((0, 0), (0, n_fft - waveform.shape[1])))
+    frames = np.lib.stride_tricks.sliding_window_view(waveform, n_fft, axis=1)[:, ::hop]
+    magnitude = np.abs(np.fft.rfft(frames * np.hanning(n_fft).astype(waveform.dtype), axis=2))
+    return (20 * np.log10(magnitude + 1e-6)).astype(np.float32).transpose(0, 2, 1)
+
+
+def visible_range(summary: AudioSummary, start, end):
+    start = 0.0 if start is None else max(float(start), 0.0)
+    end = summary.num_frames / summary.sample_rate if end is None else float(end)
+    return start, max(end, start + 1 / summary.sample_rate)
+
+def pick_level(peaks, num_samples, points=MAX_POINTS):
+    # the coarsest level that still has `points` bins across the visible samples
+    for block, mins, maxs in reversed(peaks):
+        if num_samples / block >= points:
+            return block, mins, maxs
+    return peaks[0]
+
+
+def make_waveform(request: gr.Request, start=None, end=None, points=MAX_POINTS):
+    summary = summarize(request.session_hash, latest_sound(request))
+    start, end = visible_range(summary, start, end)
+    block, mins, maxs = pick_level(summary.peaks, (end - start) * summary.sample_rate, points)
+    first, last = int(start * summary.sample_rate // block), int(np.ceil(end * summary.sample_rate / block))
+    time_axis = np.arange(first, min(last, mins.shape[1])) * block / summary.sample_rate
+
+    num_channels = mins.shape[0]
     with plt.xkcd():
-        figure = Figure() 
+        figure = Figure()
         axes = figure.subplots(num_channels, 1)
         if num_channels == 1:
             axes = [axes]
         for c in range(num_channels):
-            axes[c].plot(time_axis, waveform[c], linewidth=1)
+            axes[c].fill_between(time_axis, mins[c, first:last], maxs[c, first:last], linewidth=0)
+            axes[c].set_xlim(start, end)
             axes[c].grid(True)
             if num_channels > 1:
                 axes[c].set_ylabel(f"Channel {c+1}")
@@ -33,18 +90,28 @@ def make_waveform():
     return figure
 
 
-def make_spectogram():
-    waveform, sample_rate = get_latest_file()
+def make_spectogram(request: gr.Request, start=None, end=None, points=MAX_POINTS):
+    summary = summarize(request.session_hash, latest_sound(request))
+    start, end = visible_range(summary, start, end)
+    first, last = int(start * summary.sample_rate // HOP), int(np.ceil(end * summary.sample_rate / HOP))
+    spectrogram = summary.spectrogram[..., first:last]
+    # louder of every `step` frames, so short transients survive the decimation
+    step = max(1, int(np.ceil(spectrogram.shape[2] / points)))
+    spectrogram = np.pad(spectrogram, ((0, 0), (0, 0), (0, -spectrogram.shape[2] % step)), mode="edge")
+    spectrogram = spectrogram.reshape(*spectrogram.shape[:2], -1, step).max(axis=3)
 
-    num_channels, num_frames = waveform.shape
+    num_channels = spectrogram.shape[0]
     with plt.xkcd():
-        figure = Figure() 
+        figure = Figure()
         axes = figure.subplots(num_channels, 1)
         if num_channels == 1:
             axes = [axes]
         for c in range(num_channels):
-            axes[c].specgram(waveform[c], Fs=sample_rate)
+            axes[c].imshow(
+                spectrogram[c], origin="lower", aspect="auto", extent=(start, end, 0, summary.sample_rate / 2),
+                vmin=spectrogram[c].max() - 80, vmax=spectrogram[c].max(),
+            )
             if num_channels > 1:
                 axes[c].set_ylabel(f"Channel {c+1}")
         figure.suptitle("Spectrogram")
-    return figure
\ No newline at end of file
+    return figure
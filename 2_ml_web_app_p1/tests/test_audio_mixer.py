@@ -0,0 +1,60 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pytest
+from mlserver import ModelSettings
+
+from servers.pedal_board.audio_mixer import PRESETS, AudioMixer, has_latency
+
+SAMPLE_RATE = 44100
+
+
+@pytest.fixture(scope="module")
+def mixer():
+    mixer = AudioMixer(ModelSettings(name="novice_dj", implementation=AudioMixer))
+    mixer.block_size = 2 ** 14  # several blocks for a few seconds of audio
+    assert asyncio.run(mixer.load())
+    return mixer
+
+
+@pytest.fixture(scope="module")
+def song():
+    return np.random.default_rng(0).normal(0, 0.1, (2, SAMPLE_RATE * 3)).astype(np.float32)
+
+
+@pytest.mark.parametrize("preset", sorted(PRESETS))
+def test_render_matches_one_shot(mixer, song, preset):
+    board, _ = PRESETS[preset]()
+    np.testing.assert_allclose(mixer.render(song, SAMPLE_RATE, preset, []), board(song, SAMPLE_RATE), atol=1e-5)
+
+
+def test_only_the_pitch_shifted_preset_is_latent():
+    assert {name for name, build in PRESETS.items() if has_latency(build()[0])} == {"novice_dj"}
+
+
+def test_requests_without_a_preset_render_in_blocks(mixer, song):
+    board, _ = PRESETS[mixer.default_preset]()
+    assert not has_latency(board)
+    rendered = asyncio.run(mixer.predict.__wrapped__(mixer, song, np.array([[SAMPLE_RATE]])))
+    np.testing.assert_allclose(rendered, board(song, SAMPLE_RATE), atol=1e-5)
+
+
+def test_overrides_apply_to_one_request_only(mixer, song):
+    board, effects = PRESETS["stadium"]()
+    effects["reverb"].room_size = 0.2
+    expected = board(song, SAMPLE_RATE)
+    np.testing.assert_allclose(mixer.render(song, SAMPLE_RATE, "stadium", ["reverb.room_size=0.2"]), expected, atol=1e-5)
+    np.testing.assert_allclose(
+        mixer.render(song, SAMPLE_RATE, "stadium", []), PRESETS["stadium"]()[0](song, SAMPLE_RATE), atol=1e-5
+    )
+    with pytest.raises(ValueError):
+        mixer.render(song, SAMPLE_RATE, "stadium", ["reverb.no_such_knob=1"])
+
+
+def test_concurrent_renders_do_not_share_state(mixer, song):
+    expected = PRESETS["lofi"]()[0](song, SAMPLE_RATE)
+    with ThreadPoolExecutor(4) as pool:
+        results = list(pool.map(lambda _: mixer.render(song, SAMPLE_RATE, "lofi", []), range(8)))
+    for result in results:
+        np.testing.assert_allclose(result, expected, atol=1e-5)
@@ -0,0 +1,52 @@
+import threading
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+pytest.importorskip("gradio")
+from src import helpers  # noqa: E402
+
+
+@pytest.fixture
+def generation(monkeypatch, tmp_path):
+    """A fake `generate` that sends one chunk, then holds until released."""
+    release, calls = threading.Event(), []
+
+    def generate(progress, text, guidance_scale, max_new_tokens, seed=None):
+        calls.append(text)
+        progress.output(np.ones(4, np.float32))
+        progress(1, 2, "Generating")
+        release.wait(2)
+        progress(2, 2)
+        return np.ones((1, 8), np.float32)
+
+    monkeypatch.setattr(helpers, "generate", generate)
+    monkeypatch.setattr(helpers, "generations", helpers.JobQueue(workers=helpers.MAX_GENERATIONS))
+    monkeypatch.setattr(helpers, "audio_store", helpers.ArtifactStore(tmp_path))
+    return SimpleNamespace(release=release, calls=calls)
+
+
+def sound(text, session):
+    return helpers.make_sound(text, 3, 100, 32000, None, SimpleNamespace(session_hash=session), progress=lambda *a, **k: None)
+
+
+def test_same_prompt_from_two_sessions_is_generated_once(generation):
+    first, second = sound("lofi", "a"), sound("lofi", "b")
+    assert next(first)[1].tolist() == next(second)[1].tolist() == [1, 1, 1, 1]
+    generation.release.set()
+    assert list(first) == list(second) == []
+    assert generation.calls == ["lofi"]
+    assert helpers.audio_store.latest("a") is not None and helpers.audio_store.latest("b") is not None
+
+
+def test_stopping_withdraws_only_that_session(generation):
+    first, second = sound("lofi", "a"), sound("lofi", "b")
+    next(first), next(second)
+    first.close()  # what gradio does when "Stop" cancels the event
+    job_id = next(iter(helpers.generations.jobs))
+    assert helpers.generations.poll(job_id, "a")["state"] == "cancelled"
+    generation.release.set()
+    list(second)
+    assert helpers.generations.poll(job_id, "b")["state"] == "done"
+    assert helpers.audio_store.latest("a") is None
@@ -0,0 +1,50 @@
+import asyncio
+import time
+
+from mlserver import ModelSettings
+from mlserver.codecs import NumpyCodec, StringCodec
+from mlserver.types import InferenceRequest
+
+from benchmarks.load import APP, server_config
+from benchmarks.stubs import SAMPLES_PER_TOKEN, TARGETS, MusicGenStub
+
+
+def stub(cost_scale=1.0):
+    model = MusicGenStub(ModelSettings(
+        name="musicgen_model", implementation=MusicGenStub, parameters={"extra": {"cost_scale": cost_scale}},
+    ))
+    asyncio.run(model.load())
+    return model
+
+
+def request(tokens):
+    inputs = TARGETS["musicgen_model"].payload(tokens)
+    return InferenceRequest(inputs=[
+        StringCodec.encode_input("text", inputs["text"], use_bytes=False),
+        NumpyCodec.encode_input("guidance_scale", inputs["guidance_scale"]),
+        NumpyCodec.encode_input("max_new_tokens", inputs["max_new_tokens"]),
+    ])
+
+
+def test_stub_returns_audio_for_the_requested_tokens():
+    response = asyncio.run(stub(cost_scale=0).predict(request(20)))
+    assert NumpyCodec.decode_output(response.outputs[0]).shape == (1, 20 * SAMPLES_PER_TOKEN)
+    assert response.parameters.inference_us == 0
+
+
+def test_stub_sleeps_without_blocking_the_event_loop():
+    model = stub(cost_scale=1)
+
+    async def concurrently():
+        return await asyncio.gather(*(model.predict(request(20)) for _ in range(4)))
+
+    start = time.perf_counter()
+    responses = asyncio.run(concurrently())
+    assert time.perf_counter() - start < 0.6  # 4 x 0.2 s if they ran one after another
+    assert all(response.parameters.inference_us == 200_000 for response in responses)
+
+
+def test_targets_without_settings_files_are_named_after_the_target():
+    settings, model = server_config(APP, "musicgen_model", TARGETS["musicgen_model"])
+    assert settings["parallel_workers"] == 0 and model == {"name": "musicgen_model"}
+    assert server_config(APP, "novice_dj", TARGETS["novice_dj"])[1]["name"] == "novice_dj"
@@ -0,0 +1,109 @@
+import asyncio
+
+import numpy as np
+import pytest
+from mlserver import ModelSettings
+from mlserver.codecs import NumpyCodec, StringCodec
+from mlserver.types import InferenceRequest
+
+from benchmarks.musicgen_streaming import fake_processor, tiny_musicgen
+from servers.ml_model.ml_services import MusicGenServer
+
+
+def request(text="lofi beats", tokens=60, guidance=3.0, seed=None):
+    inputs = [
+        StringCodec.encode_input("text", [text], use_bytes=False),
+        NumpyCodec.encode_input("guidance_scale", np.array([[guidance]])),
+        NumpyCodec.encode_input("max_new_tokens", np.array([[tokens]])),
+    ]
+    if seed is not None:
+        inputs.append(NumpyCodec.encode_input("seed", np.array([[seed]])))
+    return InferenceRequest(inputs=inputs)
+
+
+@pytest.fixture(scope="module")
+def model():
+    return tiny_musicgen()
+
+
+@pytest.fixture
+def server(model):
+    server = MusicGenServer(ModelSettings(name="musicgen_model", implementation=MusicGenServer))
+    server.model, server.processor, server.play_steps = model, fake_processor, 20
+    return server
+
+
+async def stream(server, payload):
+    async def payloads():
+        yield payload
+
+    return [NumpyCodec.decode_output(response.outputs[0])[0] async for response in server.predict_stream(payloads())]
+
+
+def test_stream_sends_chunks_that_add_up_to_the_song(server):
+    server.result_cache_size = 0
+
+    async def both():
+        whole = NumpyCodec.decode_output((await server.predict(request(seed=3))).outputs[0])[0]
+        return whole, await stream(server, request(seed=3))
+
+    whole, chunks = asyncio.run(both())
+    assert len(chunks) > 1
+    assert sum(len(chunk) for chunk in chunks) == len(whole)
+    # the tail comes from the finished waveform, so it is exact
+    np.testing.assert_allclose(chunks[-1], whole[-len(chunks[-1]):], atol=1e-6)
+
+
+def batch_sizes(server):
+    sizes, generate = [], server.generate
+
+    def recording(batch, send):
+        sizes.append(len(batch))
+        return generate(batch, send)
+
+    server.generate = recording
+    return sizes
+
+
+def song(response):
+    return NumpyCodec.decode_output(response.outputs[0])
+
+
+def test_prompts_arriving_together_share_a_batch(server):
+    sizes = batch_sizes(server)
+
+    async def together():
+        return await asyncio.gather(*(server.predict(request(text, tokens=20)) for text in ["lofi", "jazz", "rock"]))
+
+    assert [len(song(response)) for response in asyncio.run(together())] == [1, 1, 1]
+    assert sizes == [3]
+
+
+def test_seeded_prompts_run_alone_and_sound_the_same_in_company(server):
+    server.result_cache_size = 0
+    sizes = batch_sizes(server)
+
+    async def alone_then_in_company():
+        alone = await server.predict(request("lofi", tokens=20, seed=7))
+        company = await asyncio.gather(*(server.predict(request(text, tokens=20, seed=7)) for text in ["rock", "lofi"]))
+        return song(alone), song(company[1])
+
+    alone, in_company = asyncio.run(alone_then_in_company())
+    np.testing.assert_array_equal(in_company, alone)
+    assert sizes == [1, 1, 1]
+
+
+def test_prompts_of_callers_that_left_are_dropped_from_the_batch(server):
+    sizes = batch_sizes(server)
+
+    async def one_gives_up():
+        leaving = asyncio.create_task(server.predict(request("jazz", tokens=20)))
+        streaming = asyncio.create_task(stream(server, request("lofi", tokens=20)))
+        staying = asyncio.create_task(server.predict(request("rock", tokens=20)))
+        await asyncio.sleep(0)  # all three are queued, the batch has not started
+        leaving.cancel()
+        streaming.cancel()
+        return await staying
+
+    assert len(song(asyncio.run(one_gives_up()))) == 1
+    assert sizes == [1]
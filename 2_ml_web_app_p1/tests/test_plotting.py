@@ -0,0 +1,43 @@
+import numpy as np
+import pytest
+
+pytest.importorskip("gradio")
+from src.plotting import HOP, N_FFT, pick_level, peak_pyramid, stft_db, AudioSummary, visible_range
+
+
+@pytest.fixture
+def waveform():
+    return np.random.default_rng(0).normal(0, 0.3, (2, 10_007)).astype(np.float32)
+
+
+def test_every_level_keeps_the_true_envelope(waveform):
+    levels = peak_pyramid(waveform, block=16, factor=4)
+    assert [block for block, _, _ in levels] == [16, 64, 256, 1024, 4096]
+    for block, mins, maxs in levels:
+        assert mins.shape == (2, -(-waveform.shape[1] // block))
+        for bin in (0, mins.shape[1] // 2, mins.shape[1] - 1):
+            chunk = waveform[:, bin * block: (bin + 1) * block]
+            np.testing.assert_array_equal(mins[:, bin], chunk.min(axis=1))
+            np.testing.assert_array_equal(maxs[:, bin], chunk.max(axis=1))
+
+
+def test_pick_level_draws_about_enough_points(waveform):
+    levels = peak_pyramid(waveform, block=16, factor=4)
+    assert pick_level(levels, waveform.shape[1], points=100)[0] == 64
+    assert pick_level(levels, 500, points=100)[0] == 16  # zoomed in past the finest level
+
+
+def test_spectrogram_finds_a_tone():
+    rate = 8000
+    tone = np.sin(2 * np.pi * 1000 * np.arange(rate) / rate).astype(np.float32)[None]
+    spectrogram = stft_db(tone)
+    assert spectrogram.shape == (1, N_FFT // 2 + 1, (rate - N_FFT) // HOP + 1)
+    assert abs(spectrogram[0].mean(axis=1).argmax() * rate / N_FFT - 1000) < rate / N_FFT
+    assert stft_db(tone[:, :100]).shape[2] == 1  # shorter than one FFT
+
+
+def test_visible_range_defaults_to_the_whole_song():
+    summary = AudioSummary(100, 1000, [], np.empty(0))
+    assert visible_range(summary, None, None) == (0.0, 10.0)
+    assert visible_range(summary, -3, 2) == (0.0, 2.0)
+    assert visible_range(summary, 5, 5)[1] > 5
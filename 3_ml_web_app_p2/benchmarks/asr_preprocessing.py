@@ -0,0 +1,52 @@
+"""
+Cost of `ASRServer`'s pre-processing on its own: resampling and voice detection.
+
+    python -m benchmarks.asr_preprocessing --seconds 30 180 600
+
+Compares the old `librosa.resample` call (first call included, as a fresh server pays it),
+scipy's `resample_poly` and the soxr resampler now used, then times the energy VAD over the
+resampled song. Needs numpy, scipy, soxr and librosa only.
+"""
+from math import gcd
+import argparse
+import time
+
+import librosa
+import numpy as np
+from scipy.signal import resample_poly
+
+from servers.transcriptor.asr_model import has_voice, loudness_reference, resample
+from servers.windows import window_starts
+
+
+def timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    return result, time.perf_counter() - start
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--seconds", type=int, nargs="+", default=[30, 180, 600])
+    parser.add_argument("--sample-rate", type=int, default=44100)
+    args = parser.parse_args()
+
+    target = 16000
+    factor = gcd(args.sample_rate, target)
+    print(f"{'seconds':>8} {'librosa s':>10} {'scipy poly s':>13} {'soxr s':>7} {'vad s':>7} {'windows kept':>13}")
+    for seconds in args.seconds:
+        song = np.random.default_rng(0).normal(0, 0.1, args.sample_rate * seconds).astype(np.float32)
+        _, librosa_time = timed(lambda: librosa.resample(song, orig_sr=args.sample_rate, target_sr=target))
+        _, poly_time = timed(lambda: resample_poly(song, target // factor, args.sample_rate // factor))
+        resampled, soxr_time = timed(lambda: resample(song, args.sample_rate, target))
+        starts = window_starts(len(resampled), 30 * target, 5 * target)
+
+        def vad():
+            reference = loudness_reference(resampled, target)
+            return [s for s in starts if has_voice(resampled[s: s + 30 * target], target, reference)]
+
+        kept, vad_time = timed(vad)
+        print(
+            f"{seconds:>8} {librosa_time:>10.3f} {poly_time:>13.3f} {soxr_time:>7.3f} {vad_time:>7.3f} "
+            f"{len(kept):>6}/{len(starts)}"
+        )
@@ -0,0 +1,92 @@
+"""
+CPU throughput of `MusicEmbeddings` at different batch sizes.
+
+    python -m benchmarks.audio_batching --batch-sizes 1 8 32 --items 32 --seconds 10
+    python -m benchmarks.audio_batching --random-weights   # without downloading the checkpoint
+
+Needs the model environment (mlserver, panns_inference). The model is loaded in-process on
+the CPU and sent `--items` songs of `--seconds` in requests of `batch_size` songs, which it
+embeds `batch_size` windows at a time. `--random-weights` writes a randomly initialised
+Cnn14 checkpoint to a temporary file instead of using the pretrained one; the throughput
+is the same. The size of a response's embeddings, in raw bytes as gRPC sends them, is
+printed for float32 and float16.
+"""
+from pathlib import Path
+import argparse
+import asyncio
+import json
+import tempfile
+import time
+
+import numpy as np
+import torch
+from mlserver import ModelSettings
+from mlserver.codecs import NumpyCodec, StringCodec
+from mlserver.types import InferenceRequest
+
+from servers.audio_embeddings.audio_embs import MusicEmbeddings, SAMPLE_RATE
+
+SETTINGS = Path(__file__).resolve().parent.parent / "servers" / "audio_embeddings" / "model-settings.json"
+
+
+def random_checkpoint(folder: str) -> str:
+    from panns_inference.config import classes_num
+    from panns_inference.models import Cnn14
+    path = str(Path(folder) / "Cnn14_random.pth")
+    model = Cnn14(
+        sample_rate=SAMPLE_RATE, window_size=1024, hop_size=320, mel_bins=64, fmin=50, fmax=14000,
+        classes_num=classes_num,
+    )
+    torch.save({"model": model.state_dict()}, path)
+    return path
+
+
+def request(songs: np.ndarray, dtype: str) -> InferenceRequest:
+    return InferenceRequest(inputs=[
+        NumpyCodec.encode_input("song", songs), StringCodec.encode_input("dtype", [dtype], use_bytes=False),
+    ])
+
+
+async def throughput(model, songs, batch_size):
+    model.batch_size = batch_size
+    requests = [request(songs[i: i + batch_size], "float32") for i in range(0, len(songs), batch_size)]
+    await model.predict(requests[0])
+    start = time.perf_counter()
+    for payload in requests:
+        response = await model.predict(payload)
+    elapsed = time.perf_counter() - start
+    return len(songs) / elapsed, elapsed / len(requests)
+
+
+async def main(args, checkpoint=None):
+    config = json.loads(SETTINGS.read_text())
+    extra = {**config["parameters"]["extra"], "device": "cpu", "threads": args.threads}
+    if checkpoint:
+        extra["checkpoint_path"] = checkpoint
+    model = MusicEmbeddings(ModelSettings(name=config["name"], implementation=MusicEmbeddings, parameters={"extra": extra}))
+    await model.load()
+    songs = np.random.default_rng(0).normal(0, 0.1, (args.items, args.seconds * SAMPLE_RATE)).astype(np.float32)
+
+    print(f"{'batch':>6} {'songs/s':>9} {'ms/request':>11} {'fp32 KB':>8} {'fp16 KB':>8}")
+    for batch_size in args.batch_sizes:
+        per_second, per_request = await throughput(model, songs, batch_size)
+        sizes = [
+            NumpyCodec.decode_output((await model.predict(request(songs[:batch_size], dtype))).outputs[0]).nbytes
+            for dtype in ("float32", "float16")
+        ]
+        print(f"{batch_size:>6} {per_second:>9.2f} {per_request * 1000:>11.1f} {sizes[0] / 1024:>8.1f} {sizes[1] / 1024:>8.1f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--items", type=int, default=32)
+    parser.add_argument("--seconds", type=int, default=10)
+    parser.add_argument("--threads", type=int, default=None)
+    parser.add_argument("--random-weights", action="store_true")
+    args = parser.parse_args()
+    if args.random_weights:
+        with tempfile.TemporaryDirectory() as folder:
+            asyncio.run(main(args, random_checkpoint(folder)))
+    else:
+        asyncio.run(main(args))
@@ -0,0 +1,162 @@
+"""
+Accuracy and latency of the int8 and bf16 variants (`servers/precision.py`) against fp32.
+
+    python -m benchmarks.compare_precision --models sentiformer text_embedding --precisions int8 bf16
+    python -m benchmarks.compare_precision --models music_transcriber --songs ./music/catalog/*.mp3 --seconds 60
+
+Needs the model environment. Every model is loaded in-process once per precision with its
+own `model-settings.json`, the precision swapped, and fed the same lyrics or songs as the
+frontend sends; converted weights land in the cache as a side effect. Accuracy is measured
+against the fp32 outputs: top-1 agreement and the largest score change for the classifiers,
+cosine similarity for text embeddings and word error rate for transcripts.
+"""
+from pathlib import Path
+from typing import Callable, NamedTuple
+import argparse
+import asyncio
+import json
+import time
+
+from mlserver import ModelSettings
+from pedalboard.io import AudioFile
+import numpy as np
+import torch
+
+from benchmarks.text_batching import LYRICS
+from servers.music_cls.music_cls import MusicClassifier
+from servers.sentiment.emotions import EmotionClassifier
+from servers.text_embeddings.text_embs import TextEmbeddings
+from servers.transcriptor.asr_model import ASRServer
+
+APP = Path(__file__).resolve().parent.parent
+SERVERS = APP / "servers"
+
+
+class Candidate(NamedTuple):
+    model_class: type
+    folder: str
+    inputs: Callable    # songs -> list of keyword arguments for predict
+    accuracy: Callable  # (fp32 output, output) -> {metric: value}
+
+
+def emotion_accuracy(reference, output) -> dict:
+    return {
+        "top1_agreement": float(np.mean(reference.values.argmax(axis=1) == output.values.argmax(axis=1))),
+        "max_score_change": float(np.abs(reference.values - output.values).max()),
+    }
+
+
+def genre_accuracy(reference, output) -> dict:
+    # the pipeline returns the top genres sorted by score
+    scores = dict(zip(reference["label"], reference["score"]))
+    return {
+        "top1_agreement": float(reference["label"].iloc[0] == output["label"].iloc[0]),
+        "max_score_change": float(max(abs(scores.get(label, 0.0) - score) for label, score in zip(output["label"], output["score"]))),
+    }
+
+
+def embedding_accuracy(reference, output) -> dict:
+    cosine = np.sum(reference * output, axis=1) / (np.linalg.norm(reference, axis=1) * np.linalg.norm(output, axis=1))
+    return {"min_cosine": float(cosine.min()), "mean_cosine": float(cosine.mean())}
+
+
+def transcript_accuracy(reference, output) -> dict:
+    return {"word_error_rate": word_error_rate(reference[0].split(), output[0].split())}
+
+
+def word_error_rate(reference: list, hypothesis: list) -> float:
+    distances = list(range(len(hypothesis) + 1))
+    for idx, word in enumerate(reference, 1):
+        previous, distances[0] = distances[0], idx
+        for jdx, other in enumerate(hypothesis, 1):
+            previous, distances[jdx] = distances[jdx], min(
+                distances[jdx] + 1, distances[jdx - 1] + 1, previous + (word != other)
+            )
+    return distances[-1] / max(len(reference), 1)
+
+
+CANDIDATES = {
+    "sentiformer": Candidate(EmotionClassifier, "sentiment", lambda songs: [{"lyrics": LYRICS}], emotion_accuracy),
+    "text_embedding": Candidate(
+        TextEmbeddings, "text_embeddings", lambda songs: [{"lyrics": LYRICS}], embedding_accuracy,
+    ),
+    "music_classifier": Candidate(
+        MusicClassifier, "music_cls", lambda songs: [{"song": song[:1]} for song, _ in songs], genre_accuracy,
+    ),
+    "music_transcriber": Candidate(
+        ASRServer, "transcriptor",
+        lambda songs: [{"song": song, "sample_rate": np.array([[sample_rate]])} for song, sample_rate in songs],
+        transcript_accuracy,
+    ),
+}
+
+
+def read_songs(paths, seconds) -> list:
+    songs = []
+    for path in paths:
+        with AudioFile(str(path)) as f:
+            songs.append((f.read(int(seconds * f.samplerate)), f.samplerate))
+    return songs
+
+
+async def load(candidate: Candidate, precision: str):
+    config = json.loads((SERVERS / candidate.folder / "model-settings.json").read_text())
+    parameters = config.get("parameters") or {}
+    parameters["extra"] = {**(parameters.get("extra") or {}), "precision": precision}
+    model = candidate.model_class(
+        ModelSettings(name=config["name"], implementation=candidate.model_class, parameters=parameters)
+    )
+    await model.load()
+    return model
+
+
+async def run(model, inputs, repeats):
+    # predict without its codecs, so only the model is timed
+    predict = type(model).predict.__wrapped__
+    outputs, timings = [], []
+    for kwargs in inputs:
+        outputs.append(await predict(model, **kwargs))
+        start = time.perf_counter()
+        for _ in range(repeats):
+            await predict(model, **kwargs)
+        timings.append((time.perf_counter() - start) / repeats)
+    return outputs, float(np.mean(timings))
+
+
+async def main(args):
+    songs = read_songs(args.songs, args.seconds)
+    print(f"{'model':>18} {'precision':>9} {'load s':>7} {'ms/call':>9} {'speedup':>8}  accuracy vs fp32")
+    for name in args.models:
+        candidate = CANDIDATES[name]
+        inputs = candidate.inputs(songs)
+        reference = reference_ms = None
+        for precision in ["fp32"] + [precision for precision in args.precisions if precision != "fp32"]:
+            start = time.perf_counter()
+            model = await load(candidate, precision)
+            loaded = time.perf_counter() - start
+            outputs, seconds = await run(model, inputs, args.repeats)
+            del model
+            if reference is None:
+                reference, reference_ms = outputs, seconds
+            scores = {}
+            for expected, output in zip(reference, outputs):
+                for metric, value in candidate.accuracy(expected, output).items():
+                    scores.setdefault(metric, []).append(value)
+            summary = ", ".join(f"{metric} {np.mean(values):.4f}" for metric, values in scores.items())
+            print(
+                f"{name:>18} {precision:>9} {loaded:>7.1f} {seconds * 1000:>9.1f} {reference_ms / seconds:>7.2f}x  {summary}"
+            )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--models", nargs="+", default=list(CANDIDATES), choices=list(CANDIDATES))
+    parser.add_argument("--precisions", nargs="+", default=["int8", "bf16"], choices=["fp32", "int8", "bf16"])
+    parser.add_argument("--songs", nargs="+", default=[str(APP / "05mUf9x3V3RIqafuY4H54E.mp3")])
+    parser.add_argument("--seconds", type=float, default=30, help="audio read from the start of each song")
+    parser.add_argument("--repeats", type=int, default=3, help="timed calls per input, after one untimed call")
+    parser.add_argument("--threads", type=int, default=None)
+    args = parser.parse_args()
+    if args.threads:
+        torch.set_num_threads(args.threads)
+    asyncio.run(main(args))
@@ -0,0 +1,60 @@
+"""
+`MusicClassifier` latency against song length, whole-song versus windowed.
+
+    python -m benchmarks.genre_windows --seconds 30 180 600
+
+Needs the model environment. The classifier is loaded in-process and each length of the
+song (looped if it is shorter) is classified three ways: the whole first channel in one
+call as before, the windows from `servers/music_cls/model-settings.json`, and the same
+windows without the early exit. The genre each one picks is printed next to its time.
+"""
+from pathlib import Path
+import argparse
+import asyncio
+import json
+import time
+
+from mlserver import ModelSettings
+from pedalboard.io import AudioFile
+import numpy as np
+
+from servers.music_cls.music_cls import MusicClassifier
+
+APP = Path(__file__).resolve().parent.parent
+SETTINGS = APP / "servers" / "music_cls" / "model-settings.json"
+
+
+async def load(**overrides):
+    config = json.loads(SETTINGS.read_text())
+    extra = {**config["parameters"]["extra"], **overrides}
+    model = MusicClassifier(ModelSettings(name=config["name"], implementation=MusicClassifier, parameters={"extra": extra}))
+    await model.load()
+    return model
+
+
+async def main(args):
+    with AudioFile(args.song) as f:
+        audio, sample_rate = f.read(f.frames)[:1], f.samplerate
+    windowed = await load()
+    modes = {
+        "whole song": await load(window_seconds=None),
+        "windows": windowed,
+        "no early exit": await load(stable_windows=None),
+    }
+    predict = MusicClassifier.predict.__wrapped__
+    print(f"{'seconds':>8} {'mode':>14} {'ms':>9}  top genre")
+    for seconds in args.seconds:
+        song = np.tile(audio, (1, -(-seconds * sample_rate // audio.shape[1])))[:, : seconds * sample_rate]
+        for mode, model in modes.items():
+            await predict(model, song[:, : sample_rate], np.array([[sample_rate]]))
+            start = time.perf_counter()
+            genres = await predict(model, song, np.array([[sample_rate]]))
+            elapsed = time.perf_counter() - start
+            print(f"{seconds:>8} {mode:>14} {elapsed * 1000:>9.1f}  {genres['label'].iloc[0]} {genres['score'].iloc[0]:.2f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--seconds", type=int, nargs="+", default=[30, 180, 600])
+    parser.add_argument("--song", default=str(APP / "05mUf9x3V3RIqafuY4H54E.mp3"))
+    asyncio.run(main(parser.parse_args()))
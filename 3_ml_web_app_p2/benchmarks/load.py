@@ -0,0 +1,17 @@
+"""
+Load test of every model server in `servers/` against the stubs in `benchmarks/stubs.py`,
+with the harness in `shared/load.py`.
+
+    python -m benchmarks.load --concurrency 1 4 16 --requests 50
+    python -m benchmarks.load --targets music_splitter --seconds 30 180 --compare benchmarks/results/<old>.json
+"""
+from pathlib import Path
+import sys
+
+APP = Path(__file__).resolve().parent.parent
+sys.path.append(str(APP.parent))
+from shared.load import main, parser, server_config
+from benchmarks.stubs import TARGETS
+
+if __name__ == "__main__":
+    main(parser().parse_args(), TARGETS, APP)
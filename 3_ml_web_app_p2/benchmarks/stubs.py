@@ -0,0 +1,105 @@
+"""
+Stand-ins for every model in `servers/`, used by `benchmarks.load`. Each one takes and
+returns what the real model does, and costs a fixed time per second of audio or per lyric
+rather than the real model's. Only relative numbers matter.
+"""
+from pathlib import Path
+from typing import List, Optional
+import sys
+import numpy as np
+import pandas as pd
+
+from mlserver.codecs import decode_args, NumpyCodec, StringCodec
+from mlserver.types import InferenceRequest, InferenceResponse
+
+sys.path.append(str(Path(__file__).resolve().parents[2]))
+from shared.load import StubModel, Target
+
+EMOTIONS = [f"emotion_{idx}" for idx in range(28)]
+GENRES = ["blues", "classical", "country", "disco", "hiphop", "jazz", "metal", "pop", "reggae", "rock"]
+LYRIC = "and the rain keeps falling on the town where we were young " * 6
+
+
+class MusicEmbeddingsStub(StubModel):
+    @decode_args
+    async def stub(
+        self, song: np.ndarray, lengths: Optional[np.ndarray] = None, dtype: Optional[List[str]] = None
+    ) -> np.ndarray:
+        await self.busy(0.03 * min(song.shape[-1] / 32000 / 10, 6) * len(song))
+        return np.ones((len(song), 2048), dtype=np.float16 if dtype and dtype[0] == "float16" else np.float32)
+
+
+class MusicClassifierStub(StubModel):
+    @decode_args
+    async def stub(self, song: np.ndarray, sample_rate: Optional[np.ndarray] = None) -> pd.DataFrame:
+        await self.busy(0.05 * min(song.shape[-1] / 44100 / 10, 8))
+        return pd.DataFrame({"score": np.linspace(0.5, 0.1, 5), "label": pd.Series(GENRES[:5], dtype=object)})
+
+
+class EmotionClassifierStub(StubModel):
+    @decode_args
+    async def stub(self, lyrics: List[str]) -> pd.DataFrame:
+        await self.busy(0.002 * len(lyrics))
+        return pd.DataFrame(np.full((len(lyrics), len(EMOTIONS)), 1 / len(EMOTIONS)), columns=EMOTIONS)
+
+
+class SongSplitterStub(StubModel):
+    @decode_args
+    async def stub(self, song: np.ndarray) -> np.ndarray:
+        await self.busy(0.05 * song.shape[-1] / 44100)
+        return np.vstack([song, song]).astype(np.float32)
+
+
+class TextEmbeddingsStub(StubModel):
+    @decode_args
+    async def stub(self, lyrics: List[str]) -> np.ndarray:
+        await self.busy(0.001 * len(lyrics))
+        return np.ones((len(lyrics), 384), dtype=np.float32)
+
+
+class ASRServerStub(StubModel):
+    @decode_args
+    async def stub(self, song: np.ndarray, sample_rate: np.ndarray) -> List[str]:
+        await self.busy(0.02 * song.shape[-1] / sample_rate[0][0])
+        return [LYRIC]
+
+
+class SongPipelineStub(StubModel):
+    async def stub(self, payload: InferenceRequest) -> InferenceResponse:
+        song = NumpyCodec.decode_input(payload.inputs[0])
+        await self.busy(0.08 * song.shape[-1] / 44100)
+        return InferenceResponse(model_name=self.name, outputs=[
+            StringCodec.encode_output(name="lyrics", payload=[LYRIC]),
+            NumpyCodec.encode_output(name="emotions", payload=np.full((1, len(EMOTIONS)), 1 / len(EMOTIONS))),
+            StringCodec.encode_output(name="emotion_labels", payload=EMOTIONS),
+            NumpyCodec.encode_output(name="lyrics_embedding", payload=np.ones((1, 384), dtype=np.float32)),
+        ])
+
+
+def song(seconds, channels=2, sample_rate=44100):
+    return np.random.default_rng(seconds).normal(0, 0.1, (channels, seconds * sample_rate)).astype(np.float32)
+
+
+TARGETS = {
+    "audio_embedding": Target(
+        MusicEmbeddingsStub, lambda seconds: {"song": song(seconds, 1, 32000)}, "seconds", folder="audio_embeddings",
+    ),
+    "music_classifier": Target(
+        MusicClassifierStub, lambda seconds: {"song": song(seconds, 1), "sample_rate": np.array([[44100]])}, "seconds", folder="music_cls",
+    ),
+    "sentiformer": Target(
+        EmotionClassifierStub, lambda batch: {"lyrics": [LYRIC] * batch}, "batch", folder="sentiment",
+    ),
+    "music_splitter": Target(SongSplitterStub, lambda seconds: {"song": song(seconds)}, "seconds", folder="splitter"),
+    "text_embedding": Target(
+        TextEmbeddingsStub, lambda batch: {"lyrics": [LYRIC] * batch}, "batch", folder="text_embeddings",
+    ),
+    "music_transcriber": Target(
+        ASRServerStub, lambda seconds: {"song": song(seconds), "sample_rate": np.array([[44100]])}, "seconds",
+        folder="transcriptor",
+    ),
+    "song_pipeline": Target(
+        SongPipelineStub, lambda seconds: {"song": song(seconds), "sample_rate": np.array([[44100]])}, "seconds",
+        folder="pipeline",
+    ),
+}
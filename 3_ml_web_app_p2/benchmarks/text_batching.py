@@ -0,0 +1,63 @@
+"""
+CPU throughput of `TextEmbeddings` and `EmotionClassifier` at different batch sizes.
+
+    python -m benchmarks.text_batching --batch-sizes 1 8 32 --items 128
+
+Needs the model environment (mlserver, transformers, sentence_transformers). Each model is
+loaded in-process and sent `--items` lyrics split into requests of `batch_size` items, the
+same shape MLServer's adaptive batching builds out of concurrent single-lyric requests.
+"""
+import argparse
+import asyncio
+import time
+
+import torch
+from mlserver import ModelSettings
+from mlserver.codecs import StringCodec
+from mlserver.types import InferenceRequest
+
+from servers.sentiment.emotions import EmotionClassifier
+from servers.text_embeddings.text_embs import TextEmbeddings
+
+LYRICS = [
+    "I got the blues and I can't be satisfied",
+    "Dancing all night under the city lights, feeling alive",
+    "You left me standing in the pouring rain with nothing but a broken heart",
+    "We will rise again, stronger than before, nothing can stop us now",
+]
+
+
+async def throughput(model, batch_size, items):
+    lyrics = [LYRICS[i % len(LYRICS)] for i in range(items)]
+    requests = [
+        InferenceRequest(inputs=[StringCodec.encode_input("lyrics", lyrics[i: i + batch_size], use_bytes=False)])
+        for i in range(0, items, batch_size)
+    ]
+    await model.predict(requests[0])
+    start = time.perf_counter()
+    for request in requests:
+        response = await model.predict(request)
+    elapsed = time.perf_counter() - start
+    assert response.outputs[0].shape[0] == len(lyrics[(len(requests) - 1) * batch_size:])
+    return items / elapsed, elapsed / len(requests)
+
+
+async def main(batch_sizes, items):
+    print(f"{'model':>16} {'batch':>6} {'items/s':>9} {'ms/request':>11}")
+    for implementation in (TextEmbeddings, EmotionClassifier):
+        model = implementation(ModelSettings(name=implementation.__name__, implementation=implementation))
+        await model.load()
+        for batch_size in batch_sizes:
+            per_second, per_request = await throughput(model, batch_size, items)
+            print(f"{implementation.__name__:>16} {batch_size:>6} {per_second:>9.1f} {per_request * 1000:>11.1f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--items", type=int, default=128)
+    parser.add_argument("--threads", type=int, default=None)
+    args = parser.parse_args()
+    if args.threads:
+        torch.set_num_threads(args.threads)
+    asyncio.run(main(args.batch_sizes, args.items))
@@ -0,0 +1,118 @@
+"""
+Payload size and round-trip time of the JSON `.tolist()` path vs raw tensors over gRPC.
+
+    python -m benchmarks.transport --seconds 30 180
+
+Runs against in-process stubs of `music_splitter` that return a (4, frames) tensor, one
+answering JSON over REST and one answering `raw_output_contents` over gRPC, the way
+`shared.client.TensorClient` talks to MLServer. So the numbers isolate encode/transfer/decode
+cost from the model itself.
+"""
+from concurrent import futures
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+import argparse
+import json
+import sys
+import threading
+import time
+
+import grpc
+import numpy as np
+import requests
+
+sys.path.append(str(Path(__file__).resolve().parents[2]))
+from shared.client import CHANNEL_OPTIONS, TensorClient, dataplane, decode_tensor, encode_tensor
+
+
+class StubSplitter(BaseHTTPRequestHandler):
+    def do_POST(self):
+        inp = json.loads(self.rfile.read(int(self.headers["Content-Length"])))["inputs"][0]
+        song = np.array(inp["data"], dtype=np.float32).reshape(inp["shape"])
+        stems = np.vstack([song, song])
+        payload = json.dumps({"outputs": [{
+            "name": "output-0", "datatype": "FP32", "shape": list(stems.shape), "data": stems.tolist(),
+        }]}).encode()
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, *args):
+        pass
+
+
+def split_stub(request, context):
+    inp = request.inputs[0]
+    song = decode_tensor(inp.datatype, list(inp.shape), request.raw_input_contents[0])
+    datatype, shape, raw = encode_tensor(np.vstack([song, song]))
+    response = dataplane().ModelInferResponse(model_name=request.model_name)
+    response.outputs.add(name="output-0", datatype=datatype, shape=shape)
+    response.raw_output_contents.append(raw)
+    return response
+
+
+def serve_grpc(model_infer, workers=8):
+    """Serves `model_infer(request, context)` as `ModelInfer` on a free port; returns `(server, port)`."""
+    pb = dataplane()
+    server = grpc.server(futures.ThreadPoolExecutor(workers), options=CHANNEL_OPTIONS)
+    server.add_generic_rpc_handlers([grpc.method_handlers_generic_handler("inference.GRPCInferenceService", {
+        "ModelInfer": grpc.unary_unary_rpc_method_handler(
+            model_infer, request_deserializer=pb.ModelInferRequest.FromString,
+            response_serializer=pb.ModelInferResponse.SerializeToString,
+        ),
+    })])
+    port = server.add_insecure_port("localhost:0")
+    server.start()
+    return server, port
+
+
+def json_roundtrip(url, song):
+    request = {"inputs": [{
+        "name": "song", "parameters": {"content_type": "np"}, "datatype": "FP32",
+        "shape": song.shape, "data": song.tolist(),
+    }]}
+    body = json.dumps(request).encode()
+    res = requests.post(url, data=body, headers={"Content-Type": "application/json"}).json()
+    return np.array(res["outputs"][0]["data"]).reshape(res["outputs"][0]["shape"]), len(body)
+
+
+def grpc_roundtrip(client, song):
+    size = client.build_grpc_request("music_splitter", {"song": song}).ByteSize()
+    stems, = client.infer("music_splitter", song=song)
+    return stems, size
+
+
+def timed(fn, repeats):
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = fn()
+        times.append(time.perf_counter() - start)
+    return result, float(np.median(times))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--seconds", type=int, nargs="+", default=[10, 60, 180])
+    parser.add_argument("--repeats", type=int, default=3)
+    args = parser.parse_args()
+
+    http_server = ThreadingHTTPServer(("localhost", 0), StubSplitter)
+    threading.Thread(target=http_server.serve_forever, daemon=True).start()
+    url = f"http://localhost:{http_server.server_address[1]}/v2/models/music_splitter/infer"
+    grpc_server, port = serve_grpc(split_stub)
+    client = TensorClient(grpc_port=port)
+
+    print(f"{'seconds':>8} {'json MB':>9} {'grpc MB':>10} {'json s':>8} {'grpc s':>9} {'speedup':>8}")
+    for seconds in args.seconds:
+        song = np.random.uniform(-1, 1, (2, 44100 * seconds)).astype(np.float32)
+        (_, json_size), json_time = timed(lambda: json_roundtrip(url, song), args.repeats)
+        (stems, raw_size), raw_time = timed(lambda: grpc_roundtrip(client, song), args.repeats)
+        assert np.array_equal(stems[:2], song)
+        print(
+            f"{seconds:>8} {json_size / 1e6:>9.1f} {raw_size / 1e6:>10.1f} "
+            f"{json_time:>8.2f} {raw_time:>9.3f} {json_time / raw_time:>7.0f}x"
+        )
+    http_server.shutdown()
+    grpc_server.stop(None)
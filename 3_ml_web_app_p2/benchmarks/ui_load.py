@@ -0,0 +1,74 @@
+"""
+Event-loop latency seen by the UI while N simulated users wait on inference calls.
+
+    python -m benchmarks.ui_load --users 1 8 32 --delay 1.0
+
+Every user sends one song over gRPC to an in-process stub of `music_splitter` that takes
+`--delay` seconds to answer. A probe task ticks every 10 ms on the same loop; how late each tick fires is the
+latency any other click, page load or websocket message would see. `blocking` calls the
+synchronous client from the loop (the old handlers), `async` goes through `ainfer`.
+"""
+from pathlib import Path
+import argparse
+import asyncio
+import time
+import sys
+
+import numpy as np
+
+from benchmarks.transport import serve_grpc, split_stub
+sys.path.append(str(Path(__file__).resolve().parents[2]))
+from shared.client import TensorClient
+
+DELAY = [1.0]
+
+
+def slow_split(request, context):
+    time.sleep(DELAY[0])
+    return split_stub(request, context)
+
+
+async def probe(lags, stop, interval=0.01):
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(interval)
+        lags.append(time.perf_counter() - start - interval)
+
+
+async def run(mode, users, port, song):
+    client = TensorClient(grpc_port=port, max_concurrency=users)
+
+    async def user():
+        if mode == "async":
+            return await client.ainfer("music_splitter", song=song)
+        return client.infer("music_splitter", song=song)
+
+    lags, stop = [], asyncio.Event()
+    probe_task = asyncio.create_task(probe(lags, stop))
+    await asyncio.sleep(0.05)
+    start = time.perf_counter()
+    await asyncio.gather(*(user() for _ in range(users)))
+    wall = time.perf_counter() - start
+    stop.set()
+    await probe_task
+    lags = np.array(lags) * 1000
+    return wall, np.percentile(lags, 50), np.percentile(lags, 99), lags.max()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--delay", type=float, default=1.0)
+    parser.add_argument("--seconds", type=int, default=5, help="length of the simulated song")
+    args = parser.parse_args()
+
+    DELAY[0] = args.delay
+    server, port = serve_grpc(slow_split, workers=max(args.users))
+    song = np.random.uniform(-1, 1, (2, 44100 * args.seconds)).astype(np.float32)
+
+    print(f"{'mode':>9} {'users':>6} {'wall s':>8} {'lag p50 ms':>11} {'lag p99 ms':>11} {'lag max ms':>11}")
+    for users in args.users:
+        for mode in ("blocking", "async"):
+            wall, p50, p99, worst = asyncio.run(run(mode, users, port, song))
+            print(f"{mode:>9} {users:>6} {wall:>8.2f} {p50:>11.1f} {p99:>11.1f} {worst:>11.1f}")
+    server.stop(None)
@@ -0,0 +1 @@
+# lets the tests import `src` and `servers` the way the app and benchmarks do, from this directory
@@ -1,27 +1,131 @@
-from nicegui import ui
-import pandas as pd
+from contextlib import closing
+from fastapi import HTTPException
+from nicegui import app, ui
+from pathlib import Path
+import asyncio
+import sys
+import os
+import uuid
 import numpy as np
-import requests
 from src.helpers import *
+from src.audio import embedding_clip, embedding_inputs
+from src.catalog import Catalog, PAGE_SIZE
+from src.similarity import EmbeddingIndex
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+from shared.client import TensorClient
+from shared.jobs import JobQueue, RUNNING
 
 
-(
-    ui.label('🎧 Music Platform')
-      .style('color: #ab003c; font-size: 350%; font-weight: 450')
-      .classes('self-center')
-)
+catalog = Catalog("payload.csv")
+default_song = catalog.songs.at[catalog.rows_for('Dave Van Ronk - Buckets of Rain')[0], 'ids']
 
-ui.markdown("## 🎻 A New Way to Find Music 🎶").classes('self-center')
-ui.markdown(
-    """
-    🎯 **The purpose** of this app is to showcase one of the many (cool 😎 and fun 💃🏻🕺🏽) ways in which you 
-    can create machine learning microservices for different creative purposes.
-    """
-).style("max-width: 1000px; font-size: 120%").classes('self-center')
 
+@app.get('/api/songs')
+def search_songs(q: str = '', page: int = 0, page_size: int = PAGE_SIZE):
+    """One page of the songs whose title matches `q`, for anything that needs the catalog."""
+    return catalog.search(q, page, min(page_size, 500))
 
-metadata = pd.read_csv("payload.csv")
-artist_song = sorted(metadata['artist_song'].tolist())
+
+@app.get('/api/cache')
+def cache_stats():
+    """Hits, misses and the size of both tiers of the downloaded-song cache."""
+    return song_cache.stats()
+
+
+def ports(grpc_port):
+    # SERVE_ALL=1 when the models run in one server, `python servers/serve_all.py`
+    if os.environ.get("SERVE_ALL"):
+        return {"grpc_port": 7020}
+    return {"grpc_port": grpc_port}
+
+splitter   = TensorClient(**ports(5022), timeout=300, max_concurrency=2)
+classifier = TensorClient(**ports(5060), timeout=60, max_concurrency=4)
+audio_embedder = TensorClient(**ports(4040), timeout=120, max_concurrency=4)
+song_pipeline  = TensorClient(grpc_port=6020, timeout=600, max_concurrency=2)
+
+song_index = EmbeddingIndex("./embeddings/audio")
+
+# splitting and transcribing take minutes, so they run as jobs that every user asking for the same song
+# shares, and a finished one answers everyone who asks while it is kept
+jobs = JobQueue(workers=2, ttl=600, reuse=True)
+JOBS_SESSION = 'jobs'  # audio made by a job is exported once, for everyone who asked for it
+
+
+def split_job(progress, song_id):
+    progress(0, None, 'Downloading the song')
+    song, sample_rate = download_song(catalog.song(song_id))
+    # the splitter streams each window as soon as it is separated, so progress is the audio done so far
+    windows, done, total = [], 0, song.shape[-1]
+    progress(0, total, 'Separating the vocals from the instruments')
+    with closing(splitter.infer_stream("music_splitter", song=song)) as stream:
+        for window, in stream:
+            windows.append(window)
+            done += window.shape[-1]
+            progress(done, total, f'Separated {done / sample_rate:.0f} of {total / sample_rate:.0f} seconds')
+    song_reshaped = np.concatenate(windows, axis=-1)
+    progress(total, total, 'Encoding the tracks')
+    # the finished job hands these paths out for `ttl` seconds, and players open them later still
+    keep = 2 * jobs.ttl
+    return {
+        'vocals': create_tmp_audio(song_reshaped[0], 44100, JOBS_SESSION, keep),
+        'instruments': create_tmp_audio(song_reshaped[2], 44100, JOBS_SESSION, keep),
+    }
+
+
+def lyrics_job(progress, song_id):
+    progress(0, 2, 'Downloading the song')
+    song, sample_rate = download_song(catalog.song(song_id))
+    progress(1, 2, 'Transcribing the lyrics and reading their emotions')
+    lyrics, emotions, labels, embedding = song_pipeline.infer(
+        "song_pipeline", song=song, sample_rate=np.array([[sample_rate]]), song_id=[song_id]
+    )
+    top = sorted(zip(emotions[0], labels.ravel()), reverse=True)[:5]
+    return {'lyrics': lyrics.ravel()[0], 'emotions': [{'emotion': label, 'score': float(score)} for score, label in top]}
+
+OPERATIONS = {'split': split_job, 'lyrics': lyrics_job}
+
+
+@app.post('/api/jobs/{operation}')
+def submit_job(operation: str, song_id: str, session: str = ''):
+    """Starts or joins the job; pass the returned `session` along to poll and cancel it."""
+    if operation not in OPERATIONS or song_id not in catalog.row_by_id:
+        raise HTTPException(404, f"No {operation} for song '{song_id}'")
+    session = session or uuid.uuid4().hex
+    return {'id': jobs.submit((operation, song_id), OPERATIONS[operation], song_id, session=session), 'session': session}
+
+
+@app.get('/api/jobs/{job_id}')
+def poll_job(job_id: str, session: str = ''):
+    try:
+        job = jobs.poll(job_id, session)
+    except KeyError:
+        raise HTTPException(404, f"No job '{job_id}', or it expired")
+    return {**job, 'result': jobs.result(job_id, session) if job['state'] == 'done' else None}
+
+
+@app.delete('/api/jobs/{job_id}')
+def cancel_job(job_id: str, session: str = ''):
+    return {'cancelled': jobs.cancel(job_id, session)}
+
+
+async def follow(operation, song_id, container):
+    """Shows the tab's job progress in `container`; returns its result, or None if it failed or was cancelled."""
+    session = ui.context.client.id
+    job_id = jobs.submit((operation, song_id), OPERATIONS[operation], song_id, session=session)
+    with container:
+        with ui.row().classes('items-center') as status:
+            bar = ui.linear_progress(value=0, show_value=False).style("width: 500px")
+            ui.button('Cancel', on_click=lambda: jobs.cancel(job_id, session)).props('flat')
+        message = ui.label('Waiting for a free worker')
+    while (job := jobs.poll(job_id, session))['state'] in RUNNING:
+        bar.set_value(job['progress'] or 0)
+        message.set_text(job['message'] or 'Waiting for a free worker')
+        await asyncio.sleep(0.5)
+    status.delete()
+    message.delete()
+    if job['state'] == 'failed':
+        ui.notify(f"Something went wrong: {job['error']}", type='negative')
+    return jobs.result(job_id, session) if job['state'] == 'done' else None
 
 def create_music_card(song):
     with ui.column():
@@ -35,115 +139,193 @@ def create_music_card(song):
         first_song.on('ended', lambda _: ui.notify('Audio playback completed!'))
 
 
-def get_vectors():
-    song = song_selection.value.split(' - ')[-1] # get the name of the song selected
-    get_index = metadata.loc[metadata['name'] == song, 'index'].iloc[0] # get the index of such a song
-    song_selected = metadata.iloc[get_index]
-    main_artist.clear() # Clear the result from the previous artist selected
-    with main_artist:
-        create_music_card(song_selected)
-
-def split_song():
-    third_artist.clear()
-    song, sample_rate = download_song(metadata, song_selection.value)
-    endpoint = "http://localhost:5010/v2/models/music_splitter/infer"
-    input_request = {
-        "inputs": [{
-            "name": "song", "parameters": {"content_type": "np"}, "datatype": "FP32",
-            "shape": song.shape, "data": song.tolist()
-        }]
-    }
-    res = requests.post(endpoint, json=input_request).json()
-    song_array = np.array(res['outputs'][0]['data'])
-    song_shape = res['outputs'][0]['shape']
-    song_reshaped = song_array.reshape(song_shape)
-    with ui.column():
-        ui.markdown('### Vocals')
-        vaudio = ui.audio(create_tmp_audio(song_reshaped[0], 44100))
-        ui.markdown('### Instruments')
-        iaudio = ui.audio(create_tmp_audio(song_reshaped[2], 44100))
-
-
-def get_song_genre():
-    second_artist.clear()
-    song, sample_rate = download_song(metadata, song_selection.value)
-    input_request = {
-        "inputs": [ 
-            {
-                "name": "song",
-                "shape": song[0][None].shape,
-                "parameters": {"content_type": "np"},
-                "data": song[0][None].tolist(),
-                "datatype": "FP64"
-            }
+async def fetch_song(song_id):
+    return await asyncio.to_thread(download_song, catalog.song(song_id))
+
+
+@ui.page('/')
+def index():
+    # a page per visitor: the auto-index page is one client shared by everyone, so sessions
+    # and the song picked would be too
+    (
+        ui.label('🎧 Music Platform')
+          .style('color: #ab003c; font-size: 350%; font-weight: 450')
+          .classes('self-center')
+    )
+
+    ui.markdown("## 🎻 A New Way to Find Music 🎶").classes('self-center')
+    ui.markdown(
+        """
+        🎯 **The purpose** of this app is to showcase one of the many (cool 😎 and fun 💃🏻🕺🏽) ways in which you 
+        can create machine learning microservices for different creative purposes.
+        """
+    ).style("max-width: 1000px; font-size: 120%").classes('self-center')
+
+    typeahead = {'query': '', 'page': 0, 'total': 0}
+
+    def get_vectors():
+        if song_selection.value is None:
+            return
+        main_artist.clear() # Clear the result from the previous artist selected
+        with main_artist:
+            create_music_card(catalog.song(song_selection.value))
+
+    def show_matches(query, page=0):
+        # the select only ever holds the pages seen so far, plus the song already picked
+        result = catalog.search(query, page)
+        options = dict(song_selection.options) if page else {}
+        options.update({item['id']: item['label'] for item in result['items']})
+        if song_selection.value is not None:
+            options.setdefault(song_selection.value, catalog.label(song_selection.value))
+        typeahead.update(query=query, page=page, total=result['total'])
+        song_selection.options = options
+        song_selection.update()
+
+    def on_typing(event):
+        show_matches(event.args or '')
+
+    def on_scroll(event):
+        # Quasar reports the last option rendered; fetch the next page once it reaches the end
+        seen = (typeahead['page'] + 1) * PAGE_SIZE
+        if event.args.get('to', 0) >= len(song_selection.options) - 1 and seen < typeahead['total']:
+            show_matches(typeahead['query'], typeahead['page'] + 1)
+
+    async def render_split(song_id):
+        third_artist.clear()
+        tracks = await follow('split', song_id, third_artist)
+        if tracks is None:
+            return
+        with third_artist:
+            ui.markdown('### Vocals')
+            vaudio = ui.audio(tracks['vocals'])
+            ui.markdown('### Instruments')
+            iaudio = ui.audio(tracks['instruments'])
+
+    async def render_genre(song_name, song, sample_rate):
+        second_artist.clear()
+        scores, labels = await classifier.ainfer(
+            "music_classifier", song=song[0][None], sample_rate=np.array([[sample_rate]])
+        )
+        rows = []
+        for score, label in zip(scores, labels):
+            results = {}
+            results['genre'] = label.title()
+            results['score'] = round(float(score) * 100, 2)
+            rows.append(results)
+
+        columns = [
+            {'name': 'genre', 'label': 'Genre', 'field': 'genre', 'align': 'left'},
+            {'name': 'score','label': 'Score', 'field': 'score', 'sortable': True},
         ]
-    }
-    endpoint = "http://localhost:5080/v2/models/music_classifier/infer"
-    res = requests.post(endpoint, json=input_request)
-    rows = []
-    for score, label in zip(res.json()['outputs'][0]['data'], res.json()['outputs'][1]['data']):
-        results = {}
-        results['genre'] = label.title()
-        results['score'] = round(score * 100, 2)
-        rows.append(results)
-
-    columns = [
-        {'name': 'genre', 'label': 'Genre', 'field': 'genre', 'align': 'left'},
-        {'name': 'score','label': 'Score', 'field': 'score', 'sortable': True},
-    ]
-    with second_artist:
-        ui.markdown(f'### Your Song: {song_selection.value}')
-        the_table = ui.table(columns=columns, rows=rows, row_key='name')
-
-
-with ui.tabs().classes('w-full self-center justify-center items-center') as tabs:
-    one   = ui.tab('One')
-    two   = ui.tab('Two')
-    three = ui.tab('Three')
-    four  = ui.tab('Four')
-    five  = ui.tab('Five')
-    six   = ui.tab('Six')
-
-
-with ui.tab_panels(tabs, value=one).classes('w-full self-center justify-center'):
-    with ui.tab_panel(one).classes('flex items-center justify-center h-screen'):
-        with ui.column().classes('items-center justify-center'):
-            ui.markdown('### Select a song')
-            song_selection = ui.select(
-                artist_song, value='Dave Van Ronk - Buckets of Rain', on_change=get_vectors
-            ).style("width: 700px")
-        main_artist = ui.row().classes('w-full justify-center').style("margin: 0 auto; padding: 2rem;")
-
-    with ui.tab_panel(two):
-        with ui.column().classes('items-center justify-center'):
-            ui.markdown('### Classify a song')
-            table_button = ui.button('Classify Song Selected', on_click=get_song_genre).style("width: 700px").classes('w-full justify-center')
-        second_artist = ui.column().classes('items-center w-full justify-center').style("margin: 0 auto; padding: 2rem;")
-
-    with ui.tab_panel(three):
-        with ui.column().classes('items-center justify-center'):
-            ui.markdown('### Split a song')
-            vocals_instr = ui.button('Split Song Selected', on_click=split_song).style("width: 700px").classes('w-full justify-center')
-        third_artist = ui.column().classes('items-center w-full justify-center').style("margin: 0 auto; padding: 2rem;")
-
-    with ui.tab_panel(four):
-        ui.label('Fourth tab')
-
-    with ui.tab_panel(five):
-        ui.label('Fifth tab')
-
-    with ui.tab_panel(six):
-        ui.label('Sixth tab')
-
-
-ui.colors(
-    primary='#ab003c',
-    secondary='#2c387e',
-    accent='#f50057',
-    dark='#f73378',
-    # positive='#f73378',
-    negative='#ba000d'
-)
+        with second_artist:
+            ui.markdown(f'### Your Song: {song_name}')
+            the_table = ui.table(columns=columns, rows=rows, row_key='name')
+
+    async def split_song():
+        await render_split(song_selection.value)
+
+    async def get_song_genre():
+        song_name = catalog.label(song_selection.value)
+        song, sample_rate = await fetch_song(song_selection.value)
+        await render_genre(song_name, song, sample_rate)
+
+    async def find_similar_songs():
+        song_name = catalog.label(song_selection.value)
+        row = catalog.row(song_selection.value)
+        fourth_artist.clear()
+        if row not in song_index:
+            song, sample_rate = await fetch_song(song_selection.value)
+            clip = await asyncio.to_thread(embedding_clip, song, sample_rate)
+            embedding, = await audio_embedder.ainfer("audio_embedding", **embedding_inputs(clip[None]))
+            song_index.add(row, embedding)
+        rows, scores = song_index.similar_to(row, k=6)
+        with fourth_artist:
+            ui.markdown(f'### Songs like {song_name}')
+            if not len(rows):
+                ui.label('No other songs have been embedded yet. Run the catalog embedding job to fill the index.')
+            with ui.row().classes('justify-center'):
+                for similar in rows:
+                    create_music_card(catalog.songs.iloc[similar])
+
+    async def analyse_lyrics():
+        song_name = catalog.label(song_selection.value)
+        fifth_artist.clear()
+        found = await follow('lyrics', song_selection.value, fifth_artist)
+        if found is None:
+            return
+        rows = [{'emotion': row['emotion'].title(), 'score': round(row['score'] * 100, 2)} for row in found['emotions']]
+        columns = [
+            {'name': 'emotion', 'label': 'Emotion', 'field': 'emotion', 'align': 'left'},
+            {'name': 'score', 'label': 'Score', 'field': 'score', 'sortable': True},
+        ]
+        with fifth_artist:
+            ui.markdown(f'### Lyrics of {song_name}')
+            ui.label(found['lyrics'] or 'No vocals found in this song.').style("max-width: 700px")
+            ui.table(columns=columns, rows=rows, row_key='emotion')
+
+    async def classify_and_split():
+        song_name = catalog.label(song_selection.value)
+        song, sample_rate = await fetch_song(song_selection.value)
+        await asyncio.gather(render_genre(song_name, song, sample_rate), render_split(song_selection.value))
+        ui.notify('Classification and split ready in tabs Two and Three')
+
+    with ui.tabs().classes('w-full self-center justify-center items-center') as tabs:
+        one   = ui.tab('One')
+        two   = ui.tab('Two')
+        three = ui.tab('Three')
+        four  = ui.tab('Four')
+        five  = ui.tab('Five')
+        six   = ui.tab('Six')
+
+    with ui.tab_panels(tabs, value=one).classes('w-full self-center justify-center'):
+        with ui.tab_panel(one).classes('flex items-center justify-center h-screen'):
+            with ui.column().classes('items-center justify-center'):
+                ui.markdown('### Select a song')
+                song_selection = ui.select(
+                    {default_song: catalog.label(default_song)}, value=default_song, with_input=True, on_change=get_vectors
+                ).style("width: 700px")
+                song_selection.on('input-value', on_typing, throttle=0.2)
+                song_selection.on('virtual-scroll', on_scroll, ['to'])
+                show_matches('')
+                ui.button('Classify and Split', on_click=classify_and_split).style("width: 700px")
+            main_artist = ui.row().classes('w-full justify-center').style("margin: 0 auto; padding: 2rem;")
+
+        with ui.tab_panel(two):
+            with ui.column().classes('items-center justify-center'):
+                ui.markdown('### Classify a song')
+                table_button = ui.button('Classify Song Selected', on_click=get_song_genre).style("width: 700px").classes('w-full justify-center')
+            second_artist = ui.column().classes('items-center w-full justify-center').style("margin: 0 auto; padding: 2rem;")
+
+        with ui.tab_panel(three):
+            with ui.column().classes('items-center justify-center'):
+                ui.markdown('### Split a song')
+                vocals_instr = ui.button('Split Song Selected', on_click=split_song).style("width: 700px").classes('w-full justify-center')
+            third_artist = ui.column().classes('items-center w-full justify-center').style("margin: 0 auto; padding: 2rem;")
+
+        with ui.tab_panel(four):
+            with ui.column().classes('items-center justify-center'):
+                ui.markdown('### Find similar songs')
+                similar_button = ui.button('Find Songs Like the One Selected', on_click=find_similar_songs).style("width: 700px").classes('w-full justify-center')
+            fourth_artist = ui.column().classes('items-center w-full justify-center').style("margin: 0 auto; padding: 2rem;")
+
+        with ui.tab_panel(five):
+            with ui.column().classes('items-center justify-center'):
+                ui.markdown('### Lyrics and emotions')
+                lyrics_button = ui.button('Analyse the Lyrics of the Song Selected', on_click=analyse_lyrics).style("width: 700px").classes('w-full justify-center')
+            fifth_artist = ui.column().classes('items-center w-full justify-center').style("margin: 0 auto; padding: 2rem;")
+
+        with ui.tab_panel(six):
+            ui.label('Sixth tab')
+
+    ui.colors(
+        primary='#ab003c',
+        secondary='#2c387e',
+        accent='#f50057',
+        dark='#f73378',
+        # positive='#f73378',
+        negative='#ba000d'
+    )
+
 
 ui.run(
     title='Music Microservices',
@@ -1,14 +1,77 @@
 from mlserver import MLModel
-from mlserver.codecs import decode_args
 from panns_inference import AudioTagging
+from typing import List, Optional
 import numpy as np
+import torch
+from pathlib import Path
+import sys
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+sys.path.append(str(Path(__file__).resolve().parents[3]))
+from shared.stage_timer import stage_timer, timed_args
+from precision import extra_parameters
+
+SAMPLE_RATE = 32000  # what PANNs was trained on, and what every caller resamples to
+
+
+def pick_device(device: str = "auto") -> str:
+    if device != "auto":
+        return device
+    if torch.cuda.is_available():
+        return "cuda"
+    return "cpu"
 
 
 class MusicEmbeddings(MLModel):
+    """One 2048-d PANNs embedding per song, mean-pooled over at most `max_windows` windows."""
+
     async def load(self):
-        self.model = AudioTagging(checkpoint_path=None, device='cuda')
+        extra = extra_parameters(self)
+        self.device = pick_device(extra.get("device", "auto"))
+        if self.device == "cpu" and extra.get("threads"):
+            torch.set_num_threads(extra["threads"])
+        self.model = AudioTagging(checkpoint_path=extra.get("checkpoint_path"), device=self.device)
+        self.window = int(extra.get("window_seconds", 10) * SAMPLE_RATE)
+        self.max_windows = extra.get("max_windows", 6)
+        self.batch_size = extra.get("batch_size", 8)
+        return True
+
+    @timed_args
+    async def predict(
+        self, song: np.ndarray, lengths: Optional[np.ndarray] = None, dtype: Optional[List[str]] = None
+    ) -> np.ndarray:
+        timer = stage_timer(self)
+        song = np.atleast_2d(song)
+        with timer.stage("pre_process"):
+            lengths = np.full(len(song), song.shape[-1]) if lengths is None else lengths.reshape(-1).astype(int)
+            windows, owners = cut_windows(song, lengths, self.window, self.max_windows)
+        timer.sizes(songs=song, windows=windows)
+        with timer.stage("inference"):
+            embeddings = np.concatenate([
+                self.model.inference(windows[start: start + self.batch_size])[1]
+                for start in range(0, len(windows), self.batch_size)
+            ])
+        with timer.stage("post_process"):
+            pooled = mean_pool(embeddings, owners, len(song))
+        return pooled.astype(np.float16 if dtype and dtype[0] == "float16" else np.float32)
+
+
+def cut_windows(songs: np.ndarray, lengths: np.ndarray, window: int, max_windows: int):
+    """All windows of every song as one `(windows, window)` float32 batch, and the song each came from."""
+    windows, owners = [], []
+    for idx, (audio, length) in enumerate(zip(songs, lengths)):
+        audio = audio[:length]
+        if length <= window:
+            windows.append(np.pad(audio, (0, window - length)))
+            owners.append(idx)
+            continue
+        count = min(max_windows, -(-length // window))
+        for start in np.linspace(0, length - window, count).astype(int):
+            windows.append(audio[start: start + window])
+            owners.append(idx)
+    return np.stack(windows).astype(np.float32, copy=False), np.array(owners)
+
 
-    @decode_args
-    async def predict(self, song: np.ndarray) -> np.ndarray:
-        clipwise_output, embedding = self.model.inference(song)
-        return embedding
\ No newline at end of file
+def mean_pool(embeddings: np.ndarray, owners: np.ndarray, songs: int) -> np.ndarray:
+    pooled = np.zeros((songs, embeddings.shape[1]), dtype=np.float32)
+    np.add.at(pooled, owners, embeddings)
+    return pooled / np.bincount(owners, minlength=songs)[:, None]
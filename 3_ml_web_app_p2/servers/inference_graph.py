@@ -0,0 +1,49 @@
+"""A DAG of async steps that shares work between requests for the same key."""
+from collections import OrderedDict
+from typing import Callable, NamedTuple
+import asyncio
+
+
+class Node(NamedTuple):
+    fn: Callable
+    deps: tuple = ()
+
+
+class InferenceGraph:
+    """Runs a DAG of async nodes as their dependencies finish, caching the `keep` results per key."""
+
+    def __init__(self, nodes: dict, cache_size=8, keep=None):
+        self.nodes = nodes
+        self.cache_size = cache_size
+        self.keep = keep
+        self.cache = OrderedDict()
+
+    async def run(self, key: str, inputs: dict, targets) -> dict:
+        tasks = self.cache.setdefault(key, {})
+        self.cache.move_to_end(key)
+        while len(self.cache) > self.cache_size:
+            self.cache.popitem(last=False)
+
+        def schedule(name):
+            task = tasks.get(name)
+            if task is None or (task.done() and (task.cancelled() or task.exception() is not None)):
+                if name in inputs:
+                    task = asyncio.get_running_loop().create_future()
+                    task.set_result(inputs[name])
+                else:
+                    node = self.nodes[name]
+                    task = asyncio.ensure_future(self._run_node(node, [schedule(dep) for dep in node.deps]))
+                tasks[name] = task
+            return task
+
+        try:
+            results = await asyncio.gather(*(schedule(name) for name in targets))
+        finally:
+            if self.keep is not None:
+                for name in [name for name, task in tasks.items() if name not in self.keep and task.done()]:
+                    del tasks[name]
+        return dict(zip(targets, results))
+
+    @staticmethod
+    async def _run_node(node: Node, deps: list):
+        return await node.fn(*await asyncio.gather(*deps))
@@ -1,14 +1,104 @@
 from mlserver import MLModel
-from mlserver.codecs import decode_args
 from transformers import pipeline
+from typing import Optional
 import numpy as np
 import pandas as pd
+import torch
+import soxr
+from pathlib import Path
+import sys
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+sys.path.append(str(Path(__file__).resolve().parents[3]))
+from shared.stage_timer import stage_timer, timed_args
+from precision import extra_parameters, load_converted
+
+WAV2MUSICGENRE = "ramonpzg/wav2musicgenre"
+SAMPLE_RATE = 44100  # what the frontend sends when it does not say
 
 class MusicClassifier(MLModel):
+    """Genre probabilities of the whole song, or averaged over windows when `window_seconds` is set."""
+
     async def load(self):
-        self.model = pipeline("audio-classification", model="ramonpzg/wav2musicgenre")
+        extra = extra_parameters(self)
+        self.model = load_converted(
+            WAV2MUSICGENRE, extra.get("precision", "fp32"), lambda: pipeline("audio-classification", model=WAV2MUSICGENRE)
+        )
+        self.window_seconds = extra.get("window_seconds")
+        self.max_windows = extra.get("max_windows", 8)
+        self.batch_size = extra.get("batch_size", 4)
+        self.stable_windows = extra.get("stable_windows")
+        self.stable_tolerance = extra.get("stable_tolerance", 0.05)
+        self.top_k = extra.get("top_k", 5)
+
+    @timed_args
+    async def predict(self, song: np.ndarray, sample_rate: Optional[np.ndarray] = None) -> pd.DataFrame:
+        timer = stage_timer(self)
+        if not self.window_seconds:
+            with timer.stage("inference"):
+                result = self.model(song[0])
+        else:
+            rate = self.model.feature_extractor.sampling_rate
+            with timer.stage("pre_process"):
+                windows = cut_windows(song[0], int(self.window_seconds * _rate(sample_rate)), self.max_windows)
+                windows = resample(windows, _rate(sample_rate), rate)
+            with timer.stage("inference"):
+                probabilities = self.classify_windows(windows, rate)
+            timer.sizes(windows=probabilities)  # how many the early exit left
+            result = self.top_genres(probabilities.mean(axis=0))
+        with timer.stage("post_process"):
+            # plain object labels: MLServer's pandas codec has no datatype for pandas' string dtype
+            return pd.DataFrame(result).astype({"label": object})
+
+    def classify_windows(self, windows: np.ndarray, rate: int) -> np.ndarray:
+        probabilities = []
+        for start in range(0, len(windows), self.batch_size):
+            inputs = self.model.feature_extractor(list(windows[start: start + self.batch_size]), sampling_rate=rate, return_tensors="pt")
+            inputs = {key: value.to(self.model.dtype) if value.is_floating_point() else value for key, value in inputs.items()}
+            with torch.inference_mode():
+                logits = self.model.model(**inputs).logits
+            probabilities.extend(logits.float().softmax(dim=-1).numpy())
+            if self.stable_windows and is_stable(probabilities, self.stable_windows, self.stable_tolerance):
+                break
+        return np.stack(probabilities)
+
+    def top_genres(self, probabilities: np.ndarray) -> list:
+        id2label = self.model.model.config.id2label
+        best = np.argsort(probabilities)[::-1][: self.top_k]
+        return [{"score": float(probabilities[idx]), "label": id2label[idx]} for idx in best]
+
+
+def _rate(sample_rate: Optional[np.ndarray]) -> int:
+    return int(sample_rate[0][0]) if sample_rate is not None else SAMPLE_RATE
+
+
+def cut_windows(audio: np.ndarray, window: int, max_windows: int) -> np.ndarray:
+    """Up to `max_windows` windows spread evenly from start to end, in `coverage_order`."""
+    if len(audio) <= window:
+        return np.pad(audio, (0, window - len(audio)))[None]
+    count = min(max_windows, -(-len(audio) // window))
+    starts = np.linspace(0, len(audio) - window, count).astype(int)
+    return np.stack([audio[starts[idx]: starts[idx] + window] for idx in coverage_order(count)])
+
+
+def coverage_order(count: int) -> list:
+    # bit-reversed indices: first, middle, quarters, eighths... so an early exit has heard the whole song
+    bits = max(count - 1, 0).bit_length()
+    order = (int(format(idx, f"0{bits}b")[::-1], 2) if bits else 0 for idx in range(2 ** bits))
+    return [idx for idx in order if idx < count]
+
+
+def resample(windows: np.ndarray, orig_sr: int, target_sr: int) -> np.ndarray:
+    if orig_sr == target_sr:
+        return windows.astype(np.float32, copy=False)
+    # soxr takes (frames, channels), so every window is resampled in a single call
+    return soxr.resample(np.ascontiguousarray(windows.T, dtype=np.float32), orig_sr, target_sr, "HQ").T
+
 
-    @decode_args
-    async def predict(self, song: np.ndarray) -> pd.DataFrame:
-        result = self.model(song[0])
-        return pd.DataFrame(result)
\ No newline at end of file
+def is_stable(probabilities: list, windows: int, tolerance: float) -> bool:
+    """Whether the running mean's top genre, and its score within `tolerance`, held for the last `windows` windows."""
+    if len(probabilities) < windows:
+        return False
+    means = np.cumsum(probabilities, axis=0) / np.arange(1, len(probabilities) + 1)[:, None]
+    recent = means[-windows:]
+    top = recent[-1].argmax()
+    return bool((recent.argmax(axis=1) == top).all() and np.ptp(recent[:, top]) <= tolerance)
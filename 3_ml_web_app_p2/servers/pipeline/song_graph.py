@@ -0,0 +1,108 @@
+from mlserver import MLModel
+from mlserver.codecs import NumpyCodec, StringCodec
+from mlserver.settings import ModelSettings
+from mlserver.types import InferenceRequest, InferenceResponse
+
+from pathlib import Path
+import numpy as np
+import hashlib
+import asyncio
+import json
+import sys
+
+SERVERS = Path(__file__).resolve().parent.parent
+for folder in ("splitter", "transcriptor", "sentiment", "text_embeddings"):
+    sys.path.append(str(SERVERS / folder))
+
+from split_model import SongSplitter
+from asr_model import ASRServer
+from emotions import EmotionClassifier
+from text_embs import TextEmbeddings
+sys.path.append(str(SERVERS.parent.parent))
+from shared.stage_timer import stage_timer
+from inference_graph import InferenceGraph, Node
+from precision import extra_parameters
+
+
+def song_key(song: np.ndarray) -> str:
+    return hashlib.blake2b(np.ascontiguousarray(song).data, digest_size=16).hexdigest()
+
+
+async def load_model(model_class, folder: str) -> MLModel:
+    # same name and parameters as the standalone server, so `extra` settings carry over
+    config = json.loads((SERVERS / folder / "model-settings.json").read_text())
+    model = model_class(ModelSettings(name=config["name"], implementation=model_class, parameters=config.get("parameters")))
+    await model.load()
+    return model
+
+
+def in_process(model: MLModel):
+    """The model's `predict` minus `decode_args`, run on its own thread so branches truly overlap."""
+    predict = type(model).predict.__wrapped__
+
+    async def call(*args):
+        return await asyncio.to_thread(asyncio.run, predict(model, *args))
+    return call
+
+
+OUTPUTS = {
+    "vocals": lambda name, value: [NumpyCodec.encode_output(name=name, payload=value)],
+    "lyrics": lambda name, value: [StringCodec.encode_output(name=name, payload=[value])],
+    "emotions": lambda name, value: [
+        NumpyCodec.encode_output(name=name, payload=value.to_numpy(dtype=np.float32)),
+        StringCodec.encode_output(name="emotion_labels", payload=list(value.columns)),
+    ],
+    "lyrics_embedding": lambda name, value: [NumpyCodec.encode_output(name=name, payload=value)],
+}
+DEFAULT_TARGETS = ["lyrics", "emotions", "lyrics_embedding"]
+
+
+class SongPipeline(MLModel):
+    """song -> splitter -> vocals -> whisper -> lyrics -> (emotions, lyrics embedding), in one process."""
+
+    async def load(self):
+        extra = extra_parameters(self)
+        splitter, asr, emotions, text_embeddings = await asyncio.gather(
+            load_model(SongSplitter, "splitter"), load_model(ASRServer, "transcriptor"),
+            load_model(EmotionClassifier, "sentiment"), load_model(TextEmbeddings, "text_embeddings"),
+        )
+        split, transcribe = in_process(splitter), in_process(asr)
+        classify, embed = in_process(emotions), in_process(text_embeddings)
+
+        async def vocals(song):
+            return (await split(song))[:2]
+
+        async def lyrics(vocals, sample_rate):
+            return (await transcribe(vocals, sample_rate))[0]
+
+        async def emotion_scores(lyrics):
+            return await classify([lyrics])
+
+        async def lyrics_embedding(lyrics):
+            return await embed([lyrics])
+
+        self.graph = InferenceGraph({
+            "vocals": Node(vocals, ("song",)),
+            "lyrics": Node(lyrics, ("vocals", "sample_rate")),
+            "emotions": Node(emotion_scores, ("lyrics",)),
+            "lyrics_embedding": Node(lyrics_embedding, ("lyrics",)),
+        }, cache_size=extra.get("cache_size", 8), keep=("lyrics", "emotions", "lyrics_embedding"))
+
+    async def predict(self, payload: InferenceRequest) -> InferenceResponse:
+        timer = stage_timer(self)
+        inputs = {request_input.name: request_input for request_input in payload.inputs}
+        with timer.stage("decode"):
+            song = NumpyCodec.decode_input(inputs["song"])
+            sample_rate = NumpyCodec.decode_input(inputs["sample_rate"]) if "sample_rate" in inputs else np.array([[44100]])
+            key = StringCodec.decode_input(inputs["song_id"])[0] if "song_id" in inputs else song_key(song)
+            targets = StringCodec.decode_input(inputs["targets"]) if "targets" in inputs else DEFAULT_TARGETS
+        timer.sizes(song=song)
+        unknown = set(targets) - set(OUTPUTS)
+        if unknown:
+            raise ValueError(f"Unknown targets {sorted(unknown)}, expected some of {list(OUTPUTS)}")
+
+        with timer.stage("graph"):
+            results = await self.graph.run(key, {"song": song, "sample_rate": sample_rate}, targets)
+        with timer.stage("encode"):
+            outputs = [output for name in targets for output in OUTPUTS[name](name, results[name])]
+        return InferenceResponse(model_name=self.name, id=payload.id, outputs=outputs)
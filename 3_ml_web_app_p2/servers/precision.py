@@ -0,0 +1,96 @@
+"""Reduced-precision (int8, bf16) CPU variants of the transformer models, cached to `MODEL_CACHE`."""
+from pathlib import Path
+from types import SimpleNamespace
+from typing import Callable
+import importlib
+import logging
+import os
+import pickle
+
+import torch
+from torch.nn.utils import parametrize
+import transformers
+
+PRECISIONS = ("fp32", "int8", "bf16")
+CACHE_DIR = Path(os.environ.get("MODEL_CACHE", Path.home() / ".cache" / "music_servers"))
+
+logger = logging.getLogger(__name__)
+
+
+def cpu_has_bf16() -> bool:
+    try:
+        flags = Path("/proc/cpuinfo").read_text().split()
+    except OSError:
+        return False
+    return "avx512_bf16" in flags or "amx_bf16" in flags
+
+
+def resolve(precision: str) -> str:
+    if precision not in PRECISIONS:
+        raise ValueError(f"Unknown precision '{precision}', expected one of {PRECISIONS}")
+    if precision == "bf16" and not cpu_has_bf16():
+        logger.warning("this CPU has no native bfloat16, loading fp32 instead")
+        return "fp32"
+    return precision
+
+
+def cache_path(name: str, precision: str) -> Path:
+    # pickles only load back into the library versions that wrote them
+    versions = f"torch{torch.__version__}-transformers{transformers.__version__}".replace("+", "_")
+    return CACHE_DIR / f"{name.replace('/', '--')}-{precision}-{versions}.pt"
+
+
+def load_converted(name: str, precision: str, build: Callable):
+    """`build()`, a pipeline or an `nn.Module`, with its weights at `precision`."""
+    precision = resolve(precision)
+    if precision == "fp32":
+        return build()
+    path = cache_path(name, precision)
+    if path.exists():
+        return torch.load(path, weights_only=False)
+
+    loaded = build()
+    if isinstance(loaded, torch.nn.Module):
+        loaded = convert(loaded, precision)
+    else:
+        loaded.model = convert(loaded.model, precision)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    partial = path.with_suffix(f".{os.getpid()}.tmp")
+    torch.save(loaded, partial, pickle_module=_torch_pickle)
+    partial.replace(path)  # servers starting together never read a half-written file
+    return loaded
+
+
+def extra_parameters(model) -> dict:
+    """The `parameters.extra` of the model's `model-settings.json`, `{}` when it has none."""
+    return (model.settings.parameters.extra if model.settings.parameters else None) or {}
+
+
+class _TorchPickler(pickle.Pickler):
+    # dtypes and qschemes such as torch.qint8 have no __module__, so pickle looks them up in every
+    # imported module, and transformers' lazy modules raise ImportError there when an optional
+    # dependency (torchvision, ...) is missing
+    def reducer_override(self, obj):
+        if isinstance(obj, (torch.dtype, torch.qscheme)):
+            return getattr, (torch, str(obj).split(".")[-1])
+        if obj is torch:
+            return importlib.import_module, ("torch",)
+        return NotImplemented
+
+
+_torch_pickle = SimpleNamespace(__name__="pickle", Pickler=_TorchPickler)
+
+
+def convert(model: torch.nn.Module, precision: str) -> torch.nn.Module:
+    model = model.eval()
+    # bake weight norm (wav2vec2's positional conv) into plain weights: parametrized modules and
+    # the hook weight norm leaves behind for loading old checkpoints do not pickle
+    for module in model.modules():
+        for name in list(getattr(module, "parametrizations", None) or {}):
+            parametrize.remove_parametrizations(module, name, leave_parametrized=True)
+        for key, hook in list(module._load_state_dict_pre_hooks.items()):
+            if "weight_norm" in getattr(getattr(hook, "hook", hook), "__qualname__", ""):
+                del module._load_state_dict_pre_hooks[key]
+    if precision == "int8":
+        return torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+    return model.to(torch.bfloat16)
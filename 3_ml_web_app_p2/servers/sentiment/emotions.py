@@ -1,15 +1,33 @@
 
 from mlserver import MLModel
-from mlserver.codecs import decode_args
 from transformers import pipeline
 from typing import List
 import pandas as pd
+from pathlib import Path
+import sys
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+sys.path.append(str(Path(__file__).resolve().parents[3]))
+from shared.stage_timer import stage_timer, timed_args
+from precision import extra_parameters, load_converted
+
+GO_EMOTIONS = "SamLowe/roberta-base-go_emotions"
 
 class EmotionClassifier(MLModel):
     async def load(self):
-        self.model = pipeline(task="text-classification", model="SamLowe/roberta-base-go_emotions", top_k=None)
+        extra = extra_parameters(self)
+        self.model = load_converted(
+            GO_EMOTIONS, extra.get("precision", "fp32"),
+            lambda: pipeline(task="text-classification", model=GO_EMOTIONS, top_k=None),
+        )
+        id2label = self.model.model.config.id2label
+        self.labels = [id2label[i] for i in range(len(id2label))]
 
-    @decode_args
+    @timed_args
     async def predict(self, lyrics: List[str]) -> pd.DataFrame:
-        result = self.model(lyrics)
-        return pd.DataFrame(result[0])
+        timer = stage_timer(self)
+        with timer.stage("inference"):
+            result = self.model(lyrics, batch_size=len(lyrics), truncation=True)
+        # one row per lyric and one column per emotion, so adaptive batching can split the rows back per request
+        with timer.stage("post_process"):
+            scores = [{emotion['label']: emotion['score'] for emotion in item} for item in result]
+            return pd.DataFrame(scores, columns=self.labels)
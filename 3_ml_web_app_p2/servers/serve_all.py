@@ -0,0 +1,104 @@
+"""
+Every model in `servers/` behind a single MLServer, for deployments that would rather run
+one process than six.
+
+    python servers/serve_all.py
+    python servers/serve_all.py --workers music_splitter=2 sentiformer=4
+
+Ports and the number of worker threads per model come from `serve_all.json`; the rest,
+batching and `parameters.extra` included, from each model's own `model-settings.json`.
+Models load in parallel, each on its own thread, and answer one synthetic request before
+they report ready, so the first real request does not pay for lazy initialisation. Every
+model runs `predict` on its own pool of worker threads: a long separation never blocks the
+other models, and CPU-heavy ones can run several requests at once since torch releases the GIL.
+"""
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+import importlib
+import argparse
+import asyncio
+import json
+import sys
+
+from mlserver import MLServer, ModelSettings, Settings
+from mlserver.codecs import NumpyCodec, StringCodec
+from mlserver.types import InferenceRequest
+import numpy as np
+
+SERVERS = Path(__file__).resolve().parent
+FOLDERS = ["audio_embeddings", "music_cls", "sentiment", "splitter", "text_embeddings", "transcriptor"]
+
+
+def tone(channels, seconds, sample_rate):
+    # in the voice band and swelling 4 times a second like syllables, so the transcriptor's voice
+    # detection lets it through to the model
+    t = np.arange(int(seconds * sample_rate)) / sample_rate
+    syllables = 0.5 - 0.5 * np.cos(2 * np.pi * 4 * t)
+    return np.tile(0.1 * syllables * np.sin(2 * np.pi * 440 * t), (channels, 1)).astype(np.float32)
+
+
+WARMUP = {
+    "audio_embedding": lambda: {"song": tone(1, 2, 32000)},
+    "music_classifier": lambda: {"song": tone(1, 2, 44100), "sample_rate": np.array([[44100]])},
+    "sentiformer": lambda: {"lyrics": ["warming up before the first song"]},
+    "music_splitter": lambda: {"song": tone(2, 2, 44100)},
+    "text_embedding": lambda: {"lyrics": ["warming up before the first song"]},
+    "music_transcriber": lambda: {"song": tone(2, 2, 44100), "sample_rate": np.array([[44100]])},
+}
+
+
+def warmup_request(inputs: dict) -> InferenceRequest:
+    return InferenceRequest(inputs=[
+        StringCodec.encode_input(name, value, use_bytes=False) if isinstance(value, list)
+        else NumpyCodec.encode_input(name, value)
+        for name, value in inputs.items()
+    ])
+
+
+def served(model_class: type, workers: int) -> type:
+    """`model_class` loading off the event loop, ready only once warm, and predicting on `workers` threads."""
+
+    class Served(model_class):
+        async def load(self):
+            self._workers = ThreadPoolExecutor(workers, thread_name_prefix=self.name)
+            await asyncio.get_running_loop().run_in_executor(self._workers, asyncio.run, super().load())
+            await self.predict(warmup_request(WARMUP[self.name]()))
+            return True
+
+        async def predict(self, payload: InferenceRequest):
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._workers, asyncio.run, super().predict(payload))
+
+        async def unload(self):
+            self._workers.shutdown(wait=False)
+            return await super().unload()
+
+    # ModelSettings keeps the implementation as an import path, so the class has to be importable from here
+    Served.__name__ = Served.__qualname__ = model_class.__name__
+    globals()[Served.__name__] = Served
+    return Served
+
+
+def models_settings(workers: dict) -> list:
+    models = []
+    for folder in FOLDERS:
+        sys.path.append(str(SERVERS / folder))
+        model = json.loads((SERVERS / folder / "model-settings.json").read_text())
+        module, name = model.pop("implementation").rsplit(".", 1)
+        model_class = getattr(importlib.import_module(module), name)
+        models.append(ModelSettings(**model, implementation=served(model_class, workers.get(model["name"], 1))))
+    return models
+
+
+async def main(overrides: dict):
+    config = json.loads((SERVERS / "serve_all.json").read_text())
+    server = MLServer(settings=Settings(**config["settings"]))
+    await server.start(models_settings=models_settings({**config["workers"], **overrides}))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--workers", nargs="*", default=[], metavar="MODEL=N", help="worker threads per model")
+    args = parser.parse_args()
+    overrides = {name: int(count) for name, count in (item.split("=", 1) for item in args.workers)}
+    asyncio.run(main(overrides))
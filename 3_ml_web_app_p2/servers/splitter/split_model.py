@@ -1,21 +1,117 @@
 from mlserver import MLModel
-from mlserver.codecs import decode_args
+from mlserver.codecs import NumpyCodec
+from mlserver.types import InferenceRequest, InferenceResponse
+from concurrent.futures import ProcessPoolExecutor
+from collections import deque
+from pathlib import Path
+from typing import AsyncIterator, Iterator
 import numpy as np
 import demucs.api
+import asyncio
 import torch
+import sys
+import os
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+sys.path.append(str(Path(__file__).resolve().parents[3]))
+from shared.stage_timer import stage_timer, timed_args
+from precision import extra_parameters
+from windows import crossfade, window_starts
 
 
 class SongSplitter(MLModel):
+    """Vocals and instruments of a song, separated in cross-faded windows when `segment_seconds` is set."""
+
     async def load(self):
+        extra = extra_parameters(self)
+        self.segment_seconds = extra.get("segment_seconds")
+        self.overlap_seconds = extra.get("overlap_seconds", 1.0)
+        self.workers = extra.get("workers", 1)
         self.separator = demucs.api.Separator(device='cpu')
+        self.pool = None
+        if self.segment_seconds and self.workers > 1:
+            self.pool = ProcessPoolExecutor(self.workers, initializer=_init_worker, initargs=(self.workers,))
 
-    @decode_args
+    @timed_args
     async def predict(self, song: np.ndarray) -> np.ndarray:
-        tensong = torch.from_numpy(song)
-        original, result = self.separator.separate_tensor(tensong)
-        return self.post_processor(result)
+        timer = stage_timer(self)
+        if not self.segment_seconds:
+            tensong = torch.from_numpy(song)
+            with timer.stage("separate"):
+                original, result = self.separator.separate_tensor(tensong)
+            with timer.stage("post_process"):
+                return self.post_processor(result)
+
+        stems, offset = np.empty((4, song.shape[-1]), dtype=np.float32), 0
+        async for window in _iterate(self.split_windows(song)):
+            stems[:, offset: offset + window.shape[1]] = window
+            offset += window.shape[1]
+        return stems
+
+    async def predict_stream(self, payloads: AsyncIterator[InferenceRequest]) -> AsyncIterator[InferenceResponse]:
+        timer = stage_timer(self)
+        async for payload in payloads:
+            with timer.stage("decode"):
+                song = NumpyCodec.decode_input(payload.inputs[0])
+            timer.sizes(song=song)
+            async for window in _iterate(self.split_windows(song)):
+                with timer.stage("encode"):
+                    output = NumpyCodec.encode_output(name="output-0", payload=window)
+                yield InferenceResponse(model_name=self.name, id=payload.id, outputs=[output])
 
-    def post_processor(self, tensor_dict: dict[torch.Tensor]) -> np.ndarray:
+    def split_windows(self, song: np.ndarray) -> Iterator[np.ndarray]:
+        rate = self.separator.samplerate
+        window = int((self.segment_seconds or song.shape[-1] / rate) * rate)
+        overlap = min(int(self.overlap_seconds * rate), window // 2)
+        chunks = (song[..., start: start + window] for start in window_starts(song.shape[-1], window, overlap))
+        return crossfade(self._separate_chunks(chunks), overlap)
+
+    def _separate_chunks(self, chunks) -> Iterator[np.ndarray]:
+        timer = stage_timer(self)
+        if self.pool is None:
+            for chunk in chunks:
+                with timer.stage("separate"):
+                    original, result = self.separator.separate_tensor(torch.from_numpy(np.ascontiguousarray(chunk)))
+                with timer.stage("post_process"):
+                    stems = self.post_processor(result)
+                yield stems
+            return
+        # keep only a couple of windows per worker in flight so memory stays bounded
+        pending = deque()
+        for chunk in chunks:
+            pending.append(self.pool.submit(_separate_window, np.ascontiguousarray(chunk)))
+            if len(pending) >= 2 * self.workers:
+                with timer.stage("wait_for_worker"):
+                    stems = pending.popleft().result()
+                yield stems
+        while pending:
+            with timer.stage("wait_for_worker"):
+                stems = pending.popleft().result()
+            yield stems
+
+    @staticmethod
+    def post_processor(tensor_dict: dict[torch.Tensor]) -> np.ndarray:
         tensor_dict["instruments"] = tensor_dict["bass"] + tensor_dict["drums"] + tensor_dict["other"]
         del tensor_dict["bass"],  tensor_dict["drums"],  tensor_dict["other"]
-        return torch.vstack([tensor_dict['vocals'], tensor_dict['instruments']]).numpy()
\ No newline at end of file
+        return torch.vstack([tensor_dict['vocals'], tensor_dict['instruments']]).numpy()
+
+
+async def _iterate(generator: Iterator):
+    # separation is CPU bound, so step the generator in a thread to keep the server loop responsive
+    done = object()
+    while (item := await asyncio.to_thread(next, generator, done)) is not done:
+        yield item
+
+
+_worker_separator = None
+
+
+def _init_worker(workers: int):
+    global _worker_separator
+    torch.set_num_threads(max(1, (os.cpu_count() or 1) // workers))
+    _worker_separator = demucs.api.Separator(device='cpu')
+
+
+def _separate_window(chunk: np.ndarray) -> np.ndarray:
+    original, result = _worker_separator.separate_tensor(torch.from_numpy(chunk))
+    return SongSplitter.post_processor(result)
@@ -1,13 +1,22 @@
 from mlserver import MLModel
-from mlserver.codecs import decode_args
 from sentence_transformers import SentenceTransformer
 from typing import List
 import numpy as np
+from pathlib import Path
+import sys
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+sys.path.append(str(Path(__file__).resolve().parents[3]))
+from shared.stage_timer import stage_timer, timed_args
+from precision import extra_parameters, load_converted
+
+MINILM = "all-MiniLM-L6-v2"
 
 class TextEmbeddings(MLModel):
     async def load(self):
-        self.model = SentenceTransformer('all-MiniLM-L6-v2')
+        extra = extra_parameters(self)
+        self.model = load_converted(MINILM, extra.get("precision", "fp32"), lambda: SentenceTransformer(MINILM))
 
-    @decode_args
+    @timed_args
     async def predict(self, lyrics: List[str]) -> np.ndarray:
-        return self.model.encode(lyrics)
\ No newline at end of file
+        with stage_timer(self).stage("inference"):
+            return self.model.encode(lyrics, batch_size=len(lyrics), convert_to_numpy=True).astype(np.float32)
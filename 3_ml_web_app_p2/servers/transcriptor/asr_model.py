@@ -1,21 +1,126 @@
 from mlserver import MLModel
-from mlserver.codecs import decode_args
 from transformers import pipeline
 from typing import List
-import librosa
 import numpy as np
+import soxr
+from pathlib import Path
+import sys
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+sys.path.append(str(Path(__file__).resolve().parents[3]))
+from shared.stage_timer import stage_timer, timed_args
+from precision import extra_parameters, load_converted
+from windows import window_starts
+
+WHISPER = "openai/whisper-medium"
 
 
 class ASRServer(MLModel):
+    """Whisper lyrics, transcribed in overlapping voiced windows when `long_form` is set."""
+
     async def load(self):
-        self.pipe = pipeline("automatic-speech-recognition", model="openai/whisper-medium")
+        extra = extra_parameters(self)
+        self.pipe = load_converted(
+            WHISPER, extra.get("precision", "fp32"), lambda: pipeline("automatic-speech-recognition", model=WHISPER)
+        )
+        self.long_form = extra.get("long_form", False)
+        self.batch_size = extra.get("batch_size", 4)
+        self.window_seconds = extra.get("window_seconds", 30)
+        self.overlap_seconds = extra.get("overlap_seconds", 5)
 
-    @decode_args
+    @timed_args
     async def predict(self, song: np.ndarray, sample_rate: np.ndarray) -> List[str]:
-        resampled_song = self.pre_process(song, sample_rate[0][0])
-        return [self.pipe(resampled_song, max_new_tokens=2000)['text']]
-    
+        timer = stage_timer(self)
+        with timer.stage("pre_process"):
+            resampled_song = self.pre_process(song, sample_rate[0][0])
+        if self.long_form:
+            text, segments = self.transcribe_long(resampled_song)
+            return [text]
+        with timer.stage("inference"):
+            return [self.pipe(resampled_song, max_new_tokens=2000)['text']]
+
     def pre_process(self, song: np.ndarray, sample_rate) -> np.ndarray:
-        return librosa.resample(
-            song[0], orig_sr=sample_rate, target_sr=self.pipe.feature_extractor.sampling_rate
-        )
\ No newline at end of file
+        return resample(song[0], int(sample_rate), self.pipe.feature_extractor.sampling_rate)
+
+    def transcribe_long(self, audio: np.ndarray):
+        rate = self.pipe.feature_extractor.sampling_rate
+        window, overlap = int(self.window_seconds * rate), int(self.overlap_seconds * rate)
+        timer = stage_timer(self)
+        with timer.stage("vad"):
+            reference = loudness_reference(audio, rate)
+            starts = [
+                start for start in window_starts(len(audio), window, overlap)
+                if has_voice(audio[start: start + window], rate, reference)
+            ]
+        if not starts:
+            return "", []
+        with timer.stage("inference"):
+            results = self.pipe(
+                [{"raw": audio[start: start + window], "sampling_rate": rate} for start in starts],
+                batch_size=self.batch_size, return_timestamps=True, generate_kwargs={"max_new_tokens": 440},
+            )
+        with timer.stage("post_process"):
+            segments = merge_segments(starts, results, window, overlap, rate)
+        return " ".join(text for _, _, text in segments).strip(), segments
+
+
+def resample(audio: np.ndarray, orig_sr: int, target_sr: int) -> np.ndarray:
+    # soxr directly: the same polyphase resampler librosa wraps, without its dispatch and warm-up cost
+    if orig_sr == target_sr:
+        return audio.astype(np.float32, copy=False)
+    return soxr.resample(np.ascontiguousarray(audio, dtype=np.float32), orig_sr, target_sr, "HQ")
+
+
+def frame_energy(audio: np.ndarray, rate: int, frame_seconds=0.03):
+    frame = int(frame_seconds * rate)
+    frames = audio[: len(audio) // frame * frame].reshape(-1, frame)
+    return frames, np.mean(frames ** 2, axis=1) + 1e-10
+
+
+def loudness_reference(audio: np.ndarray, rate: int) -> float:
+    """Energy of the song's loud frames, what every window's frames are compared with."""
+    _, energy = frame_energy(audio, rate)
+    return float(np.percentile(energy, 99)) if len(energy) else 0.0
+
+
+def has_voice(
+    audio: np.ndarray, rate: int, reference=None, frame_seconds=0.03, threshold_db=-20, voice_band=0.5,
+    min_syllables=0.2, min_voiced=0.03,
+) -> bool:
+    """Whether a vocals-stem window has loud voice-band frames with the 2-8 Hz swing of syllables."""
+    frames, energy = frame_energy(audio, rate, frame_seconds)
+    if not len(frames):
+        return False
+    reference = np.percentile(energy, 99) if reference is None else reference
+    if reference < 1e-7:
+        return False
+    loud = 10 * np.log10(energy / reference) > threshold_db
+    if np.count_nonzero(loud) < min_voiced * len(frames):
+        return False
+    spectrum = np.abs(np.fft.rfft(frames, axis=1)) ** 2
+    freqs = np.fft.rfftfreq(frames.shape[1], 1 / rate)
+    band = spectrum[:, (freqs >= 300) & (freqs <= 3400)].sum(axis=1)
+    voiced = loud & (band / (spectrum.sum(axis=1) + 1e-10) > voice_band)
+    if np.count_nonzero(voiced) < min_voiced * len(frames):
+        return False
+    envelope = np.log10(band + 1e-10)
+    modulation = np.abs(np.fft.rfft(envelope - envelope.mean())) ** 2
+    rates = np.fft.rfftfreq(len(envelope), frame_seconds)
+    syllables = modulation[(rates >= 2) & (rates <= 8)].sum() / (modulation[rates > 0.25].sum() + 1e-10)
+    return syllables > min_syllables
+
+
+def merge_segments(starts, results, window, overlap, rate) -> list:
+    """Shifts each window's segments to song time and keeps those whose midpoint the window owns."""
+    segments = []
+    for idx, (start, result) in enumerate(zip(starts, results)):
+        follows = idx > 0 and starts[idx - 1] + window > start
+        precedes = idx + 1 < len(starts) and start + window > starts[idx + 1]
+        own_from = (start + overlap / 2) / rate if follows else start / rate
+        own_to = (start + window - overlap / 2) / rate if precedes else (start + window) / rate
+        for chunk in result.get("chunks") or [{"timestamp": (0.0, window / rate), "text": result["text"]}]:
+            begin, end = chunk["timestamp"]
+            begin = start / rate + (begin or 0.0)
+            end = start / rate + (end if end is not None else window / rate)
+            if own_from <= (begin + end) / 2 < own_to:
+                segments.append((begin, end, chunk["text"].strip()))
+    return segments
@@ -0,0 +1,25 @@
+"""Overlapping windows over long audio, for the servers that process a song a piece at a time."""
+from typing import Iterator
+
+import numpy as np
+
+
+def window_starts(num_samples: int, window: int, overlap: int) -> list:
+    """Starts of `window`-long windows sharing `overlap` samples; the last one reaches the end."""
+    hop = window - overlap
+    return [0] + list(range(hop, max(num_samples - overlap, 0), hop))
+
+
+def crossfade(windows: Iterator[np.ndarray], overlap: int) -> Iterator[np.ndarray]:
+    """Linearly blends the last `overlap` frames of each window into the next and yields the settled part."""
+    tail = None
+    for stems in windows:
+        if tail is not None:
+            ramp = np.linspace(0, 1, overlap, dtype=stems.dtype)
+            stems[:, :overlap] = tail * (1 - ramp) + stems[:, :overlap] * ramp
+        if overlap:
+            tail = stems[:, -overlap:].copy()
+            stems = stems[:, :-overlap]
+        yield stems
+    if tail is not None:
+        yield tail
@@ -0,0 +1,33 @@
+"""Audio helpers shared by the app and the offline jobs. Importing this module has no side effects."""
+import numpy as np
+import soxr
+
+EMBEDDING_SAMPLE_RATE = 32000  # what PANNs was trained on
+CLIP_SECONDS = 30
+
+
+def to_mono(song, sample_rate, target_sr):
+    mono = song.mean(axis=0) if song.ndim > 1 else song
+    mono = np.ascontiguousarray(mono, dtype=np.float32)
+    if sample_rate == target_sr:
+        return mono
+    # soxr low-pass filters before decimating, so downsampling does not alias
+    return soxr.resample(mono, sample_rate, target_sr, "HQ")
+
+
+def fixed_length(clip: np.ndarray, length: int) -> np.ndarray:
+    # centre crop long songs, zero pad short ones, so every clip stacks into one batch
+    if len(clip) >= length:
+        start = (len(clip) - length) // 2
+        return clip[start: start + length]
+    return np.pad(clip, (0, length - len(clip)))
+
+
+def embedding_clip(song, sample_rate) -> np.ndarray:
+    """The part of a song that goes into the similarity index, wherever it is embedded from."""
+    return fixed_length(to_mono(song, sample_rate, EMBEDDING_SAMPLE_RATE), CLIP_SECONDS * EMBEDDING_SAMPLE_RATE)
+
+
+def embedding_inputs(clips: np.ndarray) -> dict:
+    # half the bytes back; the index stores float32 anyway
+    return {"song": clips, "dtype": ["float16"]}
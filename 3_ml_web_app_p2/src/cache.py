@@ -0,0 +1,87 @@
+from collections import OrderedDict
+from pathlib import Path
+import threading
+import os
+
+import numpy as np
+
+
+class SongCache:
+    """Decoded songs in an in-memory LRU, spilling to memory-mapped `.npy` files past the budget."""
+
+    def __init__(self, cache_dir="./music/cache", memory_bytes=512 * 2**20, disk_bytes=4 * 2**30):
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.memory_bytes, self.disk_bytes = memory_bytes, disk_bytes
+        self.memory = OrderedDict()
+        self.disk = OrderedDict()
+        self.memory_size = self.disk_size = 0
+        for path in self.cache_dir.glob("*.tmp"):
+            path.unlink(missing_ok=True)
+        for path in sorted(self.cache_dir.glob("*.npy"), key=os.path.getatime):
+            self.disk[path.name.split(".")[0]] = path, path.stat().st_size
+            self.disk_size += path.stat().st_size
+        self.counts = {"memory_hits": 0, "disk_hits": 0, "misses": 0}
+        self._lock = threading.Lock()
+        with self._lock:
+            self._evict_disk()
+
+    def get(self, song_id: str):
+        with self._lock:
+            if song_id in self.memory:
+                self.memory.move_to_end(song_id)
+                self.counts["memory_hits"] += 1
+                return self.memory[song_id]
+            path, _ = self.disk.get(song_id, (None, 0))
+            if path is None or not path.exists():
+                self._forget_disk(song_id)
+                self.counts["misses"] += 1
+                return None
+            self.disk.move_to_end(song_id)
+            self.counts["disk_hits"] += 1
+        return np.load(path, mmap_mode="r"), int(path.name.split(".")[1])
+
+    def put(self, song_id: str, song: np.ndarray, sample_rate: int):
+        song = np.ascontiguousarray(song, dtype=np.float32)
+        path = self.cache_dir / f"{song_id}.{int(sample_rate)}.npy"
+        # written outside the lock under a name only this thread uses, then swapped in
+        tmp_path = path.with_name(f"{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        with open(tmp_path, "wb") as f:
+            np.save(f, song)
+        with self._lock:
+            os.replace(tmp_path, path)
+            old_path, _ = self.disk.get(song_id, (path, 0))
+            self._forget_disk(song_id)
+            if old_path != path:
+                old_path.unlink(missing_ok=True)
+            self.disk[song_id] = path, path.stat().st_size
+            self.disk_size += self.disk[song_id][1]
+            self._evict_disk()
+            self._remember(song_id, (song, int(sample_rate)))
+        return song, int(sample_rate)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                **self.counts,
+                "memory_songs": len(self.memory), "memory_bytes": self.memory_size,
+                "disk_songs": len(self.disk), "disk_bytes": self.disk_size,
+            }
+
+    def _remember(self, song_id, entry):
+        if song_id in self.memory:
+            self.memory_size -= self.memory.pop(song_id)[0].nbytes
+        self.memory[song_id] = entry
+        self.memory_size += entry[0].nbytes
+        while len(self.memory) > 1 and self.memory_size > self.memory_bytes:
+            self.memory_size -= self.memory.popitem(last=False)[1][0].nbytes
+
+    def _forget_disk(self, song_id):
+        if song_id in self.disk:
+            self.disk_size -= self.disk.pop(song_id)[1]
+
+    def _evict_disk(self):
+        while len(self.disk) > 1 and self.disk_size > self.disk_bytes:
+            _, (path, size) = self.disk.popitem(last=False)
+            self.disk_size -= size
+            path.unlink(missing_ok=True)
@@ -0,0 +1,114 @@
+from bisect import bisect_left
+from functools import lru_cache
+from typing import List
+
+import numpy as np
+import pandas as pd
+
+PAGE_SIZE = 50
+NGRAM = 3
+
+
+def normalize(texts: pd.Series) -> pd.Series:
+    """Lower case, accents dropped and punctuation turned into spaces: `Beyoncé - Halo!` -> `beyonce halo`."""
+    texts = texts.fillna("").astype(str).str.normalize("NFKD").str.replace("[\\u0300-\\u036f]", "", regex=True)
+    return texts.str.casefold().str.replace(r"[\W_]+", " ", regex=True).str.strip()
+
+
+def postings(rows: np.ndarray, codes: np.ndarray, size: int) -> list:
+    """For every code below `size`, the sorted unique rows it appears in. `rows` must be non-decreasing."""
+    # a stable sort on the codes alone keeps every code's rows in order; radix sort when they fit 16 bits
+    codes = codes.astype(np.uint16 if size <= 2**16 else np.int64, copy=False)
+    order = np.argsort(codes, kind="stable")
+    rows, codes = rows[order], codes[order]
+    keep = np.ones(len(rows), dtype=bool)
+    keep[1:] = (rows[1:] != rows[:-1]) | (codes[1:] != codes[:-1])  # a word twice in a title counts once
+    rows, codes = rows[keep], codes[keep]
+    return np.split(rows.astype(np.int32), np.searchsorted(codes, np.arange(1, size)))
+
+
+def trigrams(texts) -> tuple:
+    """Every trigram of every text as an int64 of three 21-bit code points, and the row it came from."""
+    lengths = np.fromiter(map(len, texts), dtype=np.int64, count=len(texts))
+    chars = np.frombuffer("".join(texts).encode("utf-32-le"), dtype=np.uint32).astype(np.int64)
+    counts = np.maximum(lengths - NGRAM + 1, 0)
+    rows = np.repeat(np.arange(len(texts)), counts)
+    # position of every trigram's first character in `chars`
+    starts = np.arange(counts.sum()) + np.repeat(np.cumsum(lengths) - lengths - (np.cumsum(counts) - counts), counts)
+    return rows, chars[starts] << 42 | chars[starts + 1] << 21 | chars[starts + 2]
+
+
+class Catalog:
+    """`payload.csv` indexed once at startup, searchable by word prefix and substring, a page at a time."""
+
+    def __init__(self, path="payload.csv", cache_size=256):
+        self.songs = pd.read_csv(path)
+        self.labels = self.songs["artist_song"].fillna("").astype(str).to_numpy()
+        self.row_by_id = {song_id: row for row, song_id in enumerate(self.songs["ids"])}
+        self.rows_by_label = {}
+        for row, label in enumerate(self.labels):
+            self.rows_by_label.setdefault(label, []).append(row)
+
+        self.normalized = normalize(self.songs["artist_song"]).to_numpy()
+        self.order = np.argsort(self.normalized, kind="stable").astype(np.int32)  # label order, for ranking pages
+        self.rank = np.empty_like(self.order)
+        self.rank[self.order] = np.arange(len(self.order), dtype=np.int32)
+
+        words = pd.Series(self.normalized).str.split().explode().dropna()
+        # hashing the words once and sorting integer codes is far cheaper than sorting the strings
+        codes, vocabulary = pd.factorize(words, sort=True)
+        self.vocabulary = vocabulary.tolist()
+        self.word_rows = postings(words.index.to_numpy(), codes, len(vocabulary))
+        rows, grams = trigrams([f" {text} " for text in self.normalized])
+        codes, self.grams = pd.factorize(grams, sort=True)
+        self.gram_rows = postings(rows, codes, len(self.grams))
+
+        self._matches = lru_cache(maxsize=cache_size)(self._match)  # typeahead asks for the same prefixes again
+
+    def __len__(self):
+        return len(self.songs)
+
+    def row(self, song_id: str) -> int:
+        return self.row_by_id[song_id]
+
+    def song(self, song_id: str) -> pd.Series:
+        return self.songs.iloc[self.row_by_id[song_id]]
+
+    def label(self, song_id: str) -> str:
+        return self.labels[self.row_by_id[song_id]]
+
+    def rows_for(self, label: str) -> List[int]:
+        return self.rows_by_label.get(label, [])
+
+    def search(self, query: str = "", page: int = 0, page_size: int = PAGE_SIZE) -> dict:
+        rows = self._matches(" ".join(normalize(pd.Series([query])).iloc[0].split()))
+        start = max(page, 0) * page_size
+        return {
+            "query": query, "page": page, "page_size": page_size, "total": int(len(rows)),
+            "items": [{"id": self.songs.at[row, "ids"], "label": self.labels[row]} for row in rows[start: start + page_size]],
+        }
+
+    def _match(self, query: str) -> np.ndarray:
+        if not query:
+            return self.order
+        rows = None
+        for term in query.split():
+            lo, hi = bisect_left(self.vocabulary, term), bisect_left(self.vocabulary, term + "\U0010ffff")
+            found = np.unique(np.concatenate(self.word_rows[lo:hi])) if hi > lo else np.empty(0, np.int32)
+            rows = found if rows is None else np.intersect1d(rows, found, assume_unique=True)
+            if not len(rows):
+                rows = self._substring(query)
+                break
+        return rows[np.argsort(self.rank[rows])]
+
+    def _substring(self, query: str) -> np.ndarray:
+        grams = np.unique(trigrams([query])[1])
+        found = np.searchsorted(self.grams, grams)
+        if not len(grams) or (found == len(self.grams)).any() or (self.grams[np.minimum(found, len(self.grams) - 1)] != grams).any():
+            return np.empty(0, np.int32)
+        rows = None
+        for idx in sorted(found, key=lambda idx: len(self.gram_rows[idx])):  # rarest first
+            rows = self.gram_rows[idx] if rows is None else np.intersect1d(rows, self.gram_rows[idx], assume_unique=True)
+        # trigrams only narrow it down, the substring has to be there in full
+        return np.array([row for row in rows if query in self.normalized[row]], dtype=np.int32)
+
@@ -0,0 +1,150 @@
+"""
+Offline job that embeds every song in `payload.csv` into the similarity index.
+
+    python -m src.embed_catalog --batch-size 16 --workers 8
+    python -m src.embed_catalog --audio-dir ./music/catalog --stub   # fully offline, into ./embeddings/stub
+
+Songs stream through download -> decode -> resample -> crop as a chain of generators; the
+crop is `src.audio.embedding_clip`, the same one the app embeds songs with.
+Downloads and decoding run on a thread pool behind a bounded prefetch queue, so the network
+stays busy while the model embeds the previous batch. Each finished batch is flushed to the
+index, which doubles as the checkpoint: a re-run skips every row that is already filled.
+"""
+from concurrent.futures import ThreadPoolExecutor
+from collections import deque
+from pathlib import Path
+import argparse
+import threading
+import queue
+import sys
+import io
+
+from pedalboard.io import AudioFile
+import numpy as np
+import pandas as pd
+import requests
+
+from src.audio import embedding_clip, embedding_inputs
+sys.path.append(str(Path(__file__).resolve().parents[2]))
+from shared.client import TensorClient
+from src.similarity import EmbeddingIndex
+
+
+def pending_songs(catalog: pd.DataFrame, index: EmbeddingIndex):
+    for row, song_id, url in zip(catalog.index, catalog['ids'], catalog['urls']):
+        if row not in index:
+            yield row, song_id, url
+
+
+def load_clip(song, audio_dir=None):
+    row, song_id, url = song
+    if audio_dir is not None:
+        source = str(Path(audio_dir) / f"{song_id}.mp3")
+    else:
+        source = io.BytesIO(requests.get(url, timeout=60).content)
+    with AudioFile(source, "r") as f:
+        audio, song_rate = f.read(f.frames), f.samplerate
+    return row, embedding_clip(audio, song_rate)
+
+
+def parallel_map(fn, items, workers, max_in_flight=None):
+    """Ordered `map` over a thread pool that never submits more than `max_in_flight` items ahead."""
+    max_in_flight = max_in_flight or 2 * workers
+    with ThreadPoolExecutor(workers) as pool:
+        pending = deque()
+        for item in items:
+            pending.append((item, pool.submit(fn, item)))
+            if len(pending) >= max_in_flight:
+                yield pending.popleft()
+        while pending:
+            yield pending.popleft()
+
+
+def prefetch(items, size):
+    """Runs the upstream generator in a background thread, buffering at most `size` items."""
+    buffer, done = queue.Queue(maxsize=size), object()
+
+    def produce():
+        try:
+            for item in items:
+                buffer.put(item)
+        finally:
+            buffer.put(done)
+
+    threading.Thread(target=produce, daemon=True).start()
+    while (item := buffer.get()) is not done:
+        yield item
+
+
+def batched(loaded, batch_size):
+    rows, clips = [], []
+    for song, future in loaded:
+        try:
+            row, clip = future.result()
+        except Exception as error:
+            print(f"skipping {song[1]}: {error}")
+            continue
+        rows.append(row)
+        clips.append(clip)
+        if len(rows) == batch_size:
+            yield np.array(rows), np.stack(clips)
+            rows, clips = [], []
+    if rows:
+        yield np.array(rows), np.stack(clips)
+
+
+class ServerEmbedder:
+    def __init__(self, client: TensorClient):
+        self.client = client
+
+    def __call__(self, clips: np.ndarray) -> np.ndarray:
+        embeddings, = self.client.infer("audio_embedding", **embedding_inputs(clips))
+        return embeddings
+
+
+class StubEmbedder:
+    """Deterministic stand-in for PANNs: a fixed random projection of the clip's log spectrum."""
+
+    def __init__(self, dim=2048, bins=512, seed=0):
+        self.bins = bins
+        self.projection = np.random.default_rng(seed).normal(size=(bins, dim)).astype(np.float32)
+
+    def __call__(self, clips: np.ndarray) -> np.ndarray:
+        frames = clips[:, : clips.shape[1] // (2 * self.bins) * 2 * self.bins].reshape(len(clips), -1, 2 * self.bins)
+        spectrum = np.log1p(np.abs(np.fft.rfft(frames, axis=-1)[..., : self.bins]).mean(axis=1))
+        return spectrum.astype(np.float32) @ self.projection
+
+
+def run(catalog, index, embedder, audio_dir=None, batch_size=16, workers=8, prefetch_size=64):
+    songs = pending_songs(catalog, index)
+    loaded = prefetch(parallel_map(lambda song: load_clip(song, audio_dir), songs, workers), prefetch_size)
+    done = 0
+    for rows, clips in batched(loaded, batch_size):
+        index.add(rows, embedder(clips))
+        done += len(rows)
+        print(f"embedded {done} songs, {len(index)}/{len(catalog)} in the index")
+    return done
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--catalog", default="payload.csv")
+    parser.add_argument("--index", default=None, help="./embeddings/audio, the app's index, or ./embeddings/stub with --stub")
+    parser.add_argument("--audio-dir", default=None, help="read <ids>.mp3 files from here instead of the urls")
+    parser.add_argument("--stub", action="store_true", help="use the offline stub instead of the audio_embedding server")
+    parser.add_argument("--batch-size", type=int, default=16)
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--prefetch", type=int, default=64)
+    parser.add_argument("--limit", type=int, default=None)
+    args = parser.parse_args()
+
+    catalog = pd.read_csv(args.catalog)
+    if args.limit:
+        catalog = catalog.iloc[: args.limit]
+    embedder = StubEmbedder() if args.stub else ServerEmbedder(TensorClient(grpc_port=4040))
+    # stub vectors are not PANNs embeddings, so they never go into the index the app searches
+    index = args.index or ("./embeddings/stub" if args.stub else "./embeddings/audio")
+    run(
+        catalog, EmbeddingIndex(index), embedder, audio_dir=args.audio_dir, batch_size=args.batch_size,
+        workers=args.workers, prefetch_size=args.prefetch,
+    )
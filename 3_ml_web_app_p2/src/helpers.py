@@ -1,23 +1,30 @@
 from pedalboard.io import AudioFile
+from pathlib import Path
+import numpy as np
 import pandas as pd
 import requests
+import sys
 import io
-import os
-from faker import Faker
+sys.path.append(str(Path(__file__).resolve().parents[2]))
+from shared.artifacts import ArtifactStore
+from src.cache import SongCache
 
+song_cache = SongCache()
+audio_store = ArtifactStore()
 
-def create_tmp_audio(audio_data, sr):
-    faker = Faker()
-    file_name = os.path.join('./music', f"{faker.user_name()}.mp3")
-    with AudioFile(file_name, "w", samplerate=sr, num_channels=1) as f:
-        f.write(audio_data)
-    return file_name
 
-def download_song(df, song_to_get):
-    song_url = df.loc[df['artist_song'] == song_to_get, 'urls'].iloc[0]
+def create_tmp_audio(audio_data, sr, session_id, keep=0.0):
+    # the player needs a file, so encode now; the store bounds how many stay on disk
+    return audio_store.export(session_id, audio_store.put(session_id, audio_data, sr), keep=keep)
+
+def download_song(song):
+    song_id, song_url = song['ids'], song['urls']
+    cached = song_cache.get(song_id)
+    if cached is not None:
+        return cached
     with requests.get(song_url, stream=True) as music:
         fil = io.BytesIO(music.content)
         with AudioFile(fil, "r") as f:
             song = f.read(f.frames)
             sample_rate = f.samplerate
-    return song, sample_rate
\ No newline at end of file
+    return song_cache.put(song_id, song, sample_rate)
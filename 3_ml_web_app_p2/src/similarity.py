@@ -0,0 +1,149 @@
+from pathlib import Path
+import threading
+import json
+import os
+
+import numpy as np
+
+
+class EmbeddingIndex:
+    """Normalised catalog embeddings in a memory-mapped matrix, one row per `payload.csv` row."""
+
+    def __init__(self, path="./embeddings/audio", dim=None):
+        self.path = Path(path)
+        self.path.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.RLock()
+        self.meta = {"dim": dim}
+        self.vectors = self.filled = self.assignments = self.centroids = None
+        self._centroids_mtime = None
+        self._refresh()
+
+    @property
+    def dim(self):
+        return self.meta["dim"]
+
+    @property
+    def capacity(self) -> int:
+        return 0 if self.filled is None else len(self.filled)
+
+    def __len__(self):
+        self._refresh()
+        return 0 if self.filled is None else int(np.count_nonzero(self.filled))
+
+    def __contains__(self, row: int):
+        self._refresh()
+        return self.filled is not None and row < len(self.filled) and bool(self.filled[row])
+
+    def add(self, rows, vectors: np.ndarray):
+        """Writes (or overwrites) the vectors for catalog `rows`; no rebuild of the rest of the index."""
+        rows = np.atleast_1d(np.asarray(rows, dtype=np.int64))
+        vectors = np.atleast_2d(np.asarray(vectors, dtype=np.float32))
+        with self._lock:
+            self._refresh()
+            if self.dim is None:
+                self.meta["dim"] = vectors.shape[1]
+                self._write_meta()
+            if rows.max() >= self.capacity:
+                self._map(max(int(rows.max()) + 1, 2 * self.capacity, 1024))
+            self.vectors[rows] = normalize(vectors)
+            self.filled[rows] = 1
+            if self.centroids is not None:
+                self.assignments[rows] = np.argmax(self.vectors[rows] @ self.centroids.T, axis=1)
+            self.flush()
+
+    def search(self, query: np.ndarray, k=10, exclude=(), nprobe=None):
+        """Returns `(rows, scores)` of the `k` most similar songs, best first."""
+        with self._lock:
+            self._refresh()  # also picks up rows another process added
+            if self.filled is None:
+                return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+            # `add` remaps the arrays and writes rows meanwhile; the vectors of rows filled now stay put
+            vectors, centroids = self.vectors, self.centroids
+            filled, assignments = np.array(self.filled), np.array(self.assignments)
+        if not filled.any():
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        query = normalize(np.asarray(query, dtype=np.float32).reshape(1, -1))[0]
+        if nprobe and centroids is not None:
+            probes = np.argsort(centroids @ query)[-nprobe:]
+            candidates = np.flatnonzero(np.isin(assignments, probes) & (filled == 1))
+            candidates = candidates[~np.isin(candidates, np.asarray(exclude, dtype=np.int64))]
+            scores = vectors[candidates] @ query
+        else:
+            candidates = np.flatnonzero(filled)
+            candidates = candidates[~np.isin(candidates, np.asarray(exclude, dtype=np.int64))]
+            scores = (vectors @ query)[candidates]
+        k = min(k, len(candidates))
+        top = np.argpartition(-scores, k - 1)[:k] if k else np.empty(0, dtype=np.int64)
+        top = top[np.argsort(-scores[top])]
+        return candidates[top], scores[top]
+
+    def similar_to(self, row: int, k=10, nprobe=None):
+        with self._lock:
+            self._refresh()
+            query = np.array(self.vectors[row])
+        return self.search(query, k=k, exclude=[row], nprobe=nprobe)
+
+    def build_ivf(self, n_lists=None, iterations=10, sample=50_000, seed=0):
+        """Clusters the stored vectors with spherical k-means; new rows are assigned as they are added."""
+        self._refresh()
+        rows = np.flatnonzero(self.filled)
+        n_lists = n_lists or max(1, int(np.sqrt(len(rows))))
+        rng = np.random.default_rng(seed)
+        train = np.array(self.vectors[rng.choice(rows, min(sample, len(rows)), replace=False)])
+        centroids = train[rng.choice(len(train), n_lists, replace=False)]
+        for _ in range(iterations):
+            labels = np.argmax(train @ centroids.T, axis=1)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, labels, train)
+            empty = ~sums.any(axis=1)
+            sums[empty] = centroids[empty]
+            centroids = normalize(sums)
+        with self._lock:
+            self.centroids = centroids
+            tmp = self.path / f"centroids.npy.{os.getpid()}"
+            with open(tmp, "wb") as f:
+                np.save(f, centroids)
+            os.replace(tmp, self.path / "centroids.npy")
+            self._centroids_mtime = (self.path / "centroids.npy").stat().st_mtime_ns
+            for start in range(0, len(rows), 65_536):
+                chunk = rows[start: start + 65_536]
+                self.assignments[chunk] = np.argmax(self.vectors[chunk] @ centroids.T, axis=1)
+            self.flush()
+
+    def flush(self):
+        for array in (self.vectors, self.filled, self.assignments):
+            array.flush()
+
+    def _write_meta(self):
+        tmp = self.path / f"meta.json.{os.getpid()}"
+        tmp.write_text(json.dumps(self.meta))
+        os.replace(tmp, self.path / "meta.json")
+
+    def _refresh(self):
+        meta, filled, centroids = self.path / "meta.json", self.path / "filled.u8", self.path / "centroids.npy"
+        with self._lock:
+            if self.dim is None and meta.exists():
+                self.meta["dim"] = json.loads(meta.read_text())["dim"]
+            if self.dim is not None and filled.exists() and filled.stat().st_size > self.capacity:
+                self._map(filled.stat().st_size)
+            mtime = centroids.stat().st_mtime_ns if centroids.exists() else None
+            if mtime != self._centroids_mtime:
+                self.centroids = np.load(centroids) if mtime is not None else None
+                self._centroids_mtime = mtime
+
+    def _map(self, capacity: int):
+        # grow the backing files in place; rows already written keep their offsets
+        files = (("vectors.f32", np.float32, (capacity, self.dim)), ("filled.u8", np.uint8, (capacity,)),
+                 ("assignments.i32", np.int32, (capacity,)))
+        arrays = []
+        for name, dtype, shape in files:
+            file = self.path / name
+            with open(file, "ab") as f:
+                f.truncate(max(f.tell(), int(np.prod(shape)) * np.dtype(dtype).itemsize))
+            arrays.append(np.memmap(file, dtype=dtype, mode="r+", shape=shape))
+        self.vectors, self.filled, self.assignments = arrays
+
+
+def normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
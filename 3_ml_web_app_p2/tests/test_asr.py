@@ -0,0 +1,116 @@
+import numpy as np
+import pytest
+from mlserver import ModelSettings
+
+from servers.transcriptor.asr_model import ASRServer, has_voice, loudness_reference, merge_segments
+
+RATE = 16000
+SECONDS = 30
+
+
+def db(level):
+    return 0.3 * 10 ** (level / 20)
+
+
+def normalized(audio, level):
+    return (level * audio / (np.abs(audio).max() + 1e-12)).astype(np.float32)
+
+
+def singing(rng, level=db(0), seconds=SECONDS):
+    """A gliding 150 Hz voice through three formants, gated into 4 Hz syllables and phrases."""
+    t = np.arange(seconds * RATE) / RATE
+    f0 = 150 + 40 * np.sin(2 * np.pi * 0.3 * t + rng.uniform(0, 6)) + 5 * np.sin(2 * np.pi * 5.5 * t)
+    phase = 2 * np.pi * np.cumsum(f0) / RATE
+    voice = np.zeros_like(t)
+    for harmonic in range(1, 40):
+        f = harmonic * 150
+        gain = sum(np.exp(-((f - centre) ** 2) / (2 * width ** 2)) for centre, width in ((700, 130), (1200, 200), (2600, 300)))
+        voice += (gain + 0.05 / harmonic) * np.sin(harmonic * phase)
+    syllables = np.clip(np.sin(2 * np.pi * 4 * t + rng.uniform(0, 6)), 0, None) ** 0.5
+    phrases = np.sin(2 * np.pi * t / 8 + rng.uniform(0, 6)) > -0.3
+    return normalized(voice * syllables * phrases, level)
+
+
+def chords(rng, level, every=2.0, decay=1.2, notes=(330, 392, 440, 523, 587, 659)):
+    """Pads, keys or strummed guitar: mid-range chords in the voice band, hit every `every` seconds."""
+    out, n = np.zeros(SECONDS * RATE), SECONDS * RATE
+    for start in np.arange(0, SECONDS, every):
+        i = int(start * RATE)
+        k = np.arange(min(int(max(every, 2.0) * RATE), n - i))
+        for f in rng.choice(notes, 3, replace=False):
+            for harmonic in range(1, 5):
+                out[i: i + len(k)] += np.sin(2 * np.pi * f * harmonic * k / RATE) * np.exp(-k / (decay * RATE)) / harmonic
+    return normalized(out, level)
+
+
+def rhythm(rng, level):
+    """Bass, kick and hi-hats."""
+    t = np.arange(SECONDS * RATE) / RATE
+    out = 0.5 * np.sin(2 * np.pi * 55 * t) + 0.2 * np.sin(2 * np.pi * 110 * t)
+    k = np.arange(int(0.15 * RATE))
+    for i in range(0, len(t) - len(k), RATE // 2):
+        out[i: i + len(k)] += np.sin(2 * np.pi * 60 * k / RATE) * np.exp(-k / (0.04 * RATE))
+        out[i: i + len(k)] += 0.3 * np.diff(rng.normal(size=len(k) + 1) * np.exp(-np.arange(len(k) + 1) / (0.01 * RATE)))
+    return normalized(out, level)
+
+
+@pytest.fixture
+def rng():
+    return np.random.default_rng(0)
+
+
+@pytest.fixture
+def reference(rng):
+    # a vocals stem's loudness is set by its singing
+    return loudness_reference(singing(rng), RATE)
+
+
+def test_singing_is_detected(rng, reference):
+    for _ in range(4):
+        assert has_voice(singing(rng) + chords(rng, db(-25)), RATE, reference)
+    assert has_voice(singing(rng, db(-10)) + chords(rng, db(-30)), RATE, reference)  # a quiet verse
+    short_phrase = singing(rng)
+    short_phrase[6 * RATE:] = 0
+    assert has_voice(short_phrase, RATE, reference)
+
+
+@pytest.mark.parametrize("stem", [
+    lambda rng: chords(rng, db(0)),                       # a pad as loud as the singing
+    lambda rng: chords(rng, db(-25), every=0.25, decay=0.08),  # strummed guitar bleeding into the stem
+    lambda rng: chords(rng, db(-25)),
+    lambda rng: rhythm(rng, db(0)),
+    lambda rng: rhythm(rng, db(-20)) + chords(rng, db(-20)),
+    lambda rng: np.zeros(SECONDS * RATE, dtype=np.float32),
+    lambda rng: rng.normal(0, 1e-5, SECONDS * RATE).astype(np.float32),
+])
+def test_vocal_free_stems_are_skipped(rng, reference, stem):
+    assert not has_voice(stem(rng), RATE, reference)
+
+
+def test_merge_keeps_every_segment_once():
+    window, overlap = 30 * RATE, 5 * RATE
+    results = [
+        {"chunks": [{"timestamp": (1.0, 4.0), "text": "one"}, {"timestamp": (26.0, 29.0), "text": "two"}]},
+        # the same words seen by the next window, 25 s later
+        {"chunks": [{"timestamp": (1.0, 4.0), "text": "two"}, {"timestamp": (10.0, 12.0), "text": "three"}]},
+    ]
+    segments = merge_segments([0, 25 * RATE], results, window, overlap, RATE)
+    assert [text for _, _, text in segments] == ["one", "two", "three"]
+    assert segments[-1][:2] == (35.0, 37.0)
+
+
+def test_long_form_only_transcribes_windows_with_singing(rng):
+    class FakePipe:
+        class feature_extractor:
+            sampling_rate = RATE
+
+        def __call__(self, windows, **kwargs):
+            self.windows = windows
+            return [{"text": "la", "chunks": [{"timestamp": (0.0, 2.0), "text": "la"}]} for _ in windows]
+
+    model = ASRServer(ModelSettings(name="music_transcriber", implementation=ASRServer))
+    model.pipe, model.batch_size, model.window_seconds, model.overlap_seconds = FakePipe(), 4, 30, 5
+    # windows start every 25 s; those at 50 and 75 s only hear the bleed between the two verses
+    song = np.concatenate([singing(rng), chords(rng, db(-30)), chords(rng, db(-30)), singing(rng)])
+    model.transcribe_long(song)
+    assert len(model.pipe.windows) == 4
@@ -0,0 +1,79 @@
+import asyncio
+
+import numpy as np
+import pytest
+import torch
+from mlserver import ModelSettings
+from mlserver.codecs import NumpyCodec, StringCodec
+from mlserver.types import InferenceRequest
+
+from servers.audio_embeddings.audio_embs import MusicEmbeddings, cut_windows, mean_pool, pick_device
+
+
+class FakeAudioTagging:
+    """Embeds a window as its mean and its peak, and records how many windows each call got."""
+
+    def __init__(self):
+        self.batches = []
+
+    def inference(self, windows):
+        self.batches.append(len(windows))
+        return None, np.stack([windows.mean(axis=1), np.abs(windows).max(axis=1)], axis=1)
+
+
+@pytest.fixture
+def embedder():
+    model = MusicEmbeddings(ModelSettings(name="audio_embedding", implementation=MusicEmbeddings))
+    model.model, model.window, model.max_windows, model.batch_size = FakeAudioTagging(), 100, 3, 2
+    return model
+
+
+def embed(model, songs, lengths=None, dtype=None):
+    inputs = [NumpyCodec.encode_input("song", songs)]
+    if lengths is not None:
+        inputs.append(NumpyCodec.encode_input("lengths", lengths))
+    if dtype is not None:
+        inputs.append(StringCodec.encode_input("dtype", [dtype], use_bytes=False))
+    return NumpyCodec.decode_output(asyncio.run(model.predict(InferenceRequest(inputs=inputs))).outputs[0])
+
+
+def test_short_songs_are_one_padded_window():
+    windows, owners = cut_windows(np.ones((1, 300), np.float32), np.array([60]), window=100, max_windows=3)
+    assert windows.shape == (1, 100) and windows.sum() == 60 and owners.tolist() == [0]
+
+
+def test_long_songs_get_at_most_max_windows_spread_evenly():
+    song = np.arange(1000, dtype=np.float32)[None]
+    windows, owners = cut_windows(song, np.array([1000]), window=100, max_windows=3)
+    assert [int(window[0]) for window in windows] == [0, 450, 900] and owners.tolist() == [0, 0, 0]
+    windows, _ = cut_windows(song, np.array([250]), window=100, max_windows=6)
+    assert [int(window[0]) for window in windows] == [0, 75, 150]  # ceil(250 / 100) windows, ending at the length
+
+
+def test_mean_pool_averages_each_songs_windows():
+    embeddings = np.array([[1.0, 0], [3, 0], [5, 5]])
+    assert mean_pool(embeddings, np.array([0, 0, 1]), 2).tolist() == [[2, 0], [5, 5]]
+
+
+def test_padding_is_never_embedded(embedder):
+    rng = np.random.default_rng(0)
+    short, long = rng.normal(size=150).astype(np.float32), rng.normal(size=1000).astype(np.float32)
+    batch = np.stack([np.pad(short, (0, 850)), long])
+    together = embed(embedder, batch, lengths=np.array([[150], [1000]]))
+    assert np.allclose(together[0], embed(embedder, short[None])[0], atol=1e-6)
+    assert np.allclose(together[1], embed(embedder, long[None])[0], atol=1e-6)
+    assert embedder.model.batches[:3] == [2, 2, 1]  # 2 + 3 windows, `batch_size` at a time
+
+
+def test_float16_halves_the_bytes(embedder):
+    song = np.random.default_rng(1).normal(size=(1, 400)).astype(np.float32)
+    full, half = embed(embedder, song), embed(embedder, song, dtype="float16")
+    assert full.dtype == np.float32 and half.dtype == np.float16
+    assert np.allclose(full, half, atol=1e-2)
+
+
+def test_auto_device_prefers_cuda(monkeypatch):
+    monkeypatch.setattr(torch.cuda, "is_available", lambda: True)
+    assert pick_device("auto") == "cuda" and pick_device("cpu") == "cpu"
+    monkeypatch.setattr(torch.cuda, "is_available", lambda: False)
+    assert pick_device("auto") == "cpu"
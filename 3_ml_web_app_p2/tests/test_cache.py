@@ -0,0 +1,73 @@
+import threading
+
+import numpy as np
+
+from src.cache import SongCache
+
+
+def song(seconds, value=0.5, sample_rate=1000):
+    return np.full((2, seconds * sample_rate), value, dtype=np.float32)
+
+
+def test_memory_hit_then_disk_hit(tmp_path):
+    cache = SongCache(tmp_path, memory_bytes=10**6, disk_bytes=10**7)
+    cache.put("a", song(1), 1000)
+    audio, sample_rate = cache.get("a")
+    assert sample_rate == 1000 and not isinstance(audio, np.memmap)
+
+    reopened = SongCache(tmp_path, memory_bytes=10**6, disk_bytes=10**7)
+    audio, sample_rate = reopened.get("a")
+    assert isinstance(audio, np.memmap) and np.array_equal(audio, song(1))
+    assert reopened.get("missing") is None
+    assert reopened.stats()["disk_hits"] == 1 and reopened.stats()["misses"] == 1
+
+
+def test_disk_hits_stay_out_of_the_memory_tier(tmp_path):
+    SongCache(tmp_path).put("a", song(1), 1000)
+    cache = SongCache(tmp_path, memory_bytes=1)
+    cache.get("a")
+    assert cache.stats()["memory_songs"] == 0 and cache.stats()["memory_bytes"] == 0
+
+
+def test_memory_tier_evicts_least_recently_used(tmp_path):
+    cache = SongCache(tmp_path, memory_bytes=song(1).nbytes * 2, disk_bytes=10**7)
+    for song_id in "abc":
+        cache.put(song_id, song(1), 1000)
+    assert list(cache.memory) == ["b", "c"]
+    assert cache.memory_size == sum(audio.nbytes for audio, _ in cache.memory.values())
+
+
+def test_disk_budget_enforced_on_put_and_startup(tmp_path):
+    cache = SongCache(tmp_path, memory_bytes=10**7, disk_bytes=10**7)
+    for song_id in "abc":
+        cache.put(song_id, song(1), 1000)
+    file_size = cache.disk["a"][1]
+    assert cache.disk_size == 3 * file_size
+
+    smaller = SongCache(tmp_path, disk_bytes=2 * file_size)
+    assert len(smaller.disk) == 2 and smaller.disk_size == 2 * file_size
+    assert len(list(tmp_path.glob("*.npy"))) == 2
+
+
+def test_put_replaces_a_song_with_another_sample_rate(tmp_path):
+    cache = SongCache(tmp_path)
+    cache.put("a", song(1), 1000)
+    cache.put("a", song(2), 2000)
+    assert [p.name for p in tmp_path.glob("*.npy")] == ["a.2000.npy"]
+    assert cache.disk_size == cache.disk["a"][1]
+    assert cache.memory_size == song(2).nbytes
+
+
+def test_concurrent_puts(tmp_path):
+    cache = SongCache(tmp_path, memory_bytes=song(1).nbytes * 4, disk_bytes=10**8)
+    threads = [threading.Thread(target=cache.put, args=(str(i), song(1, i / 10), 1000)) for i in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    stats = cache.stats()
+    assert stats["disk_songs"] == 8 and stats["memory_songs"] == 4
+    assert not list(tmp_path.glob("*.tmp"))
+    for i in range(8):
+        audio, _ = cache.get(str(i))
+        assert audio[0, 0] == np.float32(i / 10)
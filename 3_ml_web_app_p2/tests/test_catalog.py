@@ -0,0 +1,74 @@
+from pathlib import Path
+
+import pandas as pd
+import pytest
+
+from src.catalog import Catalog, normalize
+
+PAYLOAD = Path(__file__).resolve().parent.parent / "payload.csv"
+
+SONGS = [
+    ("a1", "Fats Domino - Sick and Tired"),
+    ("a2", "Beyoncé - Halo!"),
+    ("a3", "Fats Domino - Sick and Tired"),
+    ("a4", "Muddy Waters - Rollin' Stone"),
+    ("a5", "The Rolling Stones - Paint It Black"),
+    ("a6", None),
+]
+
+
+@pytest.fixture
+def catalog(tmp_path):
+    path = tmp_path / "payload.csv"
+    pd.DataFrame(SONGS, columns=["ids", "artist_song"]).to_csv(path, index=False)
+    return Catalog(path)
+
+
+def ids(result):
+    return [item["id"] for item in result["items"]]
+
+
+def test_normalize_drops_accents_case_and_punctuation():
+    assert normalize(pd.Series(["Beyoncé - Halo!", "Rollin'_Stone", None])).tolist() == ["beyonce halo", "rollin stone", ""]
+
+
+def test_empty_query_lists_everything_in_label_order(catalog):
+    result = catalog.search("")
+    assert result["total"] == len(catalog) == 6
+    assert ids(result) == ["a6", "a2", "a1", "a3", "a4", "a5"]
+
+
+def test_every_word_matches_a_word_prefix(catalog):
+    assert ids(catalog.search("roll")) == ["a4", "a5"]
+    assert ids(catalog.search("ROLL sto")) == ["a4", "a5"]
+    assert ids(catalog.search("stones roll")) == ["a5"]
+    assert ids(catalog.search("beyonce")) == ids(catalog.search("Beyoncé")) == ["a2"]
+
+
+def test_substring_when_no_word_prefix_matches(catalog):
+    assert ids(catalog.search("olling")) == ["a5"]
+    assert ids(catalog.search("ck and ti")) == ["a1", "a3"]
+    assert catalog.search("zz")["total"] == catalog.search("olling ston x")["total"] == 0
+
+
+def test_duplicate_labels_keep_their_own_ids(catalog):
+    assert catalog.rows_for("Fats Domino - Sick and Tired") == [0, 2]
+    assert catalog.label("a3") == "Fats Domino - Sick and Tired" and catalog.song("a3")["ids"] == "a3"
+
+
+def test_pages(catalog):
+    pages = [catalog.search("", page, page_size=4) for page in range(3)]
+    assert [len(page["items"]) for page in pages] == [4, 2, 0]
+    assert ids(pages[0]) + ids(pages[1]) == ids(catalog.search(""))
+
+
+def test_matches_a_full_scan_of_the_real_catalog():
+    catalog = Catalog(PAYLOAD)
+    for query in ["the", "love you", "blu", "ing bl", "domino sick", "é"]:
+        words = normalize(pd.Series([query])).iloc[0].split()
+        prefix = [row for row, text in enumerate(catalog.normalized) if all(
+            any(word.startswith(term) for word in text.split()) for term in words
+        )]
+        expected = prefix or [row for row, text in enumerate(catalog.normalized) if " ".join(words) in text]
+        result = catalog.search(query, page_size=len(catalog))
+        assert sorted(catalog.row(item["id"]) for item in result["items"]) == sorted(expected), query
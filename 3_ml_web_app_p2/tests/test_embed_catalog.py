@@ -0,0 +1,61 @@
+import numpy as np
+import pandas as pd
+from pedalboard.io import AudioFile
+
+from src.audio import CLIP_SECONDS, EMBEDDING_SAMPLE_RATE, embedding_clip, fixed_length, to_mono
+from src.embed_catalog import StubEmbedder, batched, run
+from src.similarity import EmbeddingIndex
+
+
+def tone(frequency, seconds=1.0, rate=44100):
+    return np.sin(2 * np.pi * frequency * np.arange(int(seconds * rate)) / rate).astype(np.float32)
+
+
+def test_to_mono_does_not_alias():
+    # 20 kHz is above the 16 kHz Nyquist of 32 kHz audio, so it has to be filtered out, not folded to 12 kHz
+    mono = to_mono(np.stack([tone(20_000), tone(20_000)]), 44100, 32000)
+    assert len(mono) == 32000 and mono.dtype == np.float32
+    assert np.sqrt(np.mean(mono[1000:-1000] ** 2)) < 0.01
+    kept = to_mono(tone(1000), 44100, 32000)
+    assert abs(np.sqrt(np.mean(kept[1000:-1000] ** 2)) - np.sqrt(0.5)) < 0.01
+
+
+def test_fixed_length_crops_the_centre_and_pads():
+    assert fixed_length(np.arange(10), 4).tolist() == [3, 4, 5, 6]
+    assert fixed_length(np.arange(3), 5).tolist() == [0, 1, 2, 0, 0]
+
+
+def test_embedding_clip_is_the_same_shape_for_any_song():
+    for seconds, rate in ((5, 44100), (90, 48000), (31, 32000)):
+        clip = embedding_clip(np.zeros((2, seconds * rate), dtype=np.float32), rate)
+        assert clip.shape == (CLIP_SECONDS * EMBEDDING_SAMPLE_RATE,)
+
+
+def test_batched_skips_songs_that_failed():
+    class Done:
+        def __init__(self, value=None, error=None):
+            self.value, self.error = value, error
+
+        def result(self):
+            if self.error:
+                raise self.error
+            return self.value
+
+    loaded = [((row, str(row), ""), Done((row, np.full(4, row))) if row != 2 else Done(error=OSError("404")))
+              for row in range(5)]
+    batches = list(batched(loaded, 2))
+    assert [rows.tolist() for rows, _ in batches] == [[0, 1], [3, 4]]
+    assert batches[1][1].shape == (2, 4)
+
+
+def test_run_fills_the_index_and_resumes(tmp_path):
+    audio_dir = tmp_path / "audio"
+    audio_dir.mkdir()
+    catalog = pd.DataFrame({"ids": [f"song{i}" for i in range(5)], "urls": [""] * 5})
+    for i, song_id in enumerate(catalog["ids"]):
+        with AudioFile(str(audio_dir / f"{song_id}.mp3"), "w", 44100, 2) as f:
+            f.write(np.stack([tone(200 * (i + 1), 2)] * 2))
+    index = EmbeddingIndex(tmp_path / "index")
+    assert run(catalog.iloc[:3], index, StubEmbedder(dim=16), audio_dir=audio_dir, batch_size=2, workers=2) == 3
+    assert run(catalog, index, StubEmbedder(dim=16), audio_dir=audio_dir, batch_size=2, workers=2) == 2
+    assert len(EmbeddingIndex(tmp_path / "index")) == 5
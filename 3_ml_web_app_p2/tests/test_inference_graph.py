@@ -0,0 +1,87 @@
+import asyncio
+
+import pytest
+
+from servers.inference_graph import InferenceGraph, Node
+
+
+def song_graph(calls, delay=0.05, fail=(), keep=None):
+    async def step(name, *deps):
+        calls.append(name)
+        await asyncio.sleep(delay)
+        if name in fail:
+            fail.remove(name)
+            raise RuntimeError(name)
+        return f"{name}({','.join(deps)})"
+
+    def node(name, *deps):
+        return Node(lambda *args: step(name, *args), deps)
+
+    return InferenceGraph({
+        "vocals": node("vocals", "song"),
+        "lyrics": node("lyrics", "vocals"),
+        "emotions": node("emotions", "lyrics"),
+        "embedding": node("embedding", "lyrics"),
+    }, cache_size=2, keep=keep)
+
+
+def test_runs_only_what_the_targets_need():
+    calls = []
+    results = asyncio.run(song_graph(calls).run("a", {"song": "a"}, ["lyrics"]))
+    assert results == {"lyrics": "lyrics(vocals(a))"} and calls == ["vocals", "lyrics"]
+
+
+def test_branches_overlap():
+    calls = []
+
+    async def timed():
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        results = await song_graph(calls, delay=0.2).run("a", {"song": "a"}, ["emotions", "embedding"])
+        return results, loop.time() - start
+
+    results, elapsed = asyncio.run(timed())
+    assert results["emotions"] == "emotions(lyrics(vocals(a)))" and calls.count("lyrics") == 1
+    assert elapsed < 0.75  # three steps deep, not four
+
+
+def test_requests_for_the_same_song_share_work():
+    calls = []
+    graph = song_graph(calls)
+
+    async def requests():
+        first = asyncio.gather(graph.run("a", {"song": "a"}, ["emotions"]), graph.run("a", {"song": "a"}, ["embedding"]))
+        await first
+        await graph.run("a", {"song": "a"}, ["lyrics"])
+
+    asyncio.run(requests())
+    assert sorted(calls) == ["embedding", "emotions", "lyrics", "vocals"]
+
+
+def test_failed_steps_run_again_and_old_songs_are_evicted():
+    calls = []
+    graph = song_graph(calls, fail=["lyrics"])
+
+    async def requests():
+        with pytest.raises(RuntimeError):
+            await graph.run("a", {"song": "a"}, ["lyrics"])
+        assert (await graph.run("a", {"song": "a"}, ["lyrics"]))["lyrics"] == "lyrics(vocals(a))"
+        for key in "bc":
+            await graph.run(key, {"song": key}, ["vocals"])
+
+    asyncio.run(requests())
+    assert calls == ["vocals", "lyrics", "lyrics", "vocals", "vocals"]
+    assert list(graph.cache) == ["b", "c"]
+
+
+def test_only_kept_results_stay_cached():
+    calls = []
+    graph = song_graph(calls, keep=("lyrics", "emotions"))
+
+    async def requests():
+        await graph.run("a", {"song": "a"}, ["lyrics"])
+        assert set(graph.cache["a"]) == {"lyrics"}  # neither the song nor its vocals
+        return await graph.run("a", {"song": "a"}, ["emotions"])
+
+    assert asyncio.run(requests())["emotions"] == "emotions(lyrics(vocals(a)))"
+    assert calls == ["vocals", "lyrics", "emotions"]
@@ -0,0 +1,46 @@
+import asyncio
+import time
+
+from mlserver import ModelSettings
+from mlserver.codecs import NumpyCodec, StringCodec
+from mlserver.types import InferenceRequest
+
+from benchmarks.load import APP, server_config
+from benchmarks.stubs import TARGETS, TextEmbeddingsStub
+
+
+def stub(cost_scale=1.0):
+    model = TextEmbeddingsStub(ModelSettings(
+        name="text_embedding", implementation=TextEmbeddingsStub, parameters={"extra": {"cost_scale": cost_scale}},
+    ))
+    asyncio.run(model.load())
+    return model
+
+
+def request(lyrics):
+    return InferenceRequest(inputs=[StringCodec.encode_input("lyrics", lyrics, use_bytes=False)])
+
+
+def test_stub_reports_its_simulated_work():
+    response = asyncio.run(stub(cost_scale=10).predict(request(["la"] * 5)))
+    assert NumpyCodec.decode_output(response.outputs[0]).shape == (5, 384)
+    assert response.parameters.inference_us >= 50_000
+    assert response.parameters.server_us >= response.parameters.inference_us
+
+
+def test_stub_sleeps_without_blocking_the_event_loop():
+    model = stub(cost_scale=100)
+
+    async def concurrently():
+        return await asyncio.gather(*(model.predict(request(["la", "la"])) for _ in range(4)))
+
+    start = time.perf_counter()
+    responses = asyncio.run(concurrently())
+    assert time.perf_counter() - start < 0.6  # 4 x 0.2 s if they ran one after another
+    assert all(response.parameters.inference_us == 200_000 for response in responses)
+
+
+def test_every_target_is_served_under_its_real_name():
+    for name, target in TARGETS.items():
+        _, model = server_config(APP, name, target)
+        assert model["name"] == name
@@ -0,0 +1,111 @@
+import asyncio
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+import torch
+from mlserver import ModelSettings
+from mlserver.codecs import NumpyCodec, PandasCodec
+from mlserver.types import InferenceRequest
+
+from servers.music_cls.music_cls import MusicClassifier, coverage_order, cut_windows, is_stable, resample
+
+GENRES = ["blues", "jazz", "rock"]
+
+
+@pytest.mark.parametrize("count", [1, 2, 3, 5, 8, 13])
+def test_coverage_order_visits_every_window_once(count):
+    order = coverage_order(count)
+    assert sorted(order) == list(range(count)) and order[0] == 0
+
+
+def test_coverage_order_spreads_the_first_windows():
+    assert coverage_order(8) == [0, 4, 2, 6, 1, 5, 3, 7]
+    assert coverage_order(5)[:3] == [0, 4, 2]
+
+
+def test_short_songs_are_one_padded_window():
+    windows = cut_windows(np.ones(30), window=40, max_windows=8)
+    assert windows.shape == (1, 40) and windows[0, :30].sum() == 30 and not windows[0, 30:].any()
+
+
+def test_windows_span_the_song_in_coverage_order():
+    audio = np.arange(1000, dtype=np.float32)
+    windows = cut_windows(audio, window=100, max_windows=5)
+    assert [int(window[0]) for window in windows] == [0, 900, 450, 225, 675]
+    assert cut_windows(audio, window=400, max_windows=8).shape == (3, 400)
+
+
+def test_windows_are_resampled_together():
+    windows = np.random.default_rng(0).normal(size=(3, 44100)).astype(np.float32)
+    resampled = resample(windows, 44100, 16000)
+    assert resampled.shape == (3, 16000) and resampled.dtype == np.float32
+    assert np.allclose(resampled[1], resample(windows[1:2], 44100, 16000)[0], atol=1e-5)
+    assert resample(windows, 16000, 16000) is windows
+
+
+def test_stable_once_the_top_genre_and_its_score_hold():
+    settled = [np.array([0.2, 0.7, 0.1])] * 3
+    assert not is_stable(settled[:2], windows=3, tolerance=0.05)
+    assert is_stable(settled, windows=3, tolerance=0.05)
+    assert not is_stable([np.array([0.9, 0.1, 0.0])] + settled[:2], windows=3, tolerance=0.05)
+
+
+class FakeGenrePipeline:
+    """The parts of the audio-classification pipeline the windowed path uses; rock wins on loud windows."""
+
+    dtype = torch.float32
+
+    def __init__(self):
+        self.batches = []
+        self.feature_extractor = FakeFeatureExtractor(self.batches)
+        self.model = FakeGenreModel()
+
+
+class FakeFeatureExtractor:
+    sampling_rate = 16000
+
+    def __init__(self, batches):
+        self.batches = batches
+
+    def __call__(self, windows, sampling_rate, return_tensors):
+        self.batches.append(len(windows))
+        return {"input_values": torch.tensor(np.stack(windows)), "attention_mask": torch.ones(len(windows), dtype=torch.long)}
+
+
+class FakeGenreModel:
+    config = SimpleNamespace(id2label=dict(enumerate(GENRES)))
+
+    def __call__(self, input_values, attention_mask):
+        loudness = input_values.abs().mean(dim=1)
+        return SimpleNamespace(logits=torch.stack([torch.zeros_like(loudness), 0.5 - loudness, loudness * 4], dim=1))
+
+
+@pytest.fixture
+def classifier():
+    model = MusicClassifier(ModelSettings(name="music_classifier", implementation=MusicClassifier))
+    model.model = FakeGenrePipeline()
+    model.window_seconds, model.max_windows, model.batch_size = 1, 8, 2
+    model.stable_windows, model.stable_tolerance, model.top_k = None, 0.05, 2
+    return model
+
+
+def classify(model, song, sample_rate=8000):
+    request = InferenceRequest(inputs=[
+        NumpyCodec.encode_input("song", song[None].astype(np.float32)),
+        NumpyCodec.encode_input("sample_rate", np.array([[sample_rate]])),
+    ])
+    return PandasCodec.decode_response(asyncio.run(model.predict(request)))
+
+
+def test_scores_are_averaged_over_every_window(classifier):
+    genres = classify(classifier, np.ones(8000 * 10))
+    assert classifier.model.batches == [2, 2, 2, 2]
+    assert genres["label"].tolist() == [b"rock", b"blues"]
+    assert genres["score"].is_monotonic_decreasing
+
+
+def test_stops_once_stable(classifier):
+    classifier.stable_windows = 2
+    classify(classifier, np.ones(8000 * 10))
+    assert classifier.model.batches == [2]
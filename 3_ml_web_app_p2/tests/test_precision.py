@@ -0,0 +1,104 @@
+import io
+import sys
+import types
+from pathlib import Path
+
+import pytest
+import torch
+
+# imported the way the model servers import it, so monkeypatching reaches them too
+sys.path.append(str(Path(__file__).resolve().parent.parent / "servers"))
+import precision  # noqa: E402
+
+
+class Pipeline:
+    """Stands in for a transformers pipeline: the weights live in `model`."""
+
+    def __init__(self):
+        self.model = tiny_model()
+
+
+def tiny_model():
+    torch.manual_seed(0)
+    return torch.nn.Sequential(torch.nn.Linear(8, 16), torch.nn.ReLU(), torch.nn.Linear(16, 4))
+
+
+@pytest.fixture
+def cache(tmp_path, monkeypatch):
+    monkeypatch.setattr(precision, "CACHE_DIR", tmp_path)
+    return tmp_path
+
+
+def counting(build):
+    calls = []
+
+    def _build():
+        calls.append(1)
+        return build()
+
+    return _build, calls
+
+
+def test_unknown_precision_is_rejected():
+    with pytest.raises(ValueError, match="fp16"):
+        precision.resolve("fp16")
+
+
+def test_bf16_falls_back_to_fp32_without_native_support(monkeypatch):
+    monkeypatch.setattr(precision, "cpu_has_bf16", lambda: False)
+    assert precision.resolve("bf16") == "fp32"
+    monkeypatch.setattr(precision, "cpu_has_bf16", lambda: True)
+    assert precision.resolve("bf16") == "bf16"
+
+
+def test_fp32_builds_the_published_model_and_caches_nothing(cache):
+    build, calls = counting(tiny_model)
+    model = precision.load_converted("org/tiny", "fp32", build)
+    assert isinstance(model[0], torch.nn.Linear) and calls == [1]
+    assert list(cache.iterdir()) == []
+
+
+def test_int8_is_converted_once_then_read_from_the_cache(cache):
+    build, calls = counting(tiny_model)
+    first = precision.load_converted("org/tiny", "int8", build)
+    second = precision.load_converted("org/tiny", "int8", build)
+    assert calls == [1]
+    assert [path.name.split("-torch")[0] for path in cache.iterdir()] == ["org--tiny-int8"]
+    assert isinstance(second[0], torch.ao.nn.quantized.dynamic.Linear)
+    inputs = torch.randn(3, 8)
+    assert torch.allclose(first(inputs), second(inputs))
+    assert torch.allclose(tiny_model()(inputs), second(inputs), atol=0.05)
+
+
+def test_cache_is_written_next_to_lazy_modules_that_fail_to_import(cache, monkeypatch):
+    class Lazy(types.ModuleType):
+        def __getattr__(self, name):
+            raise ModuleNotFoundError("No module named 'torchvision'")
+
+    # pickle searches sys.modules in order, so put it ahead of torch
+    monkeypatch.setattr(sys, "modules", {"lazy_vision": Lazy("lazy_vision"), **sys.modules})
+    precision.load_converted("org/tiny", "int8", tiny_model)
+    assert len(list(cache.glob("*.pt"))) == 1
+
+
+def test_pipelines_have_their_model_converted(cache, monkeypatch):
+    monkeypatch.setattr(precision, "cpu_has_bf16", lambda: True)
+    loaded = precision.load_converted("org/pipeline", "bf16", Pipeline)
+    assert isinstance(loaded, Pipeline) and loaded.model[0].weight.dtype == torch.bfloat16
+
+
+def test_weight_norm_is_baked_in_before_pickling():
+    model = torch.nn.Sequential(torch.nn.utils.parametrizations.weight_norm(torch.nn.Conv1d(2, 2, 3)))
+    inputs = torch.randn(1, 2, 10)
+    expected = model(inputs)
+    converted = precision.convert(model, "int8")
+    assert not hasattr(converted[0], "parametrizations")
+    assert torch.allclose(converted(inputs), expected)
+    torch.save(converted, io.BytesIO())
+
+
+def test_word_error_rate():
+    pytest.importorskip("sentence_transformers")
+    from benchmarks.compare_precision import word_error_rate
+    assert word_error_rate("the rain keeps falling".split(), "the rain falling down".split()) == 0.5
+    assert word_error_rate([], []) == 0
@@ -0,0 +1,101 @@
+import asyncio
+import json
+import threading
+import time
+
+import numpy as np
+import pytest
+from mlserver import MLModel, ModelSettings
+from mlserver.codecs import NumpyCodec, StringCodec
+from mlserver.types import InferenceRequest, InferenceResponse
+
+from servers.serve_all import FOLDERS, SERVERS, WARMUP, served, warmup_request
+
+
+class Recorder(MLModel):
+    """Records the threads it loads and predicts on, and every request it gets."""
+
+    async def load(self):
+        self.load_thread = threading.current_thread().name
+        self.requests, self.threads = [], set()
+        return True
+
+    async def predict(self, payload: InferenceRequest):
+        self.requests.append(payload)
+        self.threads.add(threading.current_thread().name)
+        time.sleep(0.2)  # CPU-bound work that holds its thread, like a torch forward pass
+        return InferenceResponse(model_name=self.name, outputs=[NumpyCodec.encode_output("out", np.zeros(1))])
+
+
+def model(workers, name="sentiformer"):
+    model_class = served(Recorder, workers)
+    return model_class(ModelSettings(name=name, implementation=model_class))
+
+
+def test_loads_off_the_event_loop_and_warms_up_before_ready():
+    sentiformer = model(workers=1)
+    assert asyncio.run(sentiformer.load())
+    assert sentiformer.load_thread.startswith("sentiformer")
+    [warmup] = sentiformer.requests
+    assert StringCodec.decode_input(warmup.inputs[0]) == ["warming up before the first song"]
+
+
+def test_predicts_on_its_own_worker_threads():
+    async def requests(sentiformer, count):
+        await sentiformer.load()
+        start = time.perf_counter()
+        await asyncio.gather(*(sentiformer.predict(warmup_request({"lyrics": ["la"]})) for _ in range(count)))
+        return time.perf_counter() - start
+
+    two = model(workers=2)
+    assert asyncio.run(requests(two, 4)) < 0.6  # 4 x 0.2 s on two threads, not one after another
+    assert len(two.threads) == 2 and all(name.startswith("sentiformer") for name in two.threads)
+
+
+def test_warmup_requests_encode_lists_as_strings_and_arrays_as_tensors():
+    request = warmup_request(WARMUP["music_transcriber"]())
+    assert [(tensor.name, tensor.datatype) for tensor in request.inputs] == [("song", "FP32"), ("sample_rate", "INT64")]
+    assert request.inputs[0].shape == [2, 88200]
+
+
+def test_every_model_has_a_warmup_and_workers():
+    names = {json.loads((SERVERS / folder / "model-settings.json").read_text())["name"] for folder in FOLDERS}
+    config = json.loads((SERVERS / "serve_all.json").read_text())
+    assert names == set(WARMUP) == set(config["workers"])
+    own_ports = {json.loads((SERVERS / folder / "settings.json").read_text())["grpc_port"] for folder in FOLDERS}
+    assert config["settings"]["grpc_port"] not in own_ports
+
+
+def test_models_keep_their_own_settings_and_get_their_workers():
+    pytest.importorskip("demucs")
+    pytest.importorskip("sentence_transformers")
+    from servers.serve_all import models_settings
+
+    models = {settings.name: settings for settings in models_settings({"music_splitter": 3})}
+    splitter = json.loads((SERVERS / "splitter" / "model-settings.json").read_text())
+    assert models["music_splitter"].implementation.__name__ == splitter["implementation"].rsplit(".", 1)[1]
+    assert models["music_splitter"].max_batch_size == splitter.get("max_batch_size", 0)
+
+
+def test_transcriber_warmup_reaches_whisper(monkeypatch):
+    from servers.transcriptor.asr_model import ASRServer
+
+    class FakePipe:
+        class feature_extractor:
+            sampling_rate = 16000
+
+        windows = []
+
+        def __call__(self, windows, **kwargs):
+            self.windows.extend(windows)
+            return [{"text": "", "chunks": []} for _ in windows]
+
+    async def load(self):
+        self.pipe, self.long_form, self.batch_size, self.window_seconds, self.overlap_seconds = FakePipe(), True, 4, 30, 5
+        return True
+
+    monkeypatch.setattr(ASRServer, "load", load)
+    model_class = served(ASRServer, 1)
+    transcriber = model_class(ModelSettings(name="music_transcriber", implementation=model_class))
+    assert asyncio.run(transcriber.load())
+    assert len(transcriber.pipe.windows) == 1  # not skipped by the voice detector
@@ -0,0 +1,84 @@
+import threading
+
+import numpy as np
+
+from src.similarity import EmbeddingIndex
+
+
+def vectors(count, dim=8, seed=0):
+    return np.random.default_rng(seed).normal(size=(count, dim)).astype(np.float32)
+
+
+def test_search_returns_the_closest_rows_best_first(tmp_path):
+    index = EmbeddingIndex(tmp_path)
+    data = vectors(50)
+    index.add(np.arange(50), data)
+    rows, scores = index.search(data[7] + 0.01, k=3)
+    assert rows[0] == 7 and len(rows) == 3 and np.all(np.diff(scores) <= 0)
+    rows, _ = index.similar_to(7, k=49)
+    assert 7 not in rows and len(rows) == 49
+
+
+def test_rows_survive_reopening(tmp_path):
+    data = vectors(3)
+    EmbeddingIndex(tmp_path).add([0, 2, 2000], data)
+    index = EmbeddingIndex(tmp_path)
+    assert len(index) == 3 and 2000 in index and 1 not in index
+    np.testing.assert_allclose(np.linalg.norm(index.vectors[2000]), 1, rtol=1e-6)
+
+
+def test_a_stale_instance_does_not_shrink_the_index(tmp_path):
+    ui, job = EmbeddingIndex(tmp_path), EmbeddingIndex(tmp_path)
+    ui.add(0, vectors(1, seed=1))
+    job.add(5000, vectors(1, seed=2))   # grows the files past what `ui` mapped
+    ui.add(3, vectors(1, seed=3))       # `ui` still thinks capacity is 1024
+    assert 5000 in ui and len(ui) == 3
+
+    fresh = EmbeddingIndex(tmp_path)
+    assert fresh.capacity >= 5001 and len(fresh) == 3
+    rows, _ = fresh.search(vectors(1, seed=2)[0], k=1)
+    assert rows.tolist() == [5000]
+
+
+def test_ivf_search_finds_the_same_neighbour(tmp_path):
+    index = EmbeddingIndex(tmp_path)
+    data = vectors(400, dim=16)
+    index.add(np.arange(400), data)
+    index.build_ivf(n_lists=8)
+    index.add(400, data[10])
+    rows, _ = index.search(data[10], k=2, nprobe=8)
+    assert sorted(rows.tolist()) == [10, 400]
+
+
+def test_centroids_rebuilt_by_another_instance_are_picked_up(tmp_path):
+    ui, job = EmbeddingIndex(tmp_path), EmbeddingIndex(tmp_path)
+    data = vectors(400, dim=16)
+    job.add(np.arange(400), data)
+    job.build_ivf(n_lists=8)
+    rows, _ = ui.search(data[10], k=1, nprobe=2)
+    assert ui.centroids is not None and rows.tolist() == [10]
+    (tmp_path / "centroids.npy").unlink()
+    ui.search(data[10], k=1)
+    assert ui.centroids is None
+
+
+def test_search_while_another_thread_grows_the_index(tmp_path):
+    index = EmbeddingIndex(tmp_path)
+    data = vectors(1, dim=8)
+    index.add(0, data)
+    errors = []
+
+    def grow():
+        try:
+            for row in range(1, 40):
+                index.add(row * 1024, vectors(1, seed=row))  # every add remaps the arrays
+        except Exception as error:
+            errors.append(error)
+
+    thread = threading.Thread(target=grow)
+    thread.start()
+    while thread.is_alive():
+        rows, _ = index.search(data[0], k=1)
+        assert rows.tolist() == [0]
+    thread.join()
+    assert errors == [] and len(index) == 40
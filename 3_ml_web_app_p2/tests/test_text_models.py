@@ -0,0 +1,67 @@
+import asyncio
+
+import numpy as np
+import pytest
+from mlserver import ModelSettings
+from mlserver.batching.requests import BatchedRequests
+from mlserver.codecs import NumpyCodec, PandasCodec, StringCodec
+from mlserver.types import InferenceRequest
+
+from servers.sentiment.emotions import EmotionClassifier
+
+LABELS = ["joy", "sadness", "anger"]
+
+
+class FakeEmotions:
+    """Scores each lyric by its length, the way the go_emotions pipeline shapes its output."""
+
+    def __init__(self):
+        self.batch_sizes = []
+
+    def __call__(self, lyrics, batch_size, truncation):
+        self.batch_sizes.append(batch_size)
+        return [[{"label": label, "score": len(text) / (i + 1)} for i, label in enumerate(LABELS)] for text in lyrics]
+
+
+def request(lyrics):
+    return InferenceRequest(inputs=[StringCodec.encode_input("lyrics", lyrics, use_bytes=False)])
+
+
+@pytest.fixture
+def classifier():
+    model = EmotionClassifier(ModelSettings(name="sentiformer", implementation=EmotionClassifier))
+    model.model, model.labels = FakeEmotions(), LABELS
+    return model
+
+
+def test_one_row_per_lyric(classifier):
+    response = asyncio.run(classifier.predict(request(["la", "la la la"])))
+    scores = PandasCodec.decode_response(response)
+    assert list(scores.columns) == LABELS
+    assert scores["joy"].tolist() == [2, 8] and scores["anger"].tolist() == [2 / 3, 8 / 3]
+    assert classifier.model.batch_sizes == [2]
+
+
+def test_adaptive_batch_splits_back_per_request(classifier):
+    batched = BatchedRequests({"first": request(["a"]), "second": request(["bb", "ccc"])})
+    response = asyncio.run(classifier.predict(batched.merged_request))
+    assert classifier.model.batch_sizes == [3]
+    split = batched.split_response(response)
+    assert PandasCodec.decode_response(split["first"])["joy"].tolist() == [1]
+    assert PandasCodec.decode_response(split["second"])["joy"].tolist() == [2, 3]
+
+
+def test_text_embeddings_encode_the_whole_batch():
+    pytest.importorskip("sentence_transformers")
+    from servers.text_embeddings.text_embs import TextEmbeddings
+
+    class FakeEncoder:
+        def encode(self, lyrics, batch_size, convert_to_numpy):
+            self.batch_size = batch_size
+            return np.array([[len(text), 1.0] for text in lyrics], dtype=np.float64)
+
+    model = TextEmbeddings(ModelSettings(name="text_embedding", implementation=TextEmbeddings))
+    model.model = FakeEncoder()
+    embeddings = NumpyCodec.decode_output(asyncio.run(model.predict(request(["a", "bcd"]))).outputs[0])
+    assert model.model.batch_size == 2
+    assert embeddings.dtype == np.float32 and embeddings.tolist() == [[1, 1], [3, 1]]
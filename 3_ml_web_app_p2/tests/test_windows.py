@@ -0,0 +1,52 @@
+import numpy as np
+import pytest
+
+from servers.windows import crossfade, window_starts
+
+
+@pytest.mark.parametrize("num_samples", [5, 40, 41, 65, 95, 100, 1000])
+def test_windows_cover_the_song(num_samples):
+    window, overlap = 40, 10
+    starts = window_starts(num_samples, window, overlap)
+    assert starts[0] == 0 and starts[-1] + window >= num_samples
+    assert all(b - a == window - overlap for a, b in zip(starts, starts[1:]))
+    # the last window always reaches past the overlap it shares, so the cross-fade has something to blend into
+    assert num_samples - starts[-1] > overlap or len(starts) == 1
+
+
+@pytest.mark.parametrize("num_samples", [40, 65, 100, 1003])
+def test_crossfade_of_identical_windows_restores_the_signal(num_samples):
+    window, overlap = 40, 10
+    song = np.random.default_rng(0).normal(size=(2, num_samples)).astype(np.float32)
+    windows = (song[:, start: start + window].copy() for start in window_starts(num_samples, window, overlap))
+    restored = np.concatenate(list(crossfade(windows, overlap)), axis=1)
+    assert restored.shape == song.shape
+    np.testing.assert_allclose(restored, song, atol=1e-6)
+
+
+def test_crossfade_ramps_from_one_window_into_the_next():
+    first, second = np.zeros((1, 8), dtype=np.float32), np.ones((1, 8), dtype=np.float32)
+    out = np.concatenate(list(crossfade(iter([first, second]), 4)), axis=1)
+    assert out.shape == (1, 12)
+    np.testing.assert_allclose(out[0, 4:8], [0, 1 / 3, 2 / 3, 1])
+
+
+def test_splitter_streams_windows_of_the_whole_song():
+    pytest.importorskip("demucs")
+    import torch
+    from mlserver import ModelSettings
+    from servers.splitter.split_model import SongSplitter
+
+    class HalfSeparator:
+        samplerate = 10
+
+        def separate_tensor(self, chunk):
+            stem = chunk / 4
+            return chunk, {"vocals": stem, "bass": stem, "drums": stem, "other": stem}
+
+    model = SongSplitter(ModelSettings(name="music_splitter", implementation=SongSplitter))
+    model.separator, model.pool = HalfSeparator(), None
+    model.segment_seconds, model.overlap_seconds = 4, 1
+    song = torch.randn(2, 137).numpy()
+    stems = np.concatenate(list(model.split_windows(song)), axis=1)
+    np.testing.assert_allclose(stems, np.vstack([song / 4, 3 * song / 4]), atol=1e-6)
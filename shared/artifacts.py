@@ -0,0 +1,159 @@
+from collections import OrderedDict
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Optional
+import threading
+import atexit
+import shutil
+import time
+import uuid
+import os
+import re
+
+from pedalboard.io import AudioFile
+import numpy as np
+
+
+@dataclass
+class Artifact:
+    sample_rate: int
+    nbytes: int
+    audio: Optional[np.ndarray] = None
+    spilled: Optional[Path] = None
+    export: Optional[Path] = None
+    pinned_until: float = 0.0
+
+
+class ArtifactStore:
+    """Audio per `(session_id, artifact_id)`, in memory until `memory_bytes`, then on disk until `disk_bytes`."""
+
+    def __init__(self, root="./music/artifacts", memory_bytes=256 * 2**20, disk_bytes=2 * 2**30):
+        _remove_dead(Path(root))
+        self.root = Path(root) / str(os.getpid())
+        self.root.mkdir(parents=True, exist_ok=True)
+        atexit.register(shutil.rmtree, self.root, True)  # nothing in here outlives the sessions that made it
+        self.memory_bytes, self.disk_bytes = memory_bytes, disk_bytes
+        self.artifacts = OrderedDict()
+        self.latest_ids = {}
+        self.memory_size = self.disk_size = 0
+        self._lock = threading.Lock()
+
+    def put(self, session_id: str, audio: np.ndarray, sample_rate: int) -> str:
+        _check(session_id)
+        audio = np.ascontiguousarray(np.atleast_2d(audio), dtype=np.float32)
+        artifact_id = uuid.uuid4().hex
+        with self._lock:
+            self.artifacts[session_id, artifact_id] = Artifact(int(sample_rate), audio.nbytes, audio=audio)
+            self.latest_ids[session_id] = artifact_id
+            self.memory_size += audio.nbytes
+            self._spill()
+        return artifact_id
+
+    def get(self, session_id: str, artifact_id: str):
+        with self._lock:
+            artifact = self.artifacts[session_id, artifact_id]
+            self.artifacts.move_to_end((session_id, artifact_id))
+            audio = artifact.audio if artifact.audio is not None else np.load(artifact.spilled, mmap_mode="r")
+            return audio, artifact.sample_rate
+
+    def latest(self, session_id: str) -> Optional[str]:
+        with self._lock:
+            artifact_id = self.latest_ids.get(session_id)
+            return artifact_id if (session_id, artifact_id) in self.artifacts else None
+
+    def export(self, session_id: str, artifact_id: str, keep: float = 0.0) -> str:
+        """Path of the artifact as an MP3, kept on disk for at least `keep` seconds."""
+        audio, sample_rate = self.get(session_id, artifact_id)
+        with self._lock:
+            artifact = self.artifacts[session_id, artifact_id]
+            artifact.pinned_until = max(artifact.pinned_until, time.monotonic() + keep)
+            if artifact.export is not None and artifact.export.exists():
+                return str(artifact.export)
+        path = self._folder(session_id) / f"{artifact_id}.mp3"
+        with AudioFile(str(path), "w", samplerate=sample_rate, num_channels=audio.shape[0]) as f:
+            f.write(audio)
+        with self._lock:
+            if artifact.export is None:
+                artifact.export = path
+                self.disk_size += path.stat().st_size
+            self._evict_disk(keep=(session_id, artifact_id))
+        return str(path)
+
+    def drop_session(self, session_id: str):
+        _check(session_id)
+        with self._lock:
+            for key in [key for key in self.artifacts if key[0] == session_id]:
+                self._delete(key)
+            self.latest_ids.pop(session_id, None)
+        shutil.rmtree(self.root / session_id, ignore_errors=True)
+
+    def _folder(self, session_id) -> Path:
+        folder = self.root / session_id
+        if folder.resolve().parent != self.root.resolve():
+            raise ValueError(f"Session id {session_id!r} leaves the store's folder")
+        folder.mkdir(exist_ok=True)
+        return folder
+
+    def _spill(self):
+        for key, artifact in list(self.artifacts.items())[:-1]:
+            if self.memory_size <= self.memory_bytes:
+                break
+            if artifact.audio is None:
+                continue
+            path = self._folder(key[0]) / f"{key[1]}.npy"
+            np.save(path, artifact.audio)
+            artifact.audio, artifact.spilled = None, path
+            self.memory_size -= artifact.nbytes
+            self.disk_size += path.stat().st_size
+        self._evict_disk(keep=next(reversed(self.artifacts)))
+
+    def _evict_disk(self, keep):
+        now = time.monotonic()
+        for key in list(self.artifacts):
+            if self.disk_size <= self.disk_bytes:
+                break
+            if key == keep or self.artifacts[key].pinned_until > now:
+                continue
+            artifact = self.artifacts[key]
+            if artifact.spilled is not None:
+                self._delete(key)
+            elif artifact.export is not None:
+                self.disk_size -= _remove(artifact.export)
+                artifact.export = None
+
+    def _delete(self, key):
+        artifact = self.artifacts.pop(key)
+        if artifact.audio is not None:
+            self.memory_size -= artifact.nbytes
+        for path in (artifact.spilled, artifact.export):
+            if path is not None:
+                self.disk_size -= _remove(path)
+
+
+def _check(session_id: str):
+    # session ids come from the client and end up in paths
+    if not re.fullmatch(r"[A-Za-z0-9_-]+", session_id):
+        raise ValueError(f"Invalid session id {session_id!r}")
+
+
+def _remove(path: Path) -> int:
+    size = path.stat().st_size if path.exists() else 0
+    path.unlink(missing_ok=True)
+    return size
+
+
+def _remove_dead(root: Path):
+    # folders left by processes that did not exit cleanly
+    for folder in root.glob("*"):
+        if folder.name.isdigit() and not _running(int(folder.name)):
+            shutil.rmtree(folder, ignore_errors=True)
+
+
+def _running(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
@@ -0,0 +1,137 @@
+from types import SimpleNamespace
+import asyncio
+import struct
+import weakref
+
+import numpy as np
+
+
+DATATYPES = {
+    "BOOL": np.bool_, "UINT8": np.uint8, "UINT16": np.uint16, "UINT32": np.uint32, "UINT64": np.uint64,
+    "INT8": np.int8, "INT16": np.int16, "INT32": np.int32, "INT64": np.int64,
+    "FP16": np.float16, "FP32": np.float32, "FP64": np.float64,
+}
+GRPC_CONTENTS = {
+    "BOOL": "bool_contents", "UINT8": "uint_contents", "UINT16": "uint_contents", "UINT32": "uint_contents",
+    "UINT64": "uint64_contents", "INT8": "int_contents", "INT16": "int_contents", "INT32": "int_contents",
+    "INT64": "int64_contents", "FP32": "fp32_contents", "FP64": "fp64_contents", "BYTES": "bytes_contents",
+}
+SERVICE = "/inference.GRPCInferenceService/"
+CHANNEL_OPTIONS = [("grpc.max_send_message_length", -1), ("grpc.max_receive_message_length", -1)]
+
+
+def dataplane():
+    """The V2 inference protos, from mlserver or else from `tritonclient[grpc]`."""
+    try:
+        from mlserver.grpc import dataplane_pb2
+        return dataplane_pb2
+    except ImportError:
+        from tritonclient.grpc import service_pb2
+        return service_pb2
+
+
+def to_datatype(dtype: np.dtype) -> str:
+    for name, np_type in DATATYPES.items():
+        if np.dtype(np_type) == dtype:
+            return name
+    raise ValueError(f"Unsupported dtype {dtype}")
+
+
+def encode_tensor(payload):
+    """Returns `(datatype, shape, raw little-endian bytes)` for an array or a list of strings."""
+    if isinstance(payload, (list, tuple)) and payload and isinstance(payload[0], (str, bytes)):
+        items = [p.encode() if isinstance(p, str) else p for p in payload]
+        raw = b"".join(struct.pack("<I", len(item)) + item for item in items)
+        return "BYTES", [len(items)], raw
+    array = np.asarray(payload)
+    array = array.astype(array.dtype.newbyteorder("<"), copy=False)
+    return to_datatype(array.dtype), list(array.shape), np.ascontiguousarray(array).tobytes()
+
+
+def decode_tensor(datatype: str, shape, raw) -> np.ndarray:
+    if datatype == "BYTES":
+        items, offset = [], 0
+        while offset < len(raw):
+            (length,) = struct.unpack_from("<I", raw, offset)
+            items.append(bytes(raw[offset + 4: offset + 4 + length]).decode())
+            offset += 4 + length
+        return np.array(items, dtype=object).reshape(shape)
+    return np.frombuffer(raw, dtype=np.dtype(DATATYPES[datatype]).newbyteorder("<")).reshape(shape)
+
+
+def inference_stub(channel):
+    """`ModelInfer` and `ModelStreamInfer` on a sync or `grpc.aio` channel, as MLServer serves them."""
+    pb = dataplane()
+    codec = {"request_serializer": pb.ModelInferRequest.SerializeToString,
+             "response_deserializer": pb.ModelInferResponse.FromString}
+    return SimpleNamespace(
+        ModelInfer=channel.unary_unary(SERVICE + "ModelInfer", **codec),
+        # MLServer streams plain `ModelInferResponse`s, not Triton's wrapped stream responses
+        ModelStreamInfer=channel.stream_stream(SERVICE + "ModelStreamInfer", **codec),
+    )
+
+
+class TensorClient:
+    """Sends tensors to an MLServer model over gRPC as raw bytes; `ainfer` for event-loop callers."""
+
+    def __init__(self, host="localhost", grpc_port=8081, timeout=None, max_concurrency=4):
+        self.host, self.grpc_port = host, grpc_port
+        self.timeout = timeout
+        self.max_concurrency = max_concurrency
+        self._stub = None
+        self._per_loop = weakref.WeakKeyDictionary()
+
+    def infer(self, model_name: str, **inputs) -> list:
+        response = self.stub().ModelInfer(self.build_grpc_request(model_name, inputs), timeout=self.timeout)
+        return self.parse_grpc_response(response)
+
+    def infer_stream(self, model_name: str, **inputs):
+        """Yields the outputs of every response a streaming model (`predict_stream`) sends back."""
+        request = self.build_grpc_request(model_name, inputs)
+        for response in self.stub().ModelStreamInfer(iter([request]), timeout=self.timeout):
+            yield self.parse_grpc_response(response)
+
+    async def ainfer(self, model_name: str, **inputs) -> list:
+        loop = asyncio.get_running_loop()
+        if loop not in self._per_loop:
+            import grpc.aio
+            self._per_loop[loop] = self.stub(grpc.aio.insecure_channel), asyncio.Semaphore(self.max_concurrency)
+        stub, semaphore = self._per_loop[loop]
+        async with semaphore:
+            response = await stub.ModelInfer(
+                self.build_grpc_request(model_name, inputs), timeout=self.timeout
+            )
+        return self.parse_grpc_response(response)
+
+    def stub(self, make_channel=None):
+        """The client's own blocking stub, or a new one on `make_channel` (e.g. `grpc.aio.insecure_channel`)."""
+        import grpc
+        if make_channel is not None:
+            return inference_stub(make_channel(f"{self.host}:{self.grpc_port}", options=CHANNEL_OPTIONS))
+        if self._stub is None:
+            self._stub = inference_stub(grpc.insecure_channel(f"{self.host}:{self.grpc_port}", options=CHANNEL_OPTIONS))
+        return self._stub
+
+    @staticmethod
+    def build_grpc_request(model_name, inputs: dict):
+        request = dataplane().ModelInferRequest(model_name=model_name)
+        for name, payload in inputs.items():
+            datatype, shape, raw = encode_tensor(payload)
+            tensor = request.inputs.add(name=name, datatype=datatype, shape=shape)
+            tensor.parameters["content_type"].string_param = "str" if datatype == "BYTES" else "np"
+            request.raw_input_contents.append(raw)
+        return request
+
+    @staticmethod
+    def parse_grpc_response(response) -> list:
+        outputs = []
+        for idx, out in enumerate(response.outputs):
+            if response.raw_output_contents:
+                outputs.append(decode_tensor(out.datatype, list(out.shape), response.raw_output_contents[idx]))
+            else:
+                data = list(getattr(out.contents, GRPC_CONTENTS[out.datatype]))
+                if out.datatype == "BYTES":
+                    outputs.append(np.array([d.decode() for d in data], dtype=object).reshape(list(out.shape)))
+                else:
+                    outputs.append(np.asarray(data, dtype=DATATYPES[out.datatype]).reshape(list(out.shape)))
+        return outputs
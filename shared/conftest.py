@@ -0,0 +1,5 @@
+import sys
+from pathlib import Path
+
+# the tests import the package as `shared`, the way the apps do
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
@@ -0,0 +1,159 @@
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Callable, Hashable, Optional
+import threading
+import logging
+import time
+import uuid
+
+logger = logging.getLogger(__name__)
+
+RUNNING = ("queued", "running")
+
+
+class Cancelled(Exception):
+    """Raised inside a job once every session waiting on it has cancelled."""
+
+
+@dataclass
+class Job:
+    id: str
+    key: Hashable
+    state: str = "queued"  # queued, running, done, failed or cancelled
+    done: int = 0
+    total: Optional[int] = None
+    message: str = ""
+    outputs: list = field(default_factory=list)  # partial results, for jobs that produce them in chunks
+    result: Any = None
+    error: Optional[BaseException] = None
+    callers: set = field(default_factory=set)    # sessions waiting on the job
+    withdrawn: set = field(default_factory=set)  # sessions that cancelled it, and get nothing more from it
+    cancelled: bool = False
+    finished: Optional[float] = None
+    future: Any = None
+
+
+class Progress:
+    """What a job's function gets to report through. Both calls raise `Cancelled` once the job is cancelled."""
+
+    def __init__(self, job: Job, lock: threading.Lock):
+        self.job, self._lock = job, lock
+
+    def __call__(self, done: int, total: Optional[int] = None, message: Optional[str] = None):
+        with self._lock:
+            self.job.done = done
+            self.job.total = total if total is not None else self.job.total
+            self.job.message = message if message is not None else self.job.message
+        self.check()
+
+    def output(self, chunk):
+        with self._lock:
+            self.job.outputs.append(chunk)
+        self.check()
+
+    def check(self):
+        if self.job.cancelled:
+            raise Cancelled(self.job.id)
+
+
+class JobQueue:
+    """Runs `fn(progress, *args)` on `workers` threads, one job per `key` shared by every session."""
+
+    def __init__(self, workers=2, ttl=600, reuse=False):
+        self.ttl, self.reuse = ttl, reuse
+        self.jobs = {}
+        self.in_flight = {}
+        self.done = {}
+        self._pool = ThreadPoolExecutor(workers, thread_name_prefix="job")
+        self._lock = threading.Lock()
+
+    def submit(self, key: Hashable, fn: Callable, *args, session: Hashable = None, **kwargs) -> str:
+        with self._lock:
+            self._expire()
+            job = self.in_flight.get(key) or self.done.get(key)
+            if job is not None:
+                job.callers.add(session)
+                job.withdrawn.discard(session)
+                return job.id
+            job = Job(uuid.uuid4().hex, key, callers={session})
+            self.jobs[job.id] = self.in_flight[key] = job
+            job.future = self._pool.submit(self._run, job, fn, args, kwargs)
+        return job.id
+
+    def poll(self, job_id: str, session: Hashable = None, since: int = 0) -> dict:
+        """The job's state as `session` sees it, and its outputs from `since` on."""
+        with self._lock:
+            self._expire()
+            job = self.jobs[job_id]
+            state = _state(job, session)
+            return {
+                "id": job.id, "state": state, "done": job.done, "total": job.total,
+                "progress": job.done / job.total if job.total else None, "message": job.message,
+                "error": None if job.error is None else str(job.error),
+                "outputs": [] if state == "cancelled" else job.outputs[since:],
+            }
+
+    def result(self, job_id: str, session: Hashable = None):
+        """What the job returned; re-raises its exception if it failed."""
+        with self._lock:
+            job = self.jobs[job_id]
+            state = _state(job, session)
+        if state == "failed":
+            raise job.error
+        if state != "done":
+            raise RuntimeError(f"Job {job_id} is {state}")
+        return job.result
+
+    def cancel(self, job_id: str, session: Hashable = None) -> bool:
+        """Withdraws `session` from the job; returns whether that cancelled the job itself."""
+        with self._lock:
+            job = self.jobs.get(job_id)
+            if job is None or job.state not in RUNNING or session not in job.callers:
+                return False
+            job.callers.remove(session)
+            job.withdrawn.add(session)
+            if job.callers:
+                return False
+            job.cancelled = True
+            self.in_flight.pop(job.key, None)
+            if job.future.cancel():
+                self._finish(job, "cancelled")
+            return True
+
+    def _run(self, job: Job, fn: Callable, args: tuple, kwargs: dict):
+        with self._lock:
+            if job.cancelled:
+                return
+            job.state = "running"
+        try:
+            result = fn(Progress(job, self._lock), *args, **kwargs)
+        except Cancelled:
+            with self._lock:
+                self._finish(job, "cancelled")
+        except Exception as error:
+            logger.exception("job %s failed", job.key)
+            with self._lock:
+                job.error = error
+                self._finish(job, "failed")
+        else:
+            with self._lock:
+                job.result = result
+                self._finish(job, "done")
+
+    def _finish(self, job: Job, state: str):
+        job.state, job.finished = state, time.monotonic()
+        if self.in_flight.get(job.key) is job:
+            del self.in_flight[job.key]
+        if state == "done" and self.reuse:
+            self.done[job.key] = job
+
+    def _expire(self):
+        now = time.monotonic()
+        for job_id in [job.id for job in self.jobs.values() if job.finished is not None and now - job.finished > self.ttl]:
+            job = self.jobs.pop(job_id)
+            if self.done.get(job.key) is job:
+                del self.done[job.key]
+
+
+def _state(job: Job, session: Hashable) -> str:
+    return "cancelled" if session in job.withdrawn else job.state
@@ -0,0 +1,239 @@
+"""Load test of an app's model servers against stub models, driven by the app's `benchmarks/load.py`."""
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Callable, NamedTuple, Optional
+import subprocess
+import tempfile
+import argparse
+import asyncio
+import socket
+import json
+import time
+import os
+
+from mlserver import MLModel
+from mlserver.types import InferenceRequest, InferenceResponse, Parameters
+import numpy as np
+import requests
+
+from shared.client import TensorClient
+
+_inference_seconds = ContextVar("inference_seconds", default=0.0)
+
+
+class Target(NamedTuple):
+    stub: type
+    payload: Callable          # size -> inputs for TensorClient
+    size: str                  # what the size means: "seconds", "tokens" or "batch"
+    folder: Optional[str] = None  # servers/<folder> settings to reuse
+    settings: dict = {}        # used when the server has no settings files
+
+
+class StubModel(MLModel):
+    """Base for the stubs: `stub` has the real model's signature and awaits `busy` for its work."""
+
+    async def load(self):
+        extra = (self.settings.parameters.extra if self.settings.parameters else None) or {}
+        self.cost_scale = extra.get("cost_scale", 1.0)
+        return True
+
+    async def busy(self, seconds: float):
+        seconds *= self.cost_scale
+        await asyncio.sleep(seconds)
+        _inference_seconds.set(_inference_seconds.get() + seconds)
+
+    async def predict(self, payload: InferenceRequest) -> InferenceResponse:
+        token = _inference_seconds.set(0.0)
+        start = time.perf_counter()
+        response = await self.stub(payload)
+        response.parameters = Parameters(
+            server_us=int((time.perf_counter() - start) * 1e6), inference_us=int(_inference_seconds.get() * 1e6),
+        )
+        _inference_seconds.reset(token)
+        return response
+
+
+def free_ports(count):
+    sockets = [socket.socket() for _ in range(count)]
+    for sock in sockets:
+        sock.bind(("localhost", 0))
+    ports = [sock.getsockname()[1] for sock in sockets]
+    for sock in sockets:
+        sock.close()
+    return ports
+
+
+def server_config(app: Path, name: str, target: Target):
+    if target.folder is None:
+        return dict(target.settings), {"name": name}
+    folder = app / "servers" / target.folder
+    return json.loads((folder / "settings.json").read_text()), json.loads((folder / "model-settings.json").read_text())
+
+
+def start_server(
+    app: Path, name: str, target: Target, cost_scale: float, folder: Path, parallel_workers=0, timeout=120,
+):
+    """`mlserver start` on a copy of the server's settings with the stub as implementation."""
+    settings, model = server_config(app, name, target)
+    ports = free_ports(3)
+    settings.update(http_port=ports[0], grpc_port=ports[1], metrics_port=ports[2])
+    if parallel_workers is not None:
+        settings["parallel_workers"] = parallel_workers
+    parameters = model.get("parameters") or {}
+    parameters["extra"] = {**(parameters.get("extra") or {}), "cost_scale": cost_scale}
+    model.update(implementation=f"{target.stub.__module__}.{target.stub.__name__}", parameters=parameters)
+    folder.mkdir(parents=True, exist_ok=True)
+    (folder / "settings.json").write_text(json.dumps(settings))
+    (folder / "model-settings.json").write_text(json.dumps(model))
+
+    log = open(folder / "server.log", "wb")
+    env = {**os.environ, "PYTHONPATH": os.pathsep.join(filter(None, [str(app), os.environ.get("PYTHONPATH")]))}
+    process = subprocess.Popen(
+        ["mlserver", "start", str(folder)], stdout=log, stderr=subprocess.STDOUT, env=env, cwd=folder,
+    )
+    deadline = time.time() + timeout
+    while time.time() < deadline and process.poll() is None:
+        try:
+            if requests.get(f"http://localhost:{ports[0]}/v2/models/{model['name']}/ready", timeout=5).status_code == 200:
+                return process, ports
+        except requests.RequestException:
+            pass
+        time.sleep(0.2)
+    stop_server(process)
+    raise RuntimeError(f"stub server for {name} did not become ready, see {folder / 'server.log'}")
+
+
+def stop_server(process):
+    process.terminate()
+    try:
+        process.wait(15)
+    except subprocess.TimeoutExpired:
+        process.kill()
+
+
+async def drive(client: TensorClient, model_name, inputs, concurrency, total):
+    import grpc.aio
+    stub = client.stub(grpc.aio.insecure_channel)
+    samples, remaining = [], [total]
+
+    async def one():
+        start = time.perf_counter()
+        request = client.build_grpc_request(model_name, inputs)
+        encoded = time.perf_counter()
+        response = await stub.ModelInfer(request)
+        answered = time.perf_counter()
+        client.parse_grpc_response(response)
+        done = time.perf_counter()
+        server = response.parameters["server_us"].int64_param / 1e6
+        samples.append({
+            "latency": done - start, "encode": encoded - start, "decode": done - answered,
+            "inference": response.parameters["inference_us"].int64_param / 1e6,
+            "server_codec": server - response.parameters["inference_us"].int64_param / 1e6,
+            "transport": answered - encoded - server,
+        })
+
+    async def worker():
+        while remaining[0] > 0:
+            remaining[0] -= 1
+            await one()
+
+    await one()  # warm up the channel and the model
+    samples.clear()
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return samples, time.perf_counter() - start
+
+
+def summarize(samples, wall):
+    latency = np.array([sample["latency"] for sample in samples]) * 1000
+    summary = {
+        "requests": len(samples), "throughput_rps": len(samples) / wall,
+        "p50_ms": float(np.percentile(latency, 50)), "p95_ms": float(np.percentile(latency, 95)),
+        "p99_ms": float(np.percentile(latency, 99)),
+    }
+    for key in ("encode", "decode", "inference", "server_codec", "transport"):
+        summary[f"{key}_ms"] = float(np.mean([sample[key] for sample in samples]) * 1000)
+    return summary
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True).stdout.strip()
+    except OSError:
+        return "unknown"
+
+
+def compare(results, baseline_path):
+    baseline = {
+        (row["target"], row["size"], row["concurrency"]): row for row in json.loads(Path(baseline_path).read_text())["results"]
+    }
+    print(f"\nagainst {baseline_path}")
+    print(f"{'target':>18} {'size':>6} {'conc':>5} {'p50':>8} {'p95':>8} {'rps':>8}")
+    for row in results:
+        old = baseline.get((row["target"], row["size"], row["concurrency"]))
+        if old is None:
+            continue
+        change = {key: row[key] / old[key] - 1 for key in ("p50_ms", "p95_ms", "throughput_rps")}
+        print(
+            f"{row['target']:>18} {row['size']:>6} {row['concurrency']:>5} {change['p50_ms']:>+8.1%} "
+            f"{change['p95_ms']:>+8.1%} {change['throughput_rps']:>+8.1%}"
+        )
+
+
+def main(args, targets: dict, app: Path):
+    """Runs `targets`, the app's stubs by name, as `args` from `parser()` ask."""
+    sizes = {"seconds": args.seconds, "tokens": args.tokens, "batch": args.batch_sizes}
+    results = []
+    print(
+        f"{'target':>18} {'size':>6} {'conc':>5} {'rps':>7} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} "
+        f"{'enc':>6} {'dec':>6} {'infer':>7} {'codec':>6} {'wire':>7}"
+    )
+    workdir = tempfile.mkdtemp(prefix="load-")
+    for name in args.targets or list(targets):
+        target = targets[name]
+        process, ports = start_server(app, name, target, args.cost_scale, Path(workdir) / name, args.parallel_workers)
+        client = TensorClient(grpc_port=ports[1])
+        model_name = server_config(app, name, target)[1]["name"]
+        try:
+            for size in sizes[target.size]:
+                inputs = target.payload(size)
+                for concurrency in args.concurrency:
+                    samples, wall = asyncio.run(drive(client, model_name, inputs, concurrency, args.requests))
+                    row = {"target": name, "size": size, "size_unit": target.size, "concurrency": concurrency}
+                    row.update(summarize(samples, wall))
+                    results.append(row)
+                    print(
+                        f"{name:>18} {size:>6} {concurrency:>5} {row['throughput_rps']:>7.1f} {row['p50_ms']:>8.1f} "
+                        f"{row['p95_ms']:>8.1f} {row['p99_ms']:>8.1f} {row['encode_ms']:>6.1f} {row['decode_ms']:>6.1f} "
+                        f"{row['inference_ms']:>7.1f} {row['server_codec_ms']:>6.1f} {row['transport_ms']:>7.1f}"
+                    )
+        finally:
+            stop_server(process)
+
+    results_dir = app / "benchmarks" / "results"
+    results_dir.mkdir(exist_ok=True)
+    created = datetime.now(timezone.utc)
+    path = results_dir / f"{created:%Y%m%dT%H%M%S}-{git_commit()}.json"
+    path.write_text(json.dumps({
+        "commit": git_commit(), "created": created.isoformat(), "args": vars(args), "results": results,
+    }, indent=2))
+    print(f"\nsaved {path}")
+    if args.compare:
+        compare(results, args.compare)
+
+
+def parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--targets", nargs="+", default=None, help="names from benchmarks/stubs.py, all by default")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16])
+    parser.add_argument("--requests", type=int, default=50, help="requests per target, size and concurrency")
+    parser.add_argument("--seconds", type=int, nargs="+", default=[10, 60, 180], help="song lengths for audio models")
+    parser.add_argument("--tokens", type=int, nargs="+", default=[100, 500], help="new tokens for generative models")
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 8, 32], help="lyrics per request for text models")
+    parser.add_argument("--cost-scale", type=float, default=1.0, help="multiplies every stub's simulated cost, 0 for none")
+    parser.add_argument(
+        "--parallel-workers", type=int, default=0, help="every server's parallel_workers, 0 runs the stubs in the server process",
+    )
+    parser.add_argument("--compare", default=None, help="earlier results file to print the change against")
+    return parser
@@ -0,0 +1,95 @@
+"""Per-stage latency histograms and input-size gauges for any `MLModel`."""
+from functools import wraps
+from time import perf_counter
+from typing import Callable
+
+from mlserver.codecs.decorator import SignatureCodec
+from prometheus_client import Gauge, Histogram
+
+LABELS = ["model_name", "model_version"]
+BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+_metrics = {}
+
+
+def _metric(kind, name, documentation, labels):
+    # one metric per process, however many models or timers share it
+    if name not in _metrics:
+        extra = {"buckets": BUCKETS} if kind is Histogram else {"multiprocess_mode": "mostrecent"}
+        _metrics[name] = kind(name, documentation, LABELS + labels, **extra)
+    return _metrics[name]
+
+
+class _Stage:
+    __slots__ = ("histogram", "start")
+
+    def __init__(self, histogram):
+        self.histogram = histogram
+
+    def __enter__(self):
+        self.start = perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(perf_counter() - self.start)
+
+
+class StageTimer:
+    def __init__(self, model_name: str, model_version: str = ""):
+        labels = (model_name, model_version or "")
+        self._stages = _metric(Histogram, "model_stage_seconds", "Time spent in each stage of predict", ["stage"])
+        self._sizes = _metric(Gauge, "model_input_size", "Last dimension of array inputs, length of list inputs", ["input"])
+        self._labels = labels
+        self._children, self._gauges = {}, {}
+
+    def stage(self, name: str) -> _Stage:
+        # label lookups cost more than the observation itself, so children are cached
+        histogram = self._children.get(name)
+        if histogram is None:
+            histogram = self._children[name] = self._stages.labels(*self._labels, name)
+        return _Stage(histogram)
+
+    def observe(self, name: str, seconds: float):
+        self.stage(name).histogram.observe(seconds)
+
+    def sizes(self, **inputs):
+        for name, value in inputs.items():
+            size = _size(value)
+            if size is None:
+                continue
+            gauge = self._gauges.get(name)
+            if gauge is None:
+                gauge = self._gauges[name] = self._sizes.labels(*self._labels, name)
+            gauge.set(size)
+
+
+def _size(value):
+    shape = getattr(value, "shape", None)
+    if shape is not None:
+        return shape[-1] if len(shape) else 1
+    return len(value) if hasattr(value, "__len__") else None
+
+
+def stage_timer(model) -> StageTimer:
+    timer = getattr(model, "_stage_timer", None)
+    if timer is None:
+        timer = model._stage_timer = StageTimer(model.name, model.version)
+    return timer
+
+
+def timed_args(predict: Callable):
+    """`decode_args` that also times decoding, the body and encoding, and records input sizes."""
+    codec = SignatureCodec(predict)
+
+    @wraps(predict)
+    async def _f(self, request):
+        timer = stage_timer(self)
+        with timer.stage("decode"):
+            inputs = codec.decode_request(request=request)
+        timer.sizes(**inputs)
+        with timer.stage("predict"):
+            outputs = await predict(self, **inputs)
+        with timer.stage("encode"):
+            return codec.encode_response(model_name=self.name, payload=outputs, model_version=self.version)
+
+    return _f
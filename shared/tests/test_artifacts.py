@@ -0,0 +1,86 @@
+from pathlib import Path
+import os
+import subprocess
+import sys
+
+import numpy as np
+import pytest
+
+from shared.artifacts import ArtifactStore
+
+
+def audio(seconds=1, rate=32000, value=0.1):
+    return np.full((2, seconds * rate), value, dtype=np.float32)
+
+
+def test_spills_to_disk_and_reads_back(tmp_path):
+    store = ArtifactStore(tmp_path, memory_bytes=audio().nbytes, disk_bytes=10**7)
+    first = store.put("session", audio(value=0.1), 32000)
+    store.put("session", audio(value=0.2), 32000)
+    assert store.memory_size == audio().nbytes
+    spilled, rate = store.get("session", first)
+    assert isinstance(spilled, np.memmap) and rate == 32000 and spilled[0, 0] == np.float32(0.1)
+
+
+def test_latest_and_drop_session(tmp_path):
+    store = ArtifactStore(tmp_path, memory_bytes=0)
+    store.put("alice", audio(), 32000)
+    latest = store.put("alice", audio(value=0.3), 32000)
+    bob = store.put("bob", audio(), 32000)
+    assert store.latest("alice") == latest and store.latest("carol") is None
+    store.export("alice", latest)
+    store.drop_session("alice")
+    assert store.latest("alice") is None and list(store.artifacts) == [("bob", bob)]
+    assert not (store.root / "alice").exists() and store.memory_size == audio().nbytes
+
+
+def test_export_encodes_once(tmp_path):
+    store = ArtifactStore(tmp_path)
+    artifact_id = store.put("session", audio(), 32000)
+    path = store.export("session", artifact_id)
+    assert path.endswith(".mp3") and os.path.exists(path)
+    assert store.export("session", artifact_id) == path
+    assert store.disk_size == os.path.getsize(path)
+
+
+def test_disk_budget_deletes_least_recently_used(tmp_path):
+    store = ArtifactStore(tmp_path, memory_bytes=0, disk_bytes=int(audio().nbytes * 2.5))
+    ids = [store.put("session", audio(value=i / 10), 32000) for i in range(4)]
+    # the newest stays in memory, two spilled ones fit on disk
+    assert [key[1] for key in store.artifacts] == ids[-3:]
+    assert store.disk_size <= store.disk_bytes
+
+
+def test_another_process_does_not_wipe_this_ones_files(tmp_path):
+    store = ArtifactStore(tmp_path)
+    path = store.export("session", store.put("session", audio(), 32000))
+    code = f"from shared.artifacts import ArtifactStore; s = ArtifactStore({str(tmp_path)!r}); s.export('session', s.put('session', __import__('numpy').zeros((1, 100), 'float32'), 32000))"
+    subprocess.run([sys.executable, "-c", code], check=True, cwd=Path(__file__).parents[2])
+    assert os.path.exists(path)
+    assert [folder.name for folder in tmp_path.iterdir()] == [str(os.getpid())]  # the other one cleaned up on exit
+
+
+def test_folders_of_dead_processes_are_removed(tmp_path):
+    dead = subprocess.run([sys.executable, "-c", "import os; print(os.getpid())"], capture_output=True, text=True)
+    (tmp_path / dead.stdout.strip() / "session").mkdir(parents=True)
+    (tmp_path / "not-a-pid").mkdir()
+    ArtifactStore(tmp_path)
+    assert sorted(folder.name for folder in tmp_path.iterdir()) == sorted([str(os.getpid()), "not-a-pid"])
+
+
+def test_pinned_exports_outlive_the_disk_budget(tmp_path):
+    store = ArtifactStore(tmp_path, disk_bytes=1)
+    pinned = store.export("session", store.put("session", audio(value=0.1), 32000), keep=600)
+    unpinned = store.export("session", store.put("session", audio(value=0.2), 32000))
+    store.export("session", store.put("session", audio(value=0.3), 32000))
+    assert os.path.exists(pinned) and not os.path.exists(unpinned)
+
+
+@pytest.mark.parametrize("session_id", ["..", "../other", "a/b", "", "/tmp"])
+def test_session_ids_cannot_name_paths_outside_the_store(tmp_path, session_id):
+    store = ArtifactStore(tmp_path)
+    with pytest.raises(ValueError):
+        store.put(session_id, audio(), 32000)
+    with pytest.raises(ValueError):
+        store.drop_session(session_id)
+    assert tmp_path.exists() and store.root.exists()
@@ -0,0 +1,90 @@
+import asyncio
+from concurrent import futures
+
+import grpc
+import numpy as np
+import pytest
+
+from shared.client import CHANNEL_OPTIONS, TensorClient, dataplane, decode_tensor, encode_tensor
+
+
+def echo(request):
+    """A response holding the request's first input."""
+    inp = request.inputs[0]
+    response = dataplane().ModelInferResponse(model_name=request.model_name)
+    response.outputs.add(name="output-0", datatype=inp.datatype, shape=inp.shape)
+    response.raw_output_contents.append(request.raw_input_contents[0])
+    return response
+
+
+def stream(requests, context):
+    request = next(requests)
+    for _ in range(3):
+        yield echo(request)
+
+
+@pytest.fixture
+def port():
+    pb = dataplane()
+    codec = {"request_deserializer": pb.ModelInferRequest.FromString,
+             "response_serializer": pb.ModelInferResponse.SerializeToString}
+    server = grpc.server(futures.ThreadPoolExecutor(2), options=CHANNEL_OPTIONS)
+    server.add_generic_rpc_handlers([grpc.method_handlers_generic_handler("inference.GRPCInferenceService", {
+        "ModelInfer": grpc.unary_unary_rpc_method_handler(lambda request, context: echo(request), **codec),
+        "ModelStreamInfer": grpc.stream_stream_rpc_method_handler(stream, **codec),
+    })])
+    port = server.add_insecure_port("localhost:0")
+    server.start()
+    yield port
+    server.stop(None)
+
+
+@pytest.mark.parametrize("payload", [
+    np.arange(6, dtype=np.float32).reshape(2, 3), np.array([[44100]]), np.ones(4, dtype=np.float16),
+    np.array([True, False]),
+])
+def test_tensor_round_trip(payload):
+    datatype, shape, raw = encode_tensor(payload)
+    decoded = decode_tensor(datatype, shape, raw)
+    assert decoded.dtype == payload.dtype and np.array_equal(decoded, payload)
+
+
+def test_strings_round_trip():
+    datatype, shape, raw = encode_tensor(["Buckets of Rain", "ünïcode"])
+    assert datatype == "BYTES" and shape == [2]
+    assert decode_tensor(datatype, shape, raw).tolist() == ["Buckets of Rain", "ünïcode"]
+
+
+def test_request_sends_raw_contents():
+    song = np.random.default_rng(0).normal(size=(2, 100)).astype(np.float32)
+    request = TensorClient.build_grpc_request("music_splitter", {"song": song, "song_id": ["abc"]})
+    assert [t.name for t in request.inputs] == ["song", "song_id"]
+    assert request.inputs[0].parameters["content_type"].string_param == "np"
+    assert request.inputs[1].parameters["content_type"].string_param == "str"
+    assert request.raw_input_contents[0] == song.tobytes()
+
+
+def test_infer_and_ainfer(port):
+    client = TensorClient(grpc_port=port, max_concurrency=2)
+    song = np.random.default_rng(0).uniform(-1, 1, (2, 1000)).astype(np.float32)
+    out, = client.infer("music_splitter", song=song)
+    assert np.array_equal(out, song)
+
+    async def calls():
+        return await asyncio.gather(*(client.ainfer("music_splitter", song=song) for _ in range(5)))
+
+    for (out,) in asyncio.run(calls()):
+        assert np.array_equal(out, song)
+
+
+def test_ainfer_from_several_event_loops(port):
+    client = TensorClient(grpc_port=port)
+    song = np.ones((2, 10), dtype=np.float32)
+    for _ in range(3):
+        out, = asyncio.run(client.ainfer("music_splitter", song=song))
+        assert out.shape == (2, 10)
+
+
+def test_infer_stream_yields_every_response(port):
+    chunks = list(TensorClient(grpc_port=port).infer_stream("musicgen_model", text=["lofi beats"]))
+    assert [chunk.tolist() for chunk, in chunks] == [["lofi beats"]] * 3
@@ -0,0 +1,171 @@
+import threading
+import time
+
+import pytest
+
+from shared.jobs import JobQueue, RUNNING
+
+
+def wait(jobs, job_id, session=None):
+    while (job := jobs.poll(job_id, session))["state"] in RUNNING:
+        time.sleep(0.01)
+    return job
+
+
+def gated(release: threading.Event, started: threading.Event = None):
+    def job(progress, value):
+        if started is not None:
+            started.set()
+        while not release.wait(0.01):
+            progress(0, 1, "waiting")
+        progress(1, 1, "done")
+        return value * 2
+
+    return job
+
+
+def chunks(release: threading.Event, started: threading.Event):
+    def job(progress, count):
+        started.set()
+        for idx in range(count):
+            progress.output(idx)
+            if idx == 0:
+                release.wait(1)
+        progress(count, count)
+        return list(range(count))
+
+    return job
+
+
+@pytest.fixture
+def jobs():
+    return JobQueue(workers=1, ttl=600)
+
+
+def test_same_key_is_one_job(jobs):
+    release = threading.Event()
+    first = jobs.submit("key", gated(release), 2, session="a")
+    assert jobs.submit("key", gated(release), 3, session="b") == first
+    release.set()
+    assert wait(jobs, first)["state"] == "done"
+    assert jobs.result(first, "a") == jobs.result(first, "b") == 4
+
+
+def test_one_session_cancels_however_often_it_submitted(jobs):
+    release, started = threading.Event(), threading.Event()
+    job_id = jobs.submit("key", gated(release, started), 1, session="a")
+    assert jobs.submit("key", gated(release), 1, session="a") == job_id  # clicked twice
+    started.wait(1)
+    assert jobs.cancel(job_id, "a")
+    assert wait(jobs, job_id)["state"] == "cancelled"
+    assert not jobs.cancel(job_id, "a")
+
+
+def test_withdrawn_session_gets_nothing_while_the_others_carry_on(jobs):
+    release, started = threading.Event(), threading.Event()
+    job_id = jobs.submit("key", gated(release, started), 5, session="a")
+    jobs.submit("key", gated(release), 5, session="b")
+    started.wait(1)
+    assert not jobs.cancel(job_id, "b")
+    assert jobs.poll(job_id, "b")["state"] == "cancelled"
+    release.set()
+    assert wait(jobs, job_id, "a")["state"] == "done" and jobs.result(job_id, "a") == 10
+    with pytest.raises(RuntimeError, match="cancelled"):
+        jobs.result(job_id, "b")
+
+
+def test_rejoining_after_cancelling(jobs):
+    release, started = threading.Event(), threading.Event()
+    job_id = jobs.submit("key", gated(release, started), 1, session="a")
+    jobs.submit("key", gated(release), 1, session="b")
+    started.wait(1)
+    jobs.cancel(job_id, "b")
+    assert jobs.submit("key", gated(release), 1, session="b") == job_id
+    release.set()
+    assert wait(jobs, job_id, "b")["state"] == "done"
+
+
+def test_only_callers_can_cancel(jobs):
+    release = threading.Event()
+    job_id = jobs.submit("key", gated(release), 1, session="a")
+    assert not jobs.cancel(job_id, "stranger") and not jobs.cancel("no such job", "a")
+    release.set()
+    wait(jobs, job_id)
+
+
+def test_queued_job_is_dropped_without_running(jobs):
+    release, ran = threading.Event(), []
+    busy = jobs.submit("busy", gated(release), 1, session="a")
+    queued = jobs.submit("queued", lambda progress: ran.append(1), session="a")
+    assert jobs.cancel(queued, "a") and jobs.poll(queued)["state"] == "cancelled"
+    release.set()
+    wait(jobs, busy)
+    assert ran == []
+
+
+def test_followers_stream_from_where_they_are(jobs):
+    release, started = threading.Event(), threading.Event()
+    job_id = jobs.submit("prompt", chunks(release, started), 3, session="a")
+    started.wait(1)
+    while not jobs.poll(job_id, "a")["outputs"]:
+        time.sleep(0.01)
+    assert jobs.submit("prompt", chunks(release, started), 3, session="b") == job_id
+    release.set()
+    wait(jobs, job_id)
+    assert jobs.poll(job_id, "a", since=1)["outputs"] == [1, 2]
+    assert jobs.poll(job_id, "b")["outputs"] == [0, 1, 2] and jobs.result(job_id, "b") == [0, 1, 2]
+
+
+def test_stopped_session_gets_no_more_chunks(jobs):
+    release, started = threading.Event(), threading.Event()
+    job_id = jobs.submit("prompt", chunks(release, started), 3, session="a")
+    jobs.submit("prompt", chunks(release, started), 3, session="b")
+    started.wait(1)
+    assert not jobs.cancel(job_id, "b")
+    release.set()
+    wait(jobs, job_id, "a")
+    assert jobs.poll(job_id, "b")["state"] == "cancelled" and jobs.poll(job_id, "b")["outputs"] == []
+    assert jobs.poll(job_id, "a")["outputs"] == [0, 1, 2]
+
+
+def test_failures_and_expiry():
+    jobs = JobQueue(workers=1, ttl=0.05)
+
+    def broken(progress):
+        raise ValueError("no such song")
+
+    job_id = jobs.submit("key", broken)
+    job = wait(jobs, job_id)
+    assert job["state"] == "failed" and job["error"] == "no such song"
+    with pytest.raises(ValueError):
+        jobs.result(job_id)
+    time.sleep(0.1)
+    with pytest.raises(KeyError):
+        jobs.poll(job_id)
+
+
+def test_finished_jobs_are_reused_until_they_expire():
+    jobs = JobQueue(workers=1, ttl=0.2, reuse=True)
+    calls = []
+
+    def count(progress, fail=False):
+        calls.append(fail)
+        if fail:
+            raise ValueError("no such song")
+        return len(calls)
+
+    done = jobs.submit("key", count, session="a")
+    wait(jobs, done)
+    assert jobs.submit("key", count, session="b") == done and jobs.result(done, "b") == 1
+    failed = jobs.submit("broken", count, True)
+    wait(jobs, failed)
+    assert jobs.submit("broken", count, True) != failed  # failures run again
+    time.sleep(0.3)
+    again = jobs.submit("key", count)
+    assert again != done and wait(jobs, again)["state"] == "done"
+
+
+def test_finished_jobs_run_again_without_reuse(jobs):
+    first = jobs.submit("key", lambda progress: 1)
+    wait(jobs, first)
+    assert jobs.submit("key", lambda progress: 2) != first
@@ -0,0 +1,31 @@
+import json
+
+import numpy as np
+
+from shared.load import compare, summarize
+
+
+def samples(latencies_ms):
+    return [
+        {"latency": ms / 1000, "encode": 0.001, "decode": 0.002, "inference": 0.01, "server_codec": 0.003, "transport": 0.004}
+        for ms in latencies_ms
+    ]
+
+
+def test_summary_percentiles_and_stage_means():
+    summary = summarize(samples(range(1, 101)), wall=2.0)
+    assert summary["requests"] == 100 and summary["throughput_rps"] == 50
+    assert summary["p50_ms"] == np.percentile(range(1, 101), 50)
+    assert round(summary["p99_ms"], 2) == 99.01
+    assert round(summary["encode_ms"], 6) == 1 and round(summary["transport_ms"], 6) == 4
+
+
+def test_compare_prints_relative_change(tmp_path, capsys):
+    old = {"target": "sentiformer", "size": 8, "concurrency": 4, "p50_ms": 10.0, "p95_ms": 20.0, "throughput_rps": 100.0}
+    baseline = tmp_path / "old.json"
+    baseline.write_text(json.dumps({"results": [old]}))
+    new = {**old, "p50_ms": 5.0, "p95_ms": 30.0, "throughput_rps": 150.0}
+    compare([new, {**new, "target": "music_splitter"}], baseline)
+    lines = capsys.readouterr().out.strip().splitlines()
+    assert lines[-1].split() == ["sentiformer", "8", "4", "-50.0%", "+50.0%", "+50.0%"]
+    assert not any("music_splitter" in line for line in lines)
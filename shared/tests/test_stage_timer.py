@@ -0,0 +1,71 @@
+import asyncio
+from typing import List
+
+import numpy as np
+from mlserver import MLModel, ModelSettings
+from mlserver.codecs import NumpyCodec, StringCodec
+from mlserver.types import InferenceRequest
+from prometheus_client import REGISTRY
+
+from shared.stage_timer import StageTimer, stage_timer, timed_args
+
+
+def stage_count(model_name, stage):
+    labels = {"model_name": model_name, "model_version": "", "stage": stage}
+    return REGISTRY.get_sample_value("model_stage_seconds_count", labels) or 0
+
+
+def input_size(model_name, name):
+    return REGISTRY.get_sample_value("model_input_size", {"model_name": model_name, "model_version": "", "input": name})
+
+
+class Echo(MLModel):
+    @timed_args
+    async def predict(self, song: np.ndarray, tags: List[str]) -> np.ndarray:
+        with stage_timer(self).stage("inference"):
+            return song * 2
+
+
+def test_timed_args_decodes_times_and_encodes():
+    model = Echo(ModelSettings(name="timed_echo", implementation=Echo))
+    request = InferenceRequest(inputs=[
+        NumpyCodec.encode_input("song", np.ones((2, 50), dtype=np.float32)),
+        StringCodec.encode_input("tags", ["a", "b", "c"], use_bytes=False),
+    ])
+    response = asyncio.run(model.predict(request))
+    assert NumpyCodec.decode_output(response.outputs[0]).tolist() == (np.ones((2, 50)) * 2).tolist()
+    for stage in ("decode", "predict", "inference", "encode"):
+        assert stage_count("timed_echo", stage) == 1
+    assert input_size("timed_echo", "song") == 50 and input_size("timed_echo", "tags") == 3
+
+
+def test_timers_share_the_metrics_and_keep_their_labels():
+    first, second = StageTimer("timer_first"), StageTimer("timer_second", "v2")
+    with first.stage("inference"):
+        pass
+    with first.stage("inference"):
+        pass
+    with second.stage("inference"):
+        pass
+    assert first._stages is second._stages
+    assert stage_count("timer_first", "inference") == 2
+    assert REGISTRY.get_sample_value(
+        "model_stage_seconds_count", {"model_name": "timer_second", "model_version": "v2", "stage": "inference"}
+    ) == 1
+
+
+def test_sizes_skip_values_without_a_length():
+    timer = StageTimer("timer_sizes")
+    timer.sizes(scalar=np.float32(3), batch=np.zeros((4, 7)), count=5, words=["a", "b"])
+    assert input_size("timer_sizes", "scalar") == 1
+    assert input_size("timer_sizes", "batch") == 7
+    assert input_size("timer_sizes", "count") is None
+    assert input_size("timer_sizes", "words") == 2
+
+
+def test_observe_records_a_measured_stage():
+    timer = StageTimer("timer_observe")
+    timer.observe("first_chunk", 0.3)
+    labels = {"model_name": "timer_observe", "model_version": "", "stage": "first_chunk"}
+    assert REGISTRY.get_sample_value("model_stage_seconds_sum", labels) == 0.3
+    assert REGISTRY.get_sample_value("model_stage_seconds_bucket", {**labels, "le": "0.25"}) == 0